@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 
@@ -42,6 +43,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'shop.timing.ServerTimingMiddleware',
+    'shop.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -49,25 +52,55 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'shop.db_router.ReplicaStickinessMiddleware',
+    'shop.profiling.TemplateProfileMiddleware',
+    'shop.timing.ViewTimingMiddleware',
 ]
 
 ROOT_URLCONF = 'ecommerce.urls'
 
+# Templates are parsed once per process by the cached loader (runserver's
+# autoreloader still resets it when a template file changes).
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': ['templates'],
-        'APP_DIRS': True,
+        'DIRS': [BASE_DIR / 'templates'],
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'shop.carts.cart_badge',
+            ],
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
             ],
         },
     },
 ]
 
+# Template render profiling (TEMPLATE_PROFILING=1): per-URL slowest templates
+# and tags on the admin Template Profile page; renders slower than
+# TEMPLATE_PROFILE_SLOW_MS are logged.
+TEMPLATE_PROFILING = os.environ.get('TEMPLATE_PROFILING') == '1'
+TEMPLATE_PROFILE_SLOW_MS = int(os.environ.get('TEMPLATE_PROFILE_SLOW_MS', 200))
+
+# Server-Timing header (SERVER_TIMING=1 for every response); admins can
+# also request it on any page with ?server_timing=1
+SERVER_TIMING = os.environ.get('SERVER_TIMING') == '1'
+SERVER_TIMING_PARAM = 'server_timing'
+
+# Prometheus metrics at /metrics. Each worker process writes its samples to
+# METRICS_DIR (every METRICS_FLUSH_SECONDS) and the endpoint sums the files.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_DIR = os.environ.get('METRICS_DIR', str(BASE_DIR / '.metrics'))
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 1))
+# Scrapers allowed without an admin login
+METRICS_ALLOWED_IPS = os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+
 WSGI_APPLICATION = 'ecommerce.wsgi.application'
 
 
@@ -81,6 +114,101 @@ DATABASES = {
     }
 }
 
+# Production SQLite profile (DB_PROFILE=production): WAL journal so readers
+# never block the writer, BEGIN IMMEDIATE so write transactions queue on
+# busy_timeout instead of failing with "database is locked" on lock upgrade,
+# and persistent connections instead of a new connection per request.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '20000'),
+    'mmap_size': os.environ.get('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)),
+    'cache_size': os.environ.get('SQLITE_CACHE_SIZE', '-64000'),  # negative = KiB
+    'temp_store': 'MEMORY',
+}
+if os.environ.get('DB_PROFILE') == 'production':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': int(os.environ.get('CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': int(SQLITE_PRAGMAS['busy_timeout']) / 1000,
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+        },
+    })
+
+# Slow-query log: queries slower than SLOW_QUERY_MS are appended, with their
+# EXPLAIN QUERY PLAN, to SLOW_QUERY_LOG (summarize with manage.py slow_queries).
+# SLOW_QUERY_SAMPLE_RATE is the share of queries that are timed at all.
+SLOW_QUERY_LOGGING = os.environ.get('SLOW_QUERY_LOGGING', '1') == '1'
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+SLOW_QUERY_SAMPLE_RATE = float(os.environ.get('SLOW_QUERY_SAMPLE_RATE', 1.0))
+SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG', str(BASE_DIR / 'slow_queries.log'))
+
+# Read replicas: comma-separated SQLite files in DATABASE_REPLICAS, e.g.
+#   DATABASE_REPLICAS=db_replica.sqlite3 python manage.py runserver
+# Each is opened read-only and refreshed from the primary by the
+# sync_replicas command/job. Reads fall back to 'default' when none is healthy.
+REPLICA_DATABASES = []
+REPLICA_FILES = {}
+for number, replica_path in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(',')), start=1):
+    alias = f'replica{number}'
+    replica_path = Path(replica_path.strip())
+    if not replica_path.is_absolute():
+        replica_path = BASE_DIR / replica_path
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f'file:{replica_path}?mode=ro',
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(alias)
+    REPLICA_FILES[alias] = str(replica_path)
+
+DATABASE_ROUTERS = ['shop.db_router.ReplicaRouter']
+
+# Seconds a browser keeps reading from the primary after a POST
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 90))
+
+# Cache: CACHE_BACKEND=locmem (default, per process), file (shared by every
+# worker on the host) or a full backend path such as
+# django.core.cache.backends.redis.RedisCache with CACHE_LOCATION.
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+}
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS.get(CACHE_BACKEND, CACHE_BACKEND),
+        'LOCATION': os.environ.get(
+            'CACHE_LOCATION', str(BASE_DIR / '.cache') if CACHE_BACKEND == 'file' else 'shop'),
+        'TIMEOUT': int(os.environ.get('CACHE_TIMEOUT', 300)),
+        'KEY_PREFIX': os.environ.get('CACHE_KEY_PREFIX', 'ecommerce'),
+    }
+}
+# Alias used by shop.cache
+SHOP_CACHE_ALIAS = 'default'
+
+# Warm-up (CACHE_WARMUP=1): each WSGI worker fills caches, opens DB
+# connections and compiles templates when it loads (see shop/warmup.py)
+CACHE_WARMUP = os.environ.get('CACHE_WARMUP') == '1'
+
+# Rate limits: scope -> (requests, seconds), per client IP (per user for
+# checkout), kept in the shop cache. Use a shared CACHE_BACKEND with
+# several workers or each process counts separately.
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1') == '1'
+RATE_LIMITS = {
+    'login': (20, 60),
+    'login_account': (10, 300),
+    'register': (5, 3600),
+    'contact': (5, 600),
+    'checkout': (30, 600),
+}
+# request.META key holding the client address (e.g. HTTP_X_FORWARDED_FOR behind a proxy)
+RATE_LIMIT_IP_HEADER = 'REMOTE_ADDR'
+RATE_LIMIT_TEMPLATE = '429.html'
+RATE_LIMIT_MESSAGE = "Too many requests. Please try again shortly."
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -121,6 +249,8 @@ STATICFILES_DIRS = [BASE_DIR / "static"]
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Product uploads larger than this are shrunk by the process_product_image job
+PRODUCT_IMAGE_MAX_SIZE = (1200, 1200)
 
 AUTH_USER_MODEL = 'shop.User'
 
@@ -130,3 +260,44 @@ AUTH_USER_MODEL = 'shop.User'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_URL = '/login/'
+
+# Delivery assignment: maximum open deliveries per courier (None = unlimited)
+DELIVERY_CAPACITY = None
+# Route batching: maximum same-area stops handed to one courier at a time
+DELIVERY_ROUTE_SIZE = 10
+# Optional (latitude, longitude) routes start from
+DELIVERY_DEPOT = None
+
+# Search suggestions: optional snapshot file shared by all workers via mmap.
+# Without it each worker holds its own index, kept in step through the shop
+# cache, so several workers need a shared CACHE_BACKEND (as for rate limits).
+SUGGEST_SNAPSHOT_PATH = None
+# Snapshot edits are batched: one rebuild job per this many seconds
+SUGGEST_REBUILD_DELAY = 10
+
+# Inventory: products at or below this many units show as low stock
+LOW_STOCK_THRESHOLD = 5
+
+# Order archive: delivered/cancelled orders older than this move to the archive tables
+ORDER_ARCHIVE_DAYS = int(os.environ.get('ORDER_ARCHIVE_DAYS', 180))
+
+# Order event outbox: consumers must read OrderEvent within this many days
+ORDER_EVENT_RETENTION_DAYS = int(os.environ.get('ORDER_EVENT_RETENTION_DAYS', 30))
+
+# Background jobs: (cron expression, task name[, args]) enqueued by run_jobs.
+# Deliveries are auto-assigned from the Manage Orders page; to run it on a
+# timer too, add ('*/10 * * * *', 'auto_assign_deliveries').
+JOB_SCHEDULE = [
+    ('0 * * * *', 'build_recommendations'),
+    ('30 2 * * *', 'reconcile_stock'),
+    ('5 0 * * *', 'generate_report', ['daily']),
+    ('10 0 * * 1', 'generate_report', ['weekly']),
+    ('15 0 1 * *', 'generate_report', ['monthly']),
+    ('0 3 * * *', 'prune_jobs'),
+    ('20 3 * * *', 'prune_idempotency_keys'),
+    ('40 3 * * *', 'archive_orders'),
+    ('50 3 * * *', 'prune_order_events'),
+]
+
+if REPLICA_FILES:
+    JOB_SCHEDULE.append(('* * * * *', 'sync_replicas'))
@@ -14,3 +14,16 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce.settings')
 
 application = get_wsgi_application()
+
+# Warm caches, connections and templates before this worker accepts traffic
+from django.conf import settings  # noqa: E402
+
+if settings.CACHE_WARMUP:
+    from django.db import connections
+
+    from shop.warmup import warm_up
+
+    warm_up()
+    # With a preloading server this runs in the master: forked workers must
+    # not share its SQLite handles, so they reconnect on their first query
+    connections.close_all()
@@ -0,0 +1,42 @@
+# shop/addresses.py
+# ------------------------------------------------------------
+# Address helpers used for delivery route batching
+# ------------------------------------------------------------
+
+import math
+import re
+
+# 6-digit PIN, 5(+4)-digit ZIP, or UK/Canada style alphanumeric codes
+POSTAL_CODE_RE = re.compile(
+    r'\b(\d{6}|\d{5}(?:-\d{4})?|[A-Z]{1,2}\d[A-Z\d]? ?\d[A-Z]{2}|[A-Z]\d[A-Z] ?\d[A-Z]\d)\b',
+    re.IGNORECASE,
+)
+AREA_KEY_LENGTH = 32
+EARTH_RADIUS_KM = 6371.0
+
+
+def address_area_key(address):
+    """
+    Normalize a free-text address into a short area key.
+
+    Uses the postal code when one is present, otherwise the last
+    non-empty line/comma-separated component (usually the locality).
+    """
+    if not address:
+        return ''
+    match = POSTAL_CODE_RE.search(address)
+    if match:
+        return match.group(1).upper().replace(' ', '')[:AREA_KEY_LENGTH]
+
+    parts = [part.strip() for part in re.split(r'[,\n]', address) if part.strip()]
+    if not parts:
+        return ''
+    return re.sub(r'\s+', ' ', parts[-1].lower())[:AREA_KEY_LENGTH]
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
@@ -2,7 +2,8 @@ from django.contrib import admin
 from .models import (
     User, Category, Product, Cart, Order, OrderItem, 
     DeliveryTracking, Review, ContactMessage, Payment, 
-    Report, Wishlist
+    Report, Wishlist, ProductRecommendation, StockMovement, Job, IdempotencyKey,
+    ArchivedOrder, ArchivedOrderItem, OrderEvent
 )
 
 
@@ -35,7 +36,8 @@ class ProductAdmin(admin.ModelAdmin):
     list_display = ('name', 'category', 'price', 'stock', 'is_featured')
     list_filter = ('category', 'is_featured')
     search_fields = ('name', 'category__name')
-    list_editable = ('price', 'stock', 'is_featured')
+    # Stock changes go through the StockMovement ledger
+    list_editable = ('price', 'is_featured')
     ordering = ('-created_at',)
 
 
@@ -63,8 +65,8 @@ class OrderItemInline(admin.TabularInline):
 # -----------------------------
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ('id', 'customer', 'status', 'payment_method', 'total_amount', 'created_at')
-    list_filter = ('status', 'payment_method', 'created_at')
+    list_display = ('id', 'customer', 'status', 'tracking_status', 'payment_method', 'total_amount', 'created_at')
+    list_filter = ('status', 'tracking_status', 'payment_method', 'created_at')
     search_fields = ('id', 'customer__username', 'delivery_person__username')
     inlines = [OrderItemInline]
     date_hierarchy = 'created_at'
@@ -132,3 +134,97 @@ class WishlistAdmin(admin.ModelAdmin):
     list_display = ('user', 'product', 'added_at')
     search_fields = ('user__username', 'product__name')
     list_filter = ('added_at',)
+
+
+# -----------------------------
+# 1️⃣3️⃣ ProductRecommendation Admin
+# -----------------------------
+@admin.register(ProductRecommendation)
+class ProductRecommendationAdmin(admin.ModelAdmin):
+    list_display = ('product', 'rank', 'recommended', 'score', 'built_at')
+    search_fields = ('product__name', 'recommended__name')
+    list_select_related = ('product', 'recommended')
+    ordering = ('product', 'rank')
+
+
+# -----------------------------
+# 1️⃣4️⃣ StockMovement Admin
+# -----------------------------
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ('product', 'kind', 'quantity', 'order', 'user', 'created_at')
+    list_filter = ('kind', 'created_at')
+    search_fields = ('product__name', 'order__id', 'note')
+    list_select_related = ('product', 'order', 'user')
+    ordering = ('-created_at',)
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+# -----------------------------
+# 1️⃣5️⃣ Job Admin
+# -----------------------------
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'task', 'status', 'attempts', 'run_at', 'finished_at')
+    list_filter = ('status', 'task')
+    search_fields = ('task', 'last_error')
+    ordering = ('-created_at',)
+
+
+# -----------------------------
+# 1️⃣6️⃣ IdempotencyKey Admin
+# -----------------------------
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ('key', 'user', 'order', 'created_at')
+    search_fields = ('key', 'user__username', 'order__id')
+    list_select_related = ('user', 'order')
+    ordering = ('-created_at',)
+
+
+# -----------------------------
+# 1️⃣7️⃣ ArchivedOrder Admin (read-only)
+# -----------------------------
+class ArchivedOrderItemInline(admin.TabularInline):
+    model = ArchivedOrderItem
+    extra = 0
+    can_delete = False
+    readonly_fields = ('product', 'quantity', 'price')
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ('id', 'customer', 'status', 'total_amount', 'created_at', 'archived_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('id', 'customer__username')
+    list_select_related = ('customer',)
+    ordering = ('-created_at',)
+    inlines = [ArchivedOrderItemInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+# -----------------------------
+# 1️⃣8️⃣ OrderEvent Admin (read-only outbox)
+# -----------------------------
+@admin.register(OrderEvent)
+class OrderEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'order_id', 'kind', 'created_at')
+    list_filter = ('kind', 'created_at')
+    search_fields = ('order_id',)
+    ordering = ('-id',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
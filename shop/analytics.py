@@ -0,0 +1,243 @@
+# shop/analytics.py
+# ------------------------------------------------------------
+# Sales time-series analytics for the sales report
+# Delivered order lines (hot and archived) are pulled once per
+# range with values_list().iterator() into per-day columns;
+# every series, moving average, top list and cohort rate is
+# derived from those columns in single passes. Reports are
+# computed by the build_sales_report job and stored as Report
+# rows, which the sales report page reads; a stored report goes
+# stale when an order is delivered (or deleted) after it, as
+# seen in the OrderEvent outbox, or after REPORT_MAX_AGE.
+# ------------------------------------------------------------
+
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+
+from .jobs import enqueue
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderEvent, OrderItem, Report
+
+DEFAULT_RANGE_DAYS = 90
+MAX_RANGE_DAYS = 3 * 366
+MOVING_AVERAGE_DAYS = 7
+TOP_N = 10
+# Deliveries are tracked through OrderEvent; this only bounds drift from anything else
+REPORT_MAX_AGE = timedelta(hours=24)
+# Report keys holding dates and money once loaded back from JSON
+DATE_KEYS = {'start', 'end', 'period', 'month'}
+DECIMAL_KEYS = {'revenue', 'total_revenue', 'avg_order_value', 'moving_average'}
+
+LINE_FIELDS = ('order_id', 'order__created_at', 'product_id', 'product__name',
+               'product__category__name', 'quantity', 'price')
+
+
+def parse_range(params, today=None):
+    """
+    (start, end) dates from ?from=&to= (inclusive), defaulting to the last 90 days.
+
+    The end is capped at today and the span at MAX_RANGE_DAYS, keeping the end.
+    """
+    today = today or timezone.localdate()
+
+    def parse(value):
+        try:
+            return date.fromisoformat(value or '')
+        except ValueError:
+            return None
+
+    end = parse(params.get('to')) or today
+    start = parse(params.get('from')) or end - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    if start > end:
+        start, end = end, start
+    end = min(end, today)
+    start = min(start, end)
+    if (end - start).days >= MAX_RANGE_DAYS:
+        start = end - timedelta(days=MAX_RANGE_DAYS - 1)
+    return start, end
+
+
+def _bounds(start, end):
+    """Aware [low, high) datetimes covering the local dates start..end."""
+    return (timezone.make_aware(datetime.combine(start, time.min)),
+            timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)))
+
+
+def _lines(start, end, category_id):
+    """Delivered order lines in [start, end] from both the hot and archive tables."""
+    low, high = _bounds(start, end)
+    for model in (OrderItem, ArchivedOrderItem):
+        rows = model.objects.filter(order__status='delivered', order__created_at__gte=low, order__created_at__lt=high)
+        if category_id:
+            rows = rows.filter(product__category_id=category_id)
+        yield from rows.values_list(*LINE_FIELDS).order_by().iterator(chunk_size=2000)
+
+
+def _moving_average(values, window):
+    """Trailing mean over ``window`` points via a running sum (O(n))."""
+    averages, running = [], Decimal(0)
+    for i, value in enumerate(values):
+        running += value
+        if i >= window:
+            running -= values[i - window]
+        averages.append(running / min(i + 1, window))
+    return averages
+
+
+def _pct_change(current, previous):
+    if not previous:
+        return None
+    return float((current - previous) / previous * 100)
+
+
+def _rollup(days, revenue, orders, key):
+    """Group the daily columns into weeks or months keyed by ``key(day)``."""
+    buckets = {}
+    for day, day_revenue, day_orders in zip(days, revenue, orders):
+        bucket = buckets.setdefault(key(day), {'period': key(day), 'revenue': Decimal(0), 'orders': set()})
+        bucket['revenue'] += day_revenue
+        bucket['orders'] |= day_orders
+    rows = []
+    previous = None
+    for bucket in buckets.values():
+        row = {'period': bucket['period'], 'revenue': bucket['revenue'], 'orders': len(bucket['orders'])}
+        row['change'] = _pct_change(row['revenue'], previous['revenue']) if previous else None
+        rows.append(row)
+        previous = row
+    return rows
+
+
+def _cohorts(start, end):
+    """
+    Repeat-purchase rate per first-purchase month.
+
+    A customer belongs to the month of their first delivered order (across
+    hot and archived orders); they are a repeat customer if they have more
+    than one delivered order in total.
+    """
+    firsts, counts = {}, defaultdict(int)
+    for model in (Order, ArchivedOrder):
+        grouped = (model.objects.filter(status='delivered').values_list('customer_id')
+                   .annotate(first=Min('created_at'), n=Count('id')).order_by())
+        for customer_id, first, n in grouped.iterator():
+            firsts[customer_id] = min(first, firsts.get(customer_id, first))
+            counts[customer_id] += n
+
+    cohorts = {}
+    for customer_id, first in firsts.items():
+        first_day = timezone.localtime(first).date()
+        if start <= first_day <= end:
+            cohort = cohorts.setdefault(first_day.replace(day=1), [0, 0])
+            cohort[0] += 1
+            cohort[1] += counts[customer_id] > 1
+    return [
+        {'month': month, 'customers': customers, 'repeat': repeat, 'rate': repeat * 100 / customers}
+        for month, (customers, repeat) in sorted(cohorts.items())
+    ]
+
+
+def _top(totals, limit=TOP_N):
+    rows = [{'name': name, 'units': units, 'revenue': revenue} for name, units, revenue in totals.values()]
+    return sorted(rows, key=lambda row: -row['revenue'])[:limit]
+
+
+def compute_report(start, end, category_id=None):
+    n_days = (end - start).days + 1
+    days = [start + timedelta(days=i) for i in range(n_days)]
+    revenue = [Decimal(0)] * n_days
+    orders = [set() for _ in range(n_days)]
+    # name, units, revenue
+    products, categories = {}, {}
+
+    for order_id, created_at, product_id, product_name, category_name, quantity, price in _lines(start, end, category_id):
+        i = (timezone.localtime(created_at).date() - start).days
+        line_total = price * quantity
+        revenue[i] += line_total
+        orders[i].add(order_id)
+        category_name = category_name or 'Uncategorised'
+        for totals, key, name in ((products, product_id, product_name), (categories, category_name, category_name)):
+            entry = totals.setdefault(key, [name, 0, Decimal(0)])
+            entry[1] += quantity
+            entry[2] += line_total
+
+    moving = _moving_average(revenue, MOVING_AVERAGE_DAYS)
+    total_revenue = sum(revenue, Decimal(0))
+    total_orders = len(set().union(*orders))
+    return {
+        'start': start,
+        'end': end,
+        'total_orders': total_orders,
+        'total_revenue': total_revenue,
+        'avg_order_value': total_revenue / total_orders if total_orders else Decimal(0),
+        'daily': [
+            {'period': day, 'revenue': day_revenue, 'orders': len(day_orders), 'moving_average': average}
+            for day, day_revenue, day_orders, average in zip(days, revenue, orders, moving)
+        ],
+        'weekly': _rollup(days, revenue, orders, lambda day: day - timedelta(days=day.weekday())),
+        'monthly': _rollup(days, revenue, orders, lambda day: day.replace(day=1)),
+        'top_products': _top(products),
+        'top_categories': _top(categories),
+        'cohorts': _cohorts(start, end),
+    }
+
+
+def _decode(value, key=None):
+    if isinstance(value, dict):
+        return {name: _decode(item, name) for name, item in value.items()}
+    if isinstance(value, list):
+        return [_decode(item, key) for item in value]
+    if isinstance(value, str) and key in DATE_KEYS:
+        return date.fromisoformat(value)
+    if isinstance(value, str) and key in DECIMAL_KEYS:
+        return Decimal(value)
+    return value
+
+
+def _last_event_id():
+    return OrderEvent.objects.aggregate(last=Max('id'))['last'] or 0
+
+
+def _stale(report):
+    if report.created_at < timezone.now() - REPORT_MAX_AGE:
+        return True
+    # Only delivered orders are counted: entering 'delivered' or deleting a delivered order
+    return OrderEvent.objects.filter(id__gt=report.last_event_id, data__status='delivered').exists()
+
+
+@transaction.atomic
+def build_report(start, end, category_id=None, report_type='custom'):
+    """Compute the report for the range and store it, replacing the previous Report row for it."""
+    last_event_id = _last_event_id()
+    report = compute_report(start, end, category_id)
+    Report.objects.filter(report_type=report_type, start=start, end=end, category_id=category_id).delete()
+    return Report.objects.create(
+        report_type=report_type, start=start, end=end, category_id=category_id,
+        total_sales=report['total_revenue'], total_orders=report['total_orders'],
+        data=report, last_event_id=last_event_id,
+    )
+
+
+def queue_report(start, end, category_id=None):
+    """Queue build_sales_report once per range and outbox position."""
+    key = f'sales_report:{start}:{end}:{category_id or ""}@{_last_event_id()}:{timezone.localdate()}'
+    return enqueue('build_sales_report', start.isoformat(), end.isoformat(), category_id, unique_key=key)
+
+
+def sales_report(start, end, category_id=None):
+    """
+    (report, fresh) from the newest stored Report for the range.
+
+    A missing or stale report is queued for rebuilding; the stale one (or
+    None if there is none yet) is returned meanwhile.
+    """
+    stored = (Report.objects.filter(start=start, end=end, category_id=category_id)
+              .exclude(data={}).order_by('-created_at').first())
+    fresh = stored is not None and not _stale(stored)
+    if not fresh:
+        queue_report(start, end, category_id)
+    return (_decode(stored.data) if stored else None), fresh
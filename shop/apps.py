@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ShopConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'shop'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import signals, slow_queries, tasks  # noqa: F401
+        connection_created.connect(slow_queries.install, dispatch_uid='shop.slow_queries')
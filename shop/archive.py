@@ -0,0 +1,154 @@
+# shop/archive.py
+# ------------------------------------------------------------
+# Hot/cold order archiving
+# Delivered and cancelled orders older than ORDER_ARCHIVE_DAYS
+# move, with their items, tracking rows and payments, into the
+# Archived* tables in chunked transactions. The read helpers
+# below look in both places so views don't need to care.
+# ------------------------------------------------------------
+
+import heapq
+from datetime import timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.http import Http404
+from django.utils import timezone
+
+from .models import (
+    ArchivedDeliveryTracking, ArchivedOrder, ArchivedOrderItem, ArchivedPayment,
+    DeliveryTracking, Order, OrderItem, Payment, StockMovement,
+)
+
+ARCHIVE_STATUSES = ('delivered', 'cancelled')
+CHUNK_SIZE = 500
+ORDERS_PER_PAGE = 20
+
+ORDER_FIELDS = ('id', 'customer_id', 'delivery_person_id', 'status', 'payment_method', 'total_amount',
+                'address', 'area_key', 'latitude', 'longitude', 'created_at',
+                'tracking_status', 'tracking_updated_at', 'assigned_at', 'delivered_at')
+ITEM_FIELDS = ('id', 'order_id', 'product_id', 'quantity', 'price')
+TRACKING_FIELDS = ('id', 'order_id', 'delivery_person_id', 'status', 'updated_at', 'notes')
+PAYMENT_FIELDS = ('id', 'order_id', 'payment_method', 'payment_status', 'transaction_id', 'paid_at')
+
+
+def archive_cutoff(days=None):
+    if days is None:
+        days = getattr(settings, 'ORDER_ARCHIVE_DAYS', 180)
+    return timezone.now() - timedelta(days=days)
+
+
+def archivable_orders(cutoff):
+    """Finished orders created before ``cutoff`` (uses the status/created_at index)."""
+    return Order.objects.filter(status__in=ARCHIVE_STATUSES, created_at__lt=cutoff)
+
+
+def _copy(source_model, archive_model, fields, **filters):
+    rows = source_model.objects.filter(**filters).values_list(*fields).order_by()
+    archive_model.objects.bulk_create(
+        [archive_model(**dict(zip(fields, row))) for row in rows], batch_size=CHUNK_SIZE,
+    )
+
+
+@transaction.atomic
+def archive_chunk(order_ids, cutoff):
+    """Copy one chunk of orders and their children to the archive, then delete them."""
+    # Re-check inside the transaction: an order may have changed since it was picked
+    order_ids = list(archivable_orders(cutoff).filter(id__in=order_ids).values_list('id', flat=True))
+    if not order_ids:
+        return 0
+    _copy(Order, ArchivedOrder, ORDER_FIELDS, id__in=order_ids)
+    _copy(OrderItem, ArchivedOrderItem, ITEM_FIELDS, order_id__in=order_ids)
+    _copy(DeliveryTracking, ArchivedDeliveryTracking, TRACKING_FIELDS, order_id__in=order_ids)
+    _copy(Payment, ArchivedPayment, PAYMENT_FIELDS, order_id__in=order_ids)
+    # The stock ledger keeps its rows: point them at the archived order
+    # before the delete sets ``order`` to NULL
+    StockMovement.objects.filter(order_id__in=order_ids).update(archived_order_id=F('order_id'))
+    # Cascades to items, tracking, payments and idempotency keys
+    Order.objects.filter(id__in=order_ids).delete()
+    return len(order_ids)
+
+
+def archive_orders(days=None, chunk_size=CHUNK_SIZE, limit=None):
+    """
+    Archive every eligible order, ``chunk_size`` orders per transaction.
+
+    Short transactions keep the write lock brief, so checkout isn't
+    blocked behind a large sweep. Returns the number of orders moved.
+    """
+    cutoff = archive_cutoff(days)
+    moved = 0
+    while limit is None or moved < limit:
+        size = chunk_size if limit is None else min(chunk_size, limit - moved)
+        ids = list(archivable_orders(cutoff).order_by('id').values_list('id', flat=True)[:size])
+        if not ids:
+            break
+        moved += archive_chunk(ids, cutoff)
+    return moved
+
+
+# ======================================================
+# Reads across hot and archived orders
+# ======================================================
+
+def get_order_or_404(order_id, **filters):
+    """An Order, or its ArchivedOrder once it has been archived."""
+    for model in (Order, ArchivedOrder):
+        order = model.objects.filter(id=order_id, **filters).first()
+        if order:
+            return order
+    raise Http404("No order matches the given query.")
+
+
+def newest_first(querysets, before=None, limit=ORDERS_PER_PAGE):
+    """
+    One page of rows from several order querysets, newest (highest id) first.
+
+    Archived orders keep their ids, so each source is read as its own
+    keyset page below ``before`` and the pages are merged. Returns
+    (rows, next_before); next_before is None on the last page.
+    """
+    pages = []
+    for queryset in querysets:
+        if before:
+            queryset = queryset.filter(id__lt=before)
+        pages.append(list(queryset.order_by('-id')[:limit + 1]))
+    rows = list(islice(heapq.merge(*pages, key=lambda row: row.id, reverse=True), limit + 1))
+    return rows[:limit], (rows[limit - 1].id if len(rows) > limit else None)
+
+
+def customer_orders(user, before=None, limit=ORDERS_PER_PAGE):
+    """A page of a customer's orders (hot and archived), newest first, items prefetched."""
+    return newest_first([
+        model.objects.filter(customer=user).prefetch_related('items__product')
+        for model in (Order, ArchivedOrder)
+    ], before, limit)
+
+
+def courier_orders(user, statuses=ARCHIVE_STATUSES, before=None, limit=ORDERS_PER_PAGE, **filters):
+    """A page of the finished orders a courier handled, hot and archived, newest first."""
+    return newest_first([
+        model.objects.filter(delivery_person=user, tracking_status__in=statuses, **filters).select_related('customer')
+        for model in (Order, ArchivedOrder)
+    ], before, limit)
+
+
+def order_stats(**filters):
+    """{'count', 'revenue', 'by_status'} over hot and archived orders."""
+    count, revenue, by_status = 0, Decimal(0), {}
+    for model in (Order, ArchivedOrder):
+        orders = model.objects.filter(**filters)
+        totals = orders.aggregate(count=Count('id'), revenue=Sum('total_amount'))
+        count += totals['count']
+        revenue += totals['revenue'] or 0
+        for status, n in orders.values_list('status').annotate(n=Count('id')).order_by():
+            by_status[status] = by_status.get(status, 0) + n
+    return {'count': count, 'revenue': revenue, 'by_status': by_status}
+
+
+def archived_orders(before=None, limit=ORDERS_PER_PAGE):
+    """A page of archived orders for the admin list, newest first."""
+    return newest_first([ArchivedOrder.objects.select_related('customer')], before, limit)
@@ -0,0 +1,164 @@
+# shop/cache.py
+# ------------------------------------------------------------
+# Shop cache layer on top of Django's cache framework
+# Namespaced keys, tag-based invalidation and hit/miss stats.
+#
+# Every entry is stored with the versions of its tags. A tag is
+# just a counter in the cache; invalidating it bumps the counter,
+# which makes every entry stored under the old version a miss.
+# The namespace itself is an implicit tag ("ns:<name>"), so
+# bump_namespace() retires a whole namespace at once. With read
+# replicas, a tag invalidated less than REPLICA_STICKY_SECONDS ago
+# is refilled from the primary (see shop/db_router.py).
+# ------------------------------------------------------------
+
+import hashlib
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import metrics
+from .db_router import primary, reading_replica, sticky_seconds
+from .timing import timed_cache
+
+DEFAULT_TIMEOUT = 300
+MAX_RAW_KEY = 120
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def get_cache():
+    return timed_cache(caches[getattr(settings, 'SHOP_CACHE_ALIAS', 'default')])
+
+
+def make_key(namespace, *parts):
+    """'shop:<namespace>:<parts>' with long or unsafe parts hashed."""
+    raw = ':'.join(str(part) for part in parts)
+    if len(raw) > MAX_RAW_KEY or any(ch.isspace() for ch in raw):
+        raw = hashlib.md5(raw.encode()).hexdigest()
+    return f'shop:{namespace}:{raw}'
+
+
+def _tag_key(tag):
+    return f'shop:tag:{tag}'
+
+
+def _bump_key(tag):
+    # Present while replicas may still lag behind the tag's last invalidation
+    return f'shop:tagbump:{tag}'
+
+
+def _all_tags(namespace, tags):
+    return [f'ns:{namespace}', *tags]
+
+
+def _record(namespace, outcome):
+    with _stats_lock:
+        _stats[(namespace, outcome)] += 1
+    metrics.CACHE_REQUESTS.inc(namespace=namespace, result=outcome)
+
+
+def _tag_versions(found, tag_keys):
+    """Current versions for ``tag_keys``, creating any that are missing."""
+    cache = get_cache()
+    versions = []
+    for key in tag_keys:
+        version = found.get(key)
+        if version is None:
+            # Start from the clock so an evicted tag can't reuse an old version
+            cache.add(key, time.time_ns(), timeout=None)
+            version = cache.get(key)
+        versions.append(version)
+    return tuple(versions)
+
+
+def get_or_set(namespace, parts, producer, tags=(), timeout=DEFAULT_TIMEOUT):
+    """
+    Return the cached value for (namespace, parts) or store producer().
+
+    Value and tag versions come back in one get_many round trip.
+    """
+    cache = get_cache()
+    key = make_key(namespace, *parts)
+    tag_keys = [_tag_key(tag) for tag in _all_tags(namespace, tags)]
+    found = cache.get_many([key, *tag_keys])
+    versions = _tag_versions(found, tag_keys)
+
+    entry = found.get(key)
+    if entry is not None and entry[0] == versions:
+        _record(namespace, 'hit')
+        return entry[1]
+
+    _record(namespace, 'miss')
+    if reading_replica() and cache.get_many([_bump_key(tag) for tag in _all_tags(namespace, tags)]):
+        # The replica may predate that invalidation; filling from it would
+        # keep the old rows under the new version for the whole timeout
+        with primary():
+            value = producer()
+    else:
+        value = producer()
+    # Versions were read before producing, so an invalidation that races
+    # with us leaves this entry already stale rather than wrongly fresh.
+    cache.set(key, (versions, value), timeout)
+    return value
+
+
+def cached(namespace, timeout=DEFAULT_TIMEOUT, tags=(), key=None):
+    """
+    Read-through decorator for functions returning picklable results.
+
+    ``key`` and ``tags`` may be callables taking the function's arguments.
+    Return evaluated data (lists, dicts), not lazy querysets.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            parts = key(*args, **kwargs) if key else (*args, *sorted(kwargs.items()))
+            entry_tags = tags(*args, **kwargs) if callable(tags) else tags
+            return get_or_set(namespace, parts, lambda: func(*args, **kwargs), entry_tags, timeout)
+        return wrapper
+    return decorator
+
+
+def invalidate(*tags):
+    """Make every entry stored under any of ``tags`` stale."""
+    cache = get_cache()
+    for tag in tags:
+        key = _tag_key(tag)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+    window = sticky_seconds()
+    if window:
+        cache.set_many({_bump_key(tag): 1 for tag in tags}, timeout=window)
+
+
+def tag_version(tag):
+    """Current version of ``tag``; changes whenever it is invalidated."""
+    key = _tag_key(tag)
+    return _tag_versions(get_cache().get_many([key]), [key])[0]
+
+
+def bump_namespace(namespace):
+    invalidate(f'ns:{namespace}')
+
+
+def stats():
+    """{namespace: {'hit': n, 'miss': n}} for this process."""
+    with _stats_lock:
+        snapshot = dict(_stats)
+    result = {}
+    for (namespace, outcome), count in snapshot.items():
+        result.setdefault(namespace, {'hit': 0, 'miss': 0})[outcome] = count
+    return result
+
+
+def product_tags(product_id, category_id):
+    """Tags touched when a product changes."""
+    return ['catalog', f'category:{category_id}', f'product:{product_id}']
@@ -0,0 +1,245 @@
+# shop/carts.py
+# ------------------------------------------------------------
+# Cart and wishlist helpers
+# Session cart for anonymous visitors and Cart rows for signed-in
+# users behind one interface, merged in bulk at login; per-user
+# sets of wishlisted / in-cart product ids (one cached lookup per
+# request instead of a query per product card) and bulk
+# wishlist → cart moves
+# ------------------------------------------------------------
+
+from collections import namedtuple
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Q, Sum
+
+from . import cache
+from .models import Cart, Product, Wishlist
+
+CART_SESSION_KEY = 'cart'
+
+CartLine = namedtuple('CartLine', 'product quantity')
+
+
+# ======================================================
+# Cart backends
+# ======================================================
+
+class SessionCart:
+    """Anonymous cart kept in the session as {product id: quantity}."""
+
+    def __init__(self, session):
+        self.session = session
+
+    @property
+    def items(self):
+        return {int(product_id): quantity for product_id, quantity in self.session.get(CART_SESSION_KEY, {}).items()}
+
+    def _save(self, items):
+        # Session data is JSON, so keys are stored as strings
+        self.session[CART_SESSION_KEY] = {str(product_id): quantity for product_id, quantity in items.items()}
+
+    def add(self, product_id, quantity=1):
+        items = self.items
+        items[product_id] = items.get(product_id, 0) + quantity
+        self._save(items)
+
+    def set_quantity(self, product_id, quantity):
+        items = self.items
+        if product_id in items:
+            items[product_id] = quantity
+            self._save(items)
+
+    def remove(self, product_id):
+        items = self.items
+        if items.pop(product_id, None) is not None:
+            self._save(items)
+
+    def product_ids(self):
+        return frozenset(self.items)
+
+    def lines(self):
+        items = self.items
+        products = Product.objects.in_bulk(list(items))
+        return [CartLine(products[product_id], quantity)
+                for product_id, quantity in items.items() if product_id in products]
+
+    def summary(self, product_id):
+        """Changed line and cart totals; prices come from one query."""
+        items = self.items
+        prices = dict(Product.objects.filter(id__in=list(items)).values_list('id', 'price'))
+        items = {pid: quantity for pid, quantity in items.items() if pid in prices}
+        return _summary(
+            product_id,
+            items.get(product_id),
+            prices[product_id] * items[product_id] if product_id in items else None,
+            len(items),
+            sum(items.values()),
+            sum(prices[pid] * quantity for pid, quantity in items.items()),
+        )
+
+    def pop(self):
+        """Return the items and empty the session cart."""
+        items = self.items
+        self.session.pop(CART_SESSION_KEY, None)
+        return items
+
+
+class DbCart:
+    """Signed-in user's cart stored as Cart rows."""
+
+    def __init__(self, user):
+        self.user = user
+        self.rows = Cart.objects.filter(user=user)
+
+    def add(self, product_id, quantity=1):
+        _, created = Cart.objects.get_or_create(user=self.user, product_id=product_id,
+                                                defaults={'quantity': quantity})
+        if not created:
+            self.rows.filter(product_id=product_id).update(quantity=F('quantity') + quantity)
+
+    def set_quantity(self, product_id, quantity):
+        self.rows.filter(product_id=product_id).update(quantity=quantity)
+
+    def remove(self, product_id):
+        self.rows.filter(product_id=product_id).delete()
+
+    def product_ids(self):
+        return frozenset(self.rows.values_list('product_id', flat=True))
+
+    def lines(self):
+        return list(self.rows.select_related('product'))
+
+    def summary(self, product_id):
+        """Changed line and cart totals in a single aggregate query."""
+        line_total = F('quantity') * F('product__price')
+        row = self.rows.aggregate(
+            line_quantity=Sum('quantity', filter=Q(product_id=product_id)),
+            line_subtotal=Sum(line_total, filter=Q(product_id=product_id), output_field=DecimalField()),
+            lines=Count('id'),
+            units=Sum('quantity'),
+            total=Sum(line_total, output_field=DecimalField()),
+        )
+        return _summary(product_id, row['line_quantity'], row['line_subtotal'],
+                        row['lines'], row['units'] or 0, row['total'] or 0)
+
+
+CENTS = Decimal('0.01')
+
+
+def _summary(product_id, quantity, subtotal, lines, units, total):
+    return {
+        'line': ({'product_id': product_id, 'quantity': quantity, 'subtotal': Decimal(subtotal).quantize(CENTS)}
+                 if quantity else None),
+        'totals': {'lines': lines, 'units': units, 'total': Decimal(total).quantize(CENTS)},
+        'badge': lines,
+    }
+
+
+def get_cart(request):
+    """The cart backend for this visitor."""
+    if request.user.is_authenticated:
+        return DbCart(request.user)
+    return SessionCart(request.session)
+
+
+def cart_total(lines):
+    return sum(line.product.price * line.quantity for line in lines)
+
+
+@transaction.atomic
+def merge_session_cart(items, user):
+    """
+    Fold an anonymous cart ({product id: quantity}) into the user's Cart rows.
+
+    Quantities add to what is already in the cart. The existing rows are
+    read once and the result is written with a single
+    INSERT ... ON CONFLICT (user, product) DO UPDATE.
+    """
+    if not items:
+        return 0
+    valid_ids = set(Product.objects.filter(id__in=list(items)).values_list('id', flat=True))
+    existing = dict(Cart.objects.filter(user=user, product_id__in=valid_ids).values_list('product_id', 'quantity'))
+    Cart.objects.bulk_create(
+        [Cart(user=user, product_id=product_id, quantity=existing.get(product_id, 0) + quantity)
+         for product_id, quantity in items.items() if product_id in valid_ids],
+        update_conflicts=True, unique_fields=['user', 'product'], update_fields=['quantity'],
+    )
+    transaction.on_commit(lambda: invalidate_product_state(user.id))
+    return len(valid_ids)
+
+
+# ======================================================
+# Wishlist / cart state for listings
+# ======================================================
+
+EMPTY_STATE = {'wishlisted': frozenset(), 'in_cart': frozenset()}
+
+
+def _lists_tag(user_id):
+    return f'user:{user_id}:lists'
+
+
+def invalidate_product_state(user_id):
+    cache.invalidate(_lists_tag(user_id))
+
+
+def _load_state(user_id):
+    return {
+        'wishlisted': frozenset(Wishlist.objects.filter(user_id=user_id).values_list('product_id', flat=True)),
+        'in_cart': frozenset(Cart.objects.filter(user_id=user_id).values_list('product_id', flat=True)),
+    }
+
+
+def product_state(request):
+    """
+    {'wishlisted': ids, 'in_cart': ids} for the current user.
+
+    Cached per user and memoised on the request, so listing templates
+    can test ``product.id in wishlisted_ids`` for free.
+    """
+    if not hasattr(request, '_product_state'):
+        user = request.user
+        if user.is_authenticated:
+            request._product_state = cache.get_or_set(
+                'product_state', (user.id,), lambda: _load_state(user.id), [_lists_tag(user.id)],
+            )
+        else:
+            request._product_state = {**EMPTY_STATE, 'in_cart': SessionCart(request.session).product_ids()}
+    return request._product_state
+
+
+def cart_badge(request):
+    """Context processor: navbar cart count, evaluated only if a template shows it."""
+    return {'cart_count': lambda: len(product_state(request)['in_cart'])}
+
+
+def product_state_context(request):
+    state = product_state(request)
+    return {'wishlisted_ids': state['wishlisted'], 'cart_product_ids': state['in_cart']}
+
+
+@transaction.atomic
+def move_wishlist_to_cart(user):
+    """
+    Put every wishlisted product in the cart and clear the wishlist.
+
+    One INSERT adds the products not already in the cart (those keep
+    their quantity), then one DELETE clears the moved wishlist rows.
+    Out-of-stock products stay wishlisted. Returns the number of
+    products added to the cart.
+    """
+    product_ids = list(
+        Wishlist.objects.filter(user=user, product__stock__gt=0).values_list('product_id', flat=True)
+    )
+    if not product_ids:
+        return 0
+    in_cart = set(Cart.objects.filter(user=user, product_id__in=product_ids).values_list('product_id', flat=True))
+    added = Cart.objects.bulk_create(
+        [Cart(user=user, product_id=product_id, quantity=1) for product_id in product_ids if product_id not in in_cart],
+        ignore_conflicts=True,
+    )
+    Wishlist.objects.filter(user=user, product_id__in=product_ids).delete()
+    transaction.on_commit(lambda: invalidate_product_state(user.id))
+    return len(added)
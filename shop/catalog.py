@@ -0,0 +1,33 @@
+# shop/catalog.py
+# ------------------------------------------------------------
+# Cached catalog reads shared by the storefront pages
+# Categories and featured products change rarely; they are
+# cached under the 'catalog' tag, which every Product and
+# Category save/delete invalidates.
+# ------------------------------------------------------------
+
+from django.db.models import Sum
+
+from . import cache
+from .models import Category, OrderItem, Product
+
+FEATURED_LIMIT = 8
+
+
+def all_categories():
+    return cache.get_or_set('catalog', ('categories',), lambda: list(Category.objects.all()), ['catalog'])
+
+
+def featured_products(limit=FEATURED_LIMIT):
+    return cache.get_or_set(
+        'catalog', ('featured', limit),
+        lambda: list(Product.objects.filter(is_featured=True)[:limit]), ['catalog'],
+    )
+
+
+def top_product_ids(limit=20):
+    """Best sellers by units ordered (live orders only)."""
+    return list(
+        OrderItem.objects.values('product_id').annotate(units=Sum('quantity'))
+        .order_by('-units').values_list('product_id', flat=True)[:limit]
+    )
@@ -0,0 +1,134 @@
+# shop/db_router.py
+# ------------------------------------------------------------
+# Read-replica routing
+# Views wrapped in @use_replica read from a healthy replica;
+# everything else (and every write) uses 'default'. A short-lived
+# cookie set after any POST pins the browser to the primary so
+# users always read their own writes. Shop cache fills for tags
+# invalidated within that window also read the primary, so a
+# lagging replica can't store old rows under a new tag version.
+# ------------------------------------------------------------
+
+import random
+import sqlite3
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+STICKY_COOKIE = 'pin_primary'
+HEALTH_TTL_SECONDS = 5
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_replica_alias = ContextVar('replica_alias', default=None)
+_pinned = ContextVar('pinned_to_primary', default=False)
+_health = {}
+
+
+def replica_aliases():
+    return getattr(settings, 'REPLICA_DATABASES', [])
+
+
+def sticky_seconds():
+    """How long replicas may lag behind a write (0 without replicas)."""
+    return getattr(settings, 'REPLICA_STICKY_SECONDS', 90) if replica_aliases() else 0
+
+
+def reading_replica():
+    return _replica_alias.get() is not None
+
+
+@contextmanager
+def primary():
+    """Send reads inside the block to the primary, even in a @use_replica view."""
+    token = _replica_alias.set(None)
+    try:
+        yield
+    finally:
+        _replica_alias.reset(token)
+
+
+def is_healthy(alias):
+    """Cheap cached connectivity check so a dead replica is skipped for a while."""
+    healthy, checked_at = _health.get(alias, (None, 0.0))
+    if healthy is None or time.monotonic() - checked_at > HEALTH_TTL_SECONDS:
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1')
+            healthy = True
+        except DatabaseError:
+            connections[alias].close()
+            healthy = False
+        _health[alias] = (healthy, time.monotonic())
+    return healthy
+
+
+def choose_replica():
+    """A random healthy replica alias, or None to fall back to the primary."""
+    candidates = [alias for alias in replica_aliases() if is_healthy(alias)]
+    return random.choice(candidates) if candidates else None
+
+
+class ReplicaRouter:
+    """Send reads inside @use_replica views to the chosen replica."""
+
+    def db_for_read(self, model, **hints):
+        return _replica_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas are copies of the primary, so cross-alias relations are fine
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in replica_aliases()
+
+
+def use_replica(view):
+    """Route a view's reads to a replica for safe requests unless pinned to the primary."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in SAFE_METHODS or _pinned.get() or not replica_aliases():
+            return view(request, *args, **kwargs)
+        token = _replica_alias.set(choose_replica())
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _replica_alias.reset(token)
+    return wrapper
+
+
+class ReplicaStickinessMiddleware:
+    """Pin a browser to the primary for REPLICA_STICKY_SECONDS after it writes."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _pinned.set(STICKY_COOKIE in request.COOKIES)
+        try:
+            response = self.get_response(request)
+        finally:
+            _pinned.reset(token)
+        if request.method not in SAFE_METHODS and replica_aliases():
+            response.set_cookie(STICKY_COOKIE, '1', httponly=True, samesite='Lax', max_age=sticky_seconds())
+        return response
+
+
+def sync_sqlite_replicas():
+    """Copy the primary SQLite file into every replica file with the online backup API."""
+    source = sqlite3.connect(settings.DATABASES['default']['NAME'])
+    try:
+        for path in getattr(settings, 'REPLICA_FILES', {}).values():
+            target = sqlite3.connect(path)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+    finally:
+        source.close()
@@ -0,0 +1,175 @@
+# shop/delivery.py
+# ------------------------------------------------------------
+# Delivery assignment engine
+# Balances pending orders across delivery staff by open load
+# ------------------------------------------------------------
+
+import heapq
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from .addresses import haversine_km
+from .models import Order, User
+from .order_events import bulk_assign
+
+
+def courier_loads(couriers=None):
+    """Return {courier_id: open_delivery_count} for every delivery user."""
+    if couriers is None:
+        couriers = User.objects.filter(role='delivery', is_active=True)
+    loads = {courier_id: 0 for courier_id in couriers.values_list('id', flat=True)}
+
+    # One grouped query over the orders' denormalized delivery state:
+    # orders assigned to a courier that are not delivered or cancelled yet.
+    open_counts = (
+        Order.objects.filter(delivery_person_id__in=list(loads))
+        .exclude(status__in=['delivered', 'cancelled'])
+        .exclude(tracking_status__in=['delivered', 'cancelled'])
+        .values('delivery_person_id')
+        .annotate(open=Count('id'))
+        .order_by()
+    )
+    for row in open_counts:
+        loads[row['delivery_person_id']] = row['open']
+    return loads
+
+
+def pending_orders():
+    """Unassigned pending orders, oldest first."""
+    return Order.objects.filter(status='pending', delivery_person__isnull=True).order_by('created_at')
+
+
+def batch_by_area(orders):
+    """
+    Group orders into area batches, keeping the oldest batch first.
+
+    Orders without an area key become batches of one.
+    """
+    batches = {}
+    for order_id, area_key in orders.values_list('id', 'area_key'):
+        batches.setdefault(area_key or f'#{order_id}', []).append(order_id)
+    return list(batches.values())
+
+
+def plan_assignments(batches, loads, capacity=None, route_size=None):
+    """
+    Pair each order id with the least-loaded courier.
+
+    Keeps a min-heap of (load, courier_id), so a run over n orders and
+    k couriers costs O(n log k). Orders in the same batch go to the same
+    courier, up to ``route_size`` stops at a time. Stops early once
+    every courier is at ``capacity``.
+    """
+    heap = [(load, courier_id) for courier_id, load in loads.items()]
+    heapq.heapify(heap)
+
+    plan = []
+    for batch in batches:
+        start = 0
+        while start < len(batch) and heap:
+            load, courier_id = heap[0]
+            if capacity is not None and load >= capacity:
+                return plan
+            take = len(batch) - start
+            if route_size:
+                take = min(take, route_size)
+            if capacity is not None:
+                take = min(take, capacity - load)
+            plan.extend((order_id, courier_id) for order_id in batch[start:start + take])
+            start += take
+            heapq.heapreplace(heap, (load + take, courier_id))
+    return plan
+
+
+def auto_assign_orders(orders=None, capacity=None, batch_size=500):
+    """
+    Assign pending orders to delivery staff in bulk.
+
+    Returns the list of (order_id, courier_id) pairs that were written.
+    """
+    if capacity is None:
+        capacity = getattr(settings, 'DELIVERY_CAPACITY', None)
+    if orders is None:
+        orders = pending_orders()
+
+    route_size = getattr(settings, 'DELIVERY_ROUTE_SIZE', None)
+    plan = plan_assignments(batch_by_area(orders), courier_loads(), capacity, route_size)
+    if not plan:
+        return plan
+
+    with transaction.atomic():
+        # Re-check under lock so orders assigned by hand meanwhile are skipped.
+        locked = pending_orders().select_for_update().in_bulk([order_id for order_id, _ in plan])
+        plan = [(order_id, courier_id) for order_id, courier_id in plan if order_id in locked]
+        bulk_assign([(locked[order_id], courier_id) for order_id, courier_id in plan], batch_size=batch_size)
+    return plan
+
+
+# ------------------------------------------------------------
+# Route ordering
+# ------------------------------------------------------------
+
+def _nearest_neighbour(points, start=None):
+    """Greedy tour over (lat, lon, payload) points; returns payloads in order."""
+    remaining = list(points)
+    if not remaining:
+        return []
+    route = []
+    current = start or remaining[0][:2]
+    while remaining:
+        index = min(range(len(remaining)),
+                    key=lambda i: haversine_km(current[0], current[1], remaining[i][0], remaining[i][1]))
+        lat, lon, payload = remaining.pop(index)
+        route.append(payload)
+        current = (lat, lon)
+    return route
+
+
+def order_route(orders, start=None):
+    """
+    Put orders in a suggested visiting order.
+
+    Orders are clustered by area key. Areas with coordinates are toured
+    nearest-neighbour from ``start`` (or the first area), stops inside an
+    area likewise; areas without coordinates follow in postal-code order.
+    """
+    areas = {}
+    for order in orders:
+        areas.setdefault(order.area_key or f'#{order.id}', []).append(order)
+
+    located, unlocated = [], []
+    for area_key, area_orders in areas.items():
+        points = [(o.latitude, o.longitude) for o in area_orders if o.latitude is not None and o.longitude is not None]
+        if points:
+            lat = sum(p[0] for p in points) / len(points)
+            lon = sum(p[1] for p in points) / len(points)
+            located.append((lat, lon, area_key))
+        else:
+            unlocated.append(area_key)
+
+    route = []
+    position = start
+    for area_key in _nearest_neighbour(located, start):
+        area_orders = areas[area_key]
+        stops = [(o.latitude, o.longitude, o) for o in area_orders if o.latitude is not None and o.longitude is not None]
+        tour = _nearest_neighbour(stops, position)
+        route.extend(tour)
+        route.extend(o for o in area_orders if o.latitude is None or o.longitude is None)
+        if tour:
+            position = (tour[-1].latitude, tour[-1].longitude)
+    for area_key in sorted(unlocated):
+        route.extend(areas[area_key])
+    return route
+
+
+def courier_route(courier):
+    """Open orders for a courier in suggested visiting order."""
+    orders = (
+        Order.objects.filter(delivery_person=courier)
+        .exclude(status__in=['delivered', 'cancelled'])
+        .select_related('customer')
+        .order_by('created_at')
+    )
+    return order_route(orders, getattr(settings, 'DELIVERY_DEPOT', None))
@@ -0,0 +1,172 @@
+# shop/facets.py
+# ------------------------------------------------------------
+# Faceted navigation for the product listing
+# Category, price bucket, stock and rating band with counts
+# ------------------------------------------------------------
+
+from collections import Counter
+
+from django.db.models import BooleanField, Case, CharField, Count, IntegerField, Q, Value, When
+
+from . import cache
+
+# (key, label, lower bound inclusive, upper bound exclusive)
+PRICE_BUCKETS = (
+    ('0-500', 'Under ₹500', None, 500),
+    ('500-1000', '₹500 – ₹1,000', 500, 1000),
+    ('1000-2500', '₹1,000 – ₹2,500', 1000, 2500),
+    ('2500-5000', '₹2,500 – ₹5,000', 2500, 5000),
+    ('5000+', '₹5,000 & above', 5000, None),
+)
+# Minimum average rating offered as "N★ & up"
+RATING_BANDS = (4, 3, 2, 1)
+
+
+def _price_q(low, high):
+    q = Q()
+    if low is not None:
+        q &= Q(price__gte=low)
+    if high is not None:
+        q &= Q(price__lt=high)
+    return q
+
+
+def parse_filters(params):
+    """Read facet selections from a QueryDict (values may repeat)."""
+    price_keys = {key for key, *_ in PRICE_BUCKETS}
+    rating = params.get('rating', '')
+    return {
+        'category': {value for value in params.getlist('category') if value.isdigit()},
+        'price': {value for value in params.getlist('price') if value in price_keys},
+        'in_stock': params.get('in_stock') == '1',
+        'rating': int(rating) if rating.isdigit() and int(rating) in RATING_BANDS else None,
+    }
+
+
+def _filter_q(filters):
+    """Combine every active facet selection into one Q."""
+    q = Q()
+    if filters['category']:
+        q &= Q(category_id__in=filters['category'])
+    if filters['price']:
+        price_q = Q()
+        for key, _, low, high in PRICE_BUCKETS:
+            if key in filters['price']:
+                price_q |= _price_q(low, high)
+        q &= price_q
+    if filters['in_stock']:
+        q &= Q(stock__gt=0)
+    if filters['rating']:
+        q &= Q(rating_avg__gte=filters['rating'])
+    return q
+
+
+def apply_filters(products, filters):
+    return products.filter(_filter_q(filters))
+
+
+def facet_cube(products):
+    """
+    One GROUP BY over (category, price bucket, in stock, rating floor).
+
+    The cube has at most categories x 5 x 2 x 6 cells, so every facet
+    count for any filter combination can be derived from it in Python.
+    """
+    price_bucket = Case(
+        *[When(_price_q(low, high), then=Value(key)) for key, _, low, high in PRICE_BUCKETS],
+        default=Value(PRICE_BUCKETS[-1][0]),
+        output_field=CharField(),
+    )
+    in_stock = Case(When(stock__gt=0, then=Value(True)), default=Value(False), output_field=BooleanField())
+    rating_floor = Case(
+        *[When(rating_avg__gte=band, then=Value(band)) for band in (5,) + RATING_BANDS],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    return list(
+        products.order_by()
+        .annotate(price_bucket=price_bucket, in_stock=in_stock, rating_floor=rating_floor)
+        .values_list('category_id', 'price_bucket', 'in_stock', 'rating_floor')
+        .annotate(n=Count('id'))
+    )
+
+
+def _matches(cell, filters, skip):
+    category_id, price_bucket, in_stock, rating_floor, _ = cell
+    if filters['category'] and skip != 'category' and str(category_id) not in filters['category']:
+        return False
+    if filters['price'] and skip != 'price' and price_bucket not in filters['price']:
+        return False
+    if filters['in_stock'] and skip != 'in_stock' and not in_stock:
+        return False
+    if filters['rating'] and skip != 'rating' and rating_floor < filters['rating']:
+        return False
+    return True
+
+
+def _toggle_url(params, name, value, single=False):
+    """Querystring with ``value`` switched on/off for ``name`` (page reset)."""
+    params = params.copy()
+    params.pop('page', None)
+    values = params.getlist(name)
+    if value in values:
+        values.remove(value)
+    elif single:
+        values = [value]
+    else:
+        values.append(value)
+    params.setlist(name, values)
+    return '?' + params.urlencode()
+
+
+def cached_facet_cube(products, cache_key, cache_tags):
+    """facet_cube() through the shop cache, keyed like the listing page it belongs to."""
+    return cache.get_or_set('facets', cache_key, lambda: facet_cube(products), cache_tags)
+
+
+def build_facets(products, filters, categories, params, cube=None):
+    """
+    Facet groups for the sidebar, each option with its count and toggle URL.
+
+    Counts for a facet ignore that facet's own selection, so shoppers see
+    how many results picking another value would give. Pass a
+    precomputed (e.g. cached) ``cube`` to skip the GROUP BY.
+    """
+    if cube is None:
+        cube = facet_cube(products)
+
+    def counter(skip, key):
+        counts = Counter()
+        for cell in cube:
+            if _matches(cell, filters, skip):
+                counts[key(cell)] += cell[-1]
+        return counts
+
+    by_category = counter('category', lambda cell: str(cell[0]))
+    by_price = counter('price', lambda cell: cell[1])
+    by_stock = counter('in_stock', lambda cell: cell[2])
+    by_rating = counter('rating', lambda cell: cell[3])
+
+    return {
+        'category': [
+            {'label': category.name, 'count': by_category[str(category.id)],
+             'active': str(category.id) in filters['category'],
+             'url': _toggle_url(params, 'category', str(category.id))}
+            for category in categories
+        ],
+        'price': [
+            {'label': label, 'count': by_price[key], 'active': key in filters['price'],
+             'url': _toggle_url(params, 'price', key)}
+            for key, label, _, _ in PRICE_BUCKETS
+        ],
+        'in_stock': {
+            'label': 'In stock only', 'count': by_stock[True], 'active': filters['in_stock'],
+            'url': _toggle_url(params, 'in_stock', '1', single=True),
+        },
+        'rating': [
+            {'label': f'{band}★ & up', 'count': sum(n for floor, n in by_rating.items() if floor >= band),
+             'active': filters['rating'] == band,
+             'url': _toggle_url(params, 'rating', str(band), single=True)}
+            for band in RATING_BANDS
+        ],
+    }
@@ -0,0 +1,65 @@
+# shop/idempotency.py
+# ------------------------------------------------------------
+# Idempotent order placement
+# The checkout form carries a one-time key; the first POST
+# claims it (unique constraint), replays resolve to that order
+# ------------------------------------------------------------
+
+import secrets
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+KEY_TTL = timedelta(days=1)
+
+
+class DuplicateSubmission(Exception):
+    """The key was already used; ``order_id`` is None while the first request is still running."""
+
+    def __init__(self, order_id):
+        self.order_id = order_id
+        super().__init__(f"Checkout already submitted (order {order_id})")
+
+
+def new_key():
+    return secrets.token_urlsafe(24)
+
+
+def find_replay(user, key):
+    """Raise DuplicateSubmission if ``key`` was already used (one indexed lookup)."""
+    if not key:
+        return
+    used = list(IdempotencyKey.objects.filter(key=key, user=user).values_list('order_id', flat=True)[:1])
+    if used:
+        raise DuplicateSubmission(used[0])
+
+
+def claim_key(user, key):
+    """
+    Insert ``key`` inside the caller's transaction.
+
+    Returns the IdempotencyKey row (or None without a key). A concurrent
+    request that got there first raises DuplicateSubmission.
+    """
+    if not key:
+        return None
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(key=key, user=user)
+    except IntegrityError:
+        order_id = IdempotencyKey.objects.filter(key=key, user=user).values_list('order_id', flat=True).first()
+        raise DuplicateSubmission(order_id)
+
+
+def attach_order(claim, order):
+    if claim is not None:
+        claim.order = order
+        claim.save(update_fields=['order'])
+
+
+def prune_keys(older_than=KEY_TTL):
+    """Bulk-delete keys past their replay window."""
+    return IdempotencyKey.objects.filter(created_at__lt=timezone.now() - older_than).delete()[0]
@@ -0,0 +1,63 @@
+# shop/images.py
+# ------------------------------------------------------------
+# Product image processing
+# Uploads are stored as-is by the request; the process_product_image
+# job then shrinks oversized photos to PRODUCT_IMAGE_MAX_SIZE and
+# re-encodes them, off the request path.
+# ------------------------------------------------------------
+
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .cache import invalidate, product_tags
+from .models import Product
+
+JPEG_QUALITY = 85
+
+
+def max_image_size():
+    return tuple(getattr(settings, 'PRODUCT_IMAGE_MAX_SIZE', (1200, 1200)))
+
+
+def _shrunk(handle, max_size):
+    """Re-encoded bytes of the image, or None if it already fits."""
+    with Image.open(handle) as image:
+        image_format = image.format or 'JPEG'
+        image = ImageOps.exif_transpose(image)
+        if image.width <= max_size[0] and image.height <= max_size[1]:
+            return None
+        image.thumbnail(max_size)
+        if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        buffer = BytesIO()
+        image.save(buffer, format=image_format, optimize=True, quality=JPEG_QUALITY)
+        return buffer.getvalue()
+
+
+def process_product_image(product_id):
+    """Shrink a product's uploaded image in place; returns True if it was rewritten."""
+    product = Product.objects.filter(pk=product_id).first()
+    if product is None or not product.image or product.image.name == Product._meta.get_field('image').default:
+        return False
+    original = product.image.name
+    try:
+        with product.image.open('rb') as handle:
+            data = _shrunk(handle, max_image_size())
+    except (FileNotFoundError, UnidentifiedImageError):
+        return False
+    if data is None:
+        return False
+
+    storage = product.image.storage
+    name = storage.save(original, ContentFile(data))
+    # Only if nobody uploaded another image meanwhile; no save() so signals don't fire twice
+    if Product.objects.filter(pk=product_id, image=original).update(image=name):
+        storage.delete(original)
+        invalidate(*product_tags(product_id, product.category_id))
+        return True
+    storage.delete(name)
+    return False
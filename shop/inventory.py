@@ -0,0 +1,118 @@
+# shop/inventory.py
+# ------------------------------------------------------------
+# Inventory ledger
+# Every stock change is a StockMovement row plus an atomic
+# F() update of the cached Product.stock count
+# ------------------------------------------------------------
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .cache import invalidate, product_tags
+from .models import Product, StockMovement
+
+
+class InsufficientStock(Exception):
+    """Raised when a sale would take a product's stock below zero."""
+
+    def __init__(self, product_id, requested):
+        self.product_id = product_id
+        self.requested = requested
+        super().__init__(f"Not enough stock for product {product_id} (requested {requested})")
+
+
+def low_stock_threshold():
+    return getattr(settings, 'LOW_STOCK_THRESHOLD', 5)
+
+
+@transaction.atomic
+def record_movement(product_id, kind, quantity, order=None, user=None, note=''):
+    """
+    Append a ledger row and apply ``quantity`` (signed) to Product.stock.
+
+    Decrements are guarded in the UPDATE itself, so two concurrent sales
+    can never oversell the last unit.
+    """
+    products = Product.objects.filter(pk=product_id)
+    if quantity < 0:
+        products = products.filter(stock__gte=-quantity)
+    if not products.update(stock=F('stock') + quantity):
+        raise InsufficientStock(product_id, -quantity)
+
+    # Cached listings only depend on in/out of stock, so invalidate on crossing zero
+    stock, category_id = Product.objects.filter(pk=product_id).values_list('stock', 'category_id').get()
+    if stock == 0 or stock == quantity:
+        transaction.on_commit(lambda: invalidate(*product_tags(product_id, category_id)))
+    return StockMovement.objects.create(
+        product_id=product_id, kind=kind, quantity=quantity, order=order, user=user, note=note,
+    )
+
+
+@transaction.atomic
+def sell_order(order):
+    """Take stock for every item of a freshly placed order."""
+    for item in order.items.all():
+        record_movement(item.product_id, 'sale', -item.quantity, order=order, user=order.customer)
+
+
+@transaction.atomic
+def restock_order(order, user=None):
+    """
+    Return what a cancelled order took from stock (once).
+
+    Only the order's own 'sale' movements are reversed, so orders placed
+    before the ledger existed (never decremented) restock nothing.
+    """
+    outstanding = (
+        order.stock_movements.filter(kind__in=['sale', 'cancel'])
+        .values_list('product_id').annotate(total=Sum('quantity')).order_by()
+    )
+    for product_id, total in outstanding:
+        if total < 0:
+            record_movement(product_id, 'cancel', -total, order=order, user=user)
+
+
+def set_stock(product, counted, expected, user=None, note='Manual adjustment'):
+    """
+    Move stock from ``expected`` (what the admin saw) to ``counted``.
+
+    Applied as a delta, so a sale that happened while the form was open
+    is kept rather than overwritten.
+    """
+    delta = counted - expected
+    if delta:
+        kind = 'restock' if delta > 0 else 'adjustment'
+        record_movement(product.pk, kind, delta, user=user, note=note)
+
+
+def low_stock_products(threshold=None):
+    """Products at or under the threshold, emptiest first (uses the stock index)."""
+    if threshold is None:
+        threshold = low_stock_threshold()
+    return Product.objects.filter(stock__lte=threshold).order_by('stock', 'name')
+
+
+@transaction.atomic
+def reconcile(fix=False):
+    """
+    Compare Product.stock with the ledger total for every product.
+
+    Returns [(product_id, cached, ledger)] for products that drifted and,
+    with ``fix``, resets the cached counts in bulk.
+    """
+    ledger = dict(
+        StockMovement.objects.values_list('product_id').annotate(total=Sum('quantity')).order_by()
+    )
+    drift = []
+    for product_id, cached in Product.objects.values_list('id', 'stock').order_by().iterator():
+        total = max(ledger.get(product_id, 0), 0)
+        if total != cached:
+            drift.append((product_id, cached, total))
+
+    if fix and drift:
+        Product.objects.bulk_update(
+            [Product(id=product_id, stock=total) for product_id, _, total in drift],
+            ['stock'], batch_size=500,
+        )
+    return drift
@@ -0,0 +1,195 @@
+# shop/jobs.py
+# ------------------------------------------------------------
+# Background job queue
+# Jobs live in the database (no broker); the run_jobs command
+# claims due jobs and runs them on a thread pool, retrying
+# failures with exponential backoff and enqueueing cron-style
+# scheduled jobs from settings.JOB_SCHEDULE. A running job is
+# leased to its worker, which renews the lease while the job
+# runs; jobs whose lease lapses had their worker die.
+# ------------------------------------------------------------
+
+import logging
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+RETRY_BASE_SECONDS = 30
+# Workers renew leases every HEARTBEAT_SECONDS; a lease older than LEASE_SECONDS is dead
+HEARTBEAT_SECONDS = 30
+LEASE_SECONDS = 120
+
+_registry = {}
+
+
+def task(name):
+    """Register a function as a background task under ``name``."""
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def enqueue(task_name, *args, run_at=None, max_attempts=3, unique_key=None, **kwargs):
+    """Queue ``task_name`` to run (now, or at ``run_at``) and return the Job."""
+    if task_name not in _registry:
+        raise KeyError(f"Unknown task {task_name!r}")
+    job = Job(task=task_name, args=list(args), kwargs=kwargs, run_at=run_at or timezone.now(),
+              max_attempts=max_attempts, unique_key=unique_key)
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        # Another worker already queued this scheduled run
+        return None
+    return job
+
+
+def queue_depth():
+    """{status: count} for the admin queue page, in one grouped query."""
+    counts = dict(Job.objects.values_list('status').annotate(n=Count('id')).order_by())
+    due = Job.objects.filter(status='queued', run_at__lte=timezone.now()).count()
+    return {**{status: counts.get(status, 0) for status, _ in Job.STATUS_CHOICES}, 'due': due}
+
+
+# ======================================================
+# Worker side
+# ======================================================
+
+def worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim_jobs(limit, worker):
+    """Atomically mark up to ``limit`` due jobs as running for ``worker``."""
+    now = timezone.now()
+    candidates = (
+        Job.objects.filter(status='queued', run_at__lte=now)
+        .order_by('run_at', 'id')
+        .values_list('id', flat=True)[:limit]
+    )
+    claimed = []
+    for job_id in candidates:
+        # Conditional UPDATE: only one worker can win each job
+        if Job.objects.filter(id=job_id, status='queued').update(
+                status='running', locked_by=worker, locked_at=now):
+            claimed.append(job_id)
+    return claimed
+
+
+def run_job(job_id):
+    """Execute one claimed job and record the outcome."""
+    try:
+        job = Job.objects.get(id=job_id)
+        job.attempts += 1
+        try:
+            _registry[job.task](*job.args, **job.kwargs)
+        except Exception:
+            job.last_error = traceback.format_exc()
+            if job.attempts >= job.max_attempts:
+                job.status = 'failed'
+                job.finished_at = timezone.now()
+                logger.error("Job %s (%s) failed permanently", job.id, job.task)
+            else:
+                job.status = 'queued'
+                job.run_at = timezone.now() + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (job.attempts - 1))
+                logger.warning("Job %s (%s) failed, retrying at %s", job.id, job.task, job.run_at)
+        else:
+            job.status = 'done'
+            job.finished_at = timezone.now()
+        owner, job.locked_by = job.locked_by, ''
+        fields = ['status', 'attempts', 'run_at', 'last_error', 'locked_by', 'finished_at']
+        # Only while the lease is ours: requeue_stale may have handed the job on
+        if not Job.objects.filter(id=job.id, status='running', locked_by=owner).update(
+                **{field: getattr(job, field) for field in fields}):
+            logger.warning("Job %s (%s) finished after losing its lease", job.id, job.task)
+    finally:
+        close_old_connections()
+
+
+def renew_leases(job_ids, worker, now=None):
+    """Heartbeat for the jobs ``worker`` is still running."""
+    return Job.objects.filter(id__in=list(job_ids), status='running', locked_by=worker).update(
+        locked_at=now or timezone.now())
+
+
+def requeue_stale(now=None):
+    """
+    Return jobs whose lease lapsed (their worker died mid-run) to the queue.
+
+    The interrupted run counts as an attempt, so a job that keeps killing
+    its worker fails after max_attempts instead of looping forever.
+    """
+    now = now or timezone.now()
+    stale = Job.objects.filter(status='running', locked_at__lt=now - timedelta(seconds=LEASE_SECONDS))
+    stale.filter(attempts__gte=F('max_attempts') - 1).update(
+        status='failed', locked_by='', attempts=F('attempts') + 1, finished_at=now,
+        last_error='Worker stopped renewing the lease')
+    return stale.update(status='queued', locked_by='', attempts=F('attempts') + 1, run_at=now)
+
+
+def prune_finished(days=7):
+    """Bulk-delete finished jobs older than ``days``."""
+    cutoff = timezone.now() - timedelta(days=days)
+    return Job.objects.filter(status__in=['done', 'failed'], finished_at__lt=cutoff).delete()[0]
+
+
+# ======================================================
+# Cron-style schedule
+# ======================================================
+
+_CRON_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+
+
+def _cron_field(spec, low, high):
+    values = set()
+    for part in spec.split(','):
+        step = 1
+        if '/' in part:
+            part, step = part.split('/')
+            step = int(step)
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = map(int, part.split('-'))
+        else:
+            start = end = int(part)
+        values.update(range(start, end + 1, step))
+    return values
+
+
+def cron_matches(expression, moment):
+    """True if a 5-field cron expression (min hour dom month dow, Sunday=0) fires at ``moment``."""
+    fields = expression.split()
+    if len(fields) != 5:
+        raise ValueError(f"Bad cron expression {expression!r}")
+    current = (moment.minute, moment.hour, moment.day, moment.month, moment.isoweekday() % 7)
+    return all(
+        value in _cron_field(spec, low, high)
+        for spec, value, (low, high) in zip(fields, current, _CRON_RANGES)
+    )
+
+
+def enqueue_scheduled(moment=None):
+    """Enqueue every JOB_SCHEDULE entry due this minute (once across all workers)."""
+    moment = (moment or timezone.localtime()).replace(second=0, microsecond=0)
+    queued = []
+    for entry in getattr(settings, 'JOB_SCHEDULE', []):
+        expression, task_name, *rest = entry
+        args = rest[0] if rest else []
+        if cron_matches(expression, moment):
+            key = f"{task_name}:{','.join(map(str, args))}@{moment:%Y%m%d%H%M}"
+            job = enqueue(task_name, *args, run_at=moment, unique_key=key[:150])
+            if job:
+                queued.append(job)
+    return queued
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from shop.archive import CHUNK_SIZE, archive_cutoff, archivable_orders, archive_orders
+
+
+class Command(BaseCommand):
+    help = "Move delivered/cancelled orders older than ORDER_ARCHIVE_DAYS into the archive tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help="Archive horizon in days (default: ORDER_ARCHIVE_DAYS).")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help="Orders moved per transaction.")
+        parser.add_argument('--limit', type=int, default=None,
+                            help="Stop after this many orders.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only count the orders that would be archived.")
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            count = archivable_orders(archive_cutoff(options['days'])).count()
+            self.stdout.write(f"{count} order(s) would be archived.")
+            return
+
+        moved = archive_orders(days=options['days'], chunk_size=options['chunk_size'], limit=options['limit'])
+        if moved:
+            self.stdout.write(self.style.SUCCESS(f"Archived {moved} order(s)."))
+        else:
+            self.stdout.write(self.style.WARNING("No orders to archive."))
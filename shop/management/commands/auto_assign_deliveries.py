@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from shop.delivery import auto_assign_orders, batch_by_area, courier_loads, pending_orders, plan_assignments
+
+
+class Command(BaseCommand):
+    help = "Assign pending orders to the least-loaded delivery staff."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--capacity', type=int, default=None,
+                            help="Maximum open deliveries per courier (defaults to DELIVERY_CAPACITY).")
+        parser.add_argument('--limit', type=int, default=None,
+                            help="Only consider the oldest N pending orders.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Show the plan without writing anything.")
+
+    def handle(self, *args, **options):
+        capacity = options['capacity']
+        if capacity is None:
+            capacity = getattr(settings, 'DELIVERY_CAPACITY', None)
+
+        orders = pending_orders()
+        if options['limit']:
+            orders = orders[:options['limit']]
+
+        if options['dry_run']:
+            plan = plan_assignments(batch_by_area(orders), courier_loads(), capacity,
+                                    getattr(settings, 'DELIVERY_ROUTE_SIZE', None))
+        else:
+            plan = auto_assign_orders(orders=orders, capacity=capacity)
+
+        verb = "Would assign" if options['dry_run'] else "Assigned"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(plan)} order(s)."))
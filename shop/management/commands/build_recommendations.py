@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from shop.recommendations import DEFAULT_TOP_K, build_recommendations, changed_products, last_build_time
+
+
+class Command(BaseCommand):
+    help = "Refresh the precomputed related-products table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help="Rebuild every product instead of only those with new orders or wishlists.")
+        parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K,
+                            help="Recommendations kept per product.")
+
+    def handle(self, *args, **options):
+        since = None if options['full'] else last_build_time()
+        product_ids = None
+        if since is not None:
+            product_ids = changed_products(since)
+            if not product_ids:
+                self.stdout.write("No new orders or wishlist entries since the last build.")
+                return
+
+        written = build_recommendations(product_ids, top_k=options['top_k'])
+        scope = "all products" if product_ids is None else f"{len(product_ids)} product(s)"
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} recommendation(s) for {scope}."))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from shop.suggest import build_index
+
+
+class Command(BaseCommand):
+    help = "Build the search-suggest index (and its shared snapshot if SUGGEST_SNAPSHOT_PATH is set)."
+
+    def handle(self, *args, **options):
+        index = build_index()
+        size = getattr(index, 'count', None) or len(index.entries)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {size} prefix entries."))
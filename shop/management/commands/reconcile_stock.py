@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from shop.inventory import reconcile
+
+
+class Command(BaseCommand):
+    help = "Check cached Product.stock against the StockMovement ledger."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help="Reset drifted stock counts to the ledger total.")
+
+    def handle(self, *args, **options):
+        drift = reconcile(fix=options['fix'])
+        for product_id, cached, ledger in drift:
+            self.stdout.write(f"Product {product_id}: cached {cached}, ledger {ledger}")
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Stock matches the ledger."))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f"Fixed {len(drift)} product(s)."))
+        else:
+            self.stdout.write(self.style.WARNING(f"{len(drift)} product(s) drifted; rerun with --fix to correct."))
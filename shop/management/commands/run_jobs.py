@@ -0,0 +1,54 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from shop.jobs import (
+    HEARTBEAT_SECONDS, claim_jobs, enqueue_scheduled, renew_leases, requeue_stale, run_job, worker_id,
+)
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs on a thread pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help="Jobs run concurrently.")
+        parser.add_argument('--poll', type=float, default=1.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--once', action='store_true', help="Drain due jobs once and exit.")
+        parser.add_argument('--no-schedule', action='store_true', help="Do not enqueue JOB_SCHEDULE entries.")
+
+    def handle(self, *args, **options):
+        worker = worker_id()
+        threads = options['threads']
+        last_minute = None
+        self.stdout.write(f"Worker {worker} started with {threads} thread(s).")
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            while True:
+                minute = timezone.localtime().replace(second=0, microsecond=0)
+                if minute != last_minute:
+                    last_minute = minute
+                    requeue_stale()
+                    if not options['no_schedule']:
+                        enqueue_scheduled(minute)
+
+                claimed = claim_jobs(threads, worker)
+                # Wait for the batch so we never claim more than we can run,
+                # renewing the lease on whatever is still running
+                running = {pool.submit(run_job, job_id): job_id for job_id in claimed}
+                while running:
+                    done, _ = wait(running, timeout=HEARTBEAT_SECONDS)
+                    for future in done:
+                        running.pop(future)
+                        future.result()
+                    if running:
+                        renew_leases(running.values(), worker)
+
+                if options['once'] and not claimed:
+                    break
+                if not claimed:
+                    try:
+                        time.sleep(options['poll'])
+                    except KeyboardInterrupt:
+                        break
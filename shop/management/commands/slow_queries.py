@@ -0,0 +1,48 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from shop.slow_queries import read_entries, summarize
+
+
+class Command(BaseCommand):
+    help = "Summarize SLOW_QUERY_LOG: the worst query fingerprints by total time, with their plans."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=None,
+                            help="Only entries from the last N hours.")
+        parser.add_argument('--limit', type=int, default=10,
+                            help="Fingerprints to show.")
+        parser.add_argument('--scans-only', action='store_true',
+                            help="Only queries whose plan scans a whole table.")
+        parser.add_argument('--log', default=None,
+                            help="Log file (default: SLOW_QUERY_LOG).")
+        parser.add_argument('--clear', action='store_true',
+                            help="Truncate the log after printing the summary.")
+
+    def handle(self, *args, **options):
+        since = time.time() - options['hours'] * 3600 if options['hours'] else None
+        groups = summarize(read_entries(options['log'], since))
+        if options['scans_only']:
+            groups = [group for group in groups if group['scans']]
+
+        if not groups:
+            self.stdout.write(self.style.WARNING("No slow queries logged."))
+        for rank, group in enumerate(groups[:options['limit']], start=1):
+            views = ', '.join(f'{view} ({count})' for view, count in
+                              sorted(group['views'].items(), key=lambda item: -item[1]))
+            self.stdout.write(self.style.SUCCESS(
+                f"#{rank} {group['fingerprint']}  {group['count']}x  total {group['total_ms']:.0f} ms  "
+                f"avg {group['avg_ms']:.1f} ms  max {group['max_ms']:.1f} ms"))
+            self.stdout.write(f"   views: {views}")
+            self.stdout.write(f"   sql:   {group['sql'][:300]}")
+            for line in group['plan']:
+                marker = '  <-- table scan' if line in group['scans'] else ''
+                self.stdout.write(f"   plan:  {line}{marker}")
+            if group['stack']:
+                self.stdout.write(f"   at:    {' > '.join(group['stack'])}")
+
+        if options['clear']:
+            open(options['log'] or settings.SLOW_QUERY_LOG, 'w').close()
+            self.stdout.write(self.style.SUCCESS("Slow-query log cleared."))
@@ -0,0 +1,106 @@
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Python's sqlite3 default, which is what Django uses without OPTIONS['timeout']
+DEFAULT_TIMEOUT = 5.0
+
+
+def _connect(path, production):
+    if production:
+        timeout = int(settings.SQLITE_PRAGMAS['busy_timeout']) / 1000
+    else:
+        timeout = DEFAULT_TIMEOUT
+    conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+    if production:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            conn.execute(f'PRAGMA {name}={value}')
+    return conn
+
+
+def _writer(path, production, transactions, products, results):
+    """Read-modify-write transactions shaped like checkout: read stock, update it, log a movement."""
+    conn = _connect(path, production)
+    committed = locked = 0
+    for i in range(transactions):
+        product_id = i % products + 1
+        try:
+            conn.execute('BEGIN IMMEDIATE' if production else 'BEGIN')
+            stock = conn.execute('SELECT stock FROM product WHERE id = ?', (product_id,)).fetchone()[0]
+            conn.execute('UPDATE product SET stock = ? WHERE id = ?', (stock + 1, product_id))
+            conn.execute('INSERT INTO movement (product_id, quantity) VALUES (?, 1)', (product_id,))
+            conn.execute('COMMIT')
+            committed += 1
+        except sqlite3.OperationalError as exc:
+            if 'locked' not in str(exc) and 'busy' not in str(exc):
+                raise
+            locked += 1
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+    conn.close()
+    results.put((committed, locked))
+
+
+def _reader(path, production, transactions, products, results):
+    """Catalog-style reads running alongside the writers."""
+    conn = _connect(path, production)
+    locked = 0
+    for i in range(transactions * 5):
+        try:
+            conn.execute('SELECT COUNT(*), SUM(stock) FROM product').fetchone()
+        except sqlite3.OperationalError:
+            locked += 1
+    conn.close()
+    results.put((0, locked))
+
+
+class Command(BaseCommand):
+    help = "Compare 'database is locked' errors and throughput of the default and production SQLite profiles."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--transactions', type=int, default=200, help="Transactions per writer.")
+        parser.add_argument('--products', type=int, default=5, help="Hot rows the writers contend on.")
+
+    def run_profile(self, production, options):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.sqlite3')
+            conn = _connect(path, production)
+            conn.execute('CREATE TABLE product (id INTEGER PRIMARY KEY, stock INTEGER NOT NULL)')
+            conn.execute('CREATE TABLE movement (id INTEGER PRIMARY KEY, product_id INTEGER, quantity INTEGER)')
+            conn.executemany('INSERT INTO product (id, stock) VALUES (?, 0)',
+                             [(i,) for i in range(1, options['products'] + 1)])
+            conn.close()
+
+            results = multiprocessing.Queue()
+            args = (path, production, options['transactions'], options['products'], results)
+            workers = [multiprocessing.Process(target=_writer, args=args) for _ in range(options['writers'])]
+            workers += [multiprocessing.Process(target=_reader, args=args) for _ in range(options['readers'])]
+
+            started = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            totals = [results.get() for _ in workers]
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - started
+
+        committed = sum(c for c, _ in totals)
+        locked = sum(lock for _, lock in totals)
+        return committed, locked, elapsed
+
+    def handle(self, *args, **options):
+        expected = options['writers'] * options['transactions']
+        self.stdout.write(f"{options['writers']} writers x {options['transactions']} transactions, "
+                          f"{options['readers']} readers, {options['products']} hot rows\n")
+        self.stdout.write(f"{'profile':<12}{'committed':>12}{'locked':>10}{'tx/s':>10}")
+        for label, production in (('default', False), ('production', True)):
+            committed, locked, elapsed = self.run_profile(production, options)
+            line = f"{label:<12}{f'{committed}/{expected}':>12}{locked:>10}{committed / elapsed:>10.0f}"
+            self.stdout.write(self.style.SUCCESS(line) if not locked else self.style.WARNING(line))
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from shop.db_router import sync_sqlite_replicas
+
+
+class Command(BaseCommand):
+    help = "Copy the primary SQLite database into every file listed in DATABASE_REPLICAS."
+
+    def handle(self, *args, **options):
+        if not settings.REPLICA_FILES:
+            self.stdout.write("No replicas configured (set DATABASE_REPLICAS).")
+            return
+        sync_sqlite_replicas()
+        for alias, path in settings.REPLICA_FILES.items():
+            self.stdout.write(self.style.SUCCESS(f"Synced {alias} -> {path}"))
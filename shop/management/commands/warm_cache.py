@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from shop.warmup import STEPS, warm_up
+
+
+class Command(BaseCommand):
+    help = "Warm this process and the shared cache: DB connections, templates, catalog, top products, suggest index."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--step', action='append', choices=[name for name, _ in STEPS],
+                            help="Only run this step (repeatable).")
+
+    def handle(self, *args, **options):
+        for name, count, ms in warm_up(options['step']):
+            if count is None:
+                self.stdout.write(self.style.WARNING(f"{name}: failed ({ms:.0f} ms)"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"{name}: {count} ({ms:.0f} ms)"))
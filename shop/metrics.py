@@ -0,0 +1,344 @@
+# shop/metrics.py
+# ------------------------------------------------------------
+# Prometheus metrics
+# Counters and histograms live in a dict per process and are
+# written, at most every METRICS_FLUSH_SECONDS, to their own
+# file in METRICS_DIR. /metrics sums every process's file, so
+# the numbers cover all workers of a multi-process WSGI server.
+# Files are replaced atomically and never shared for writing;
+# files left by exited processes are folded into merged.json
+# (under a lock file) so counters stay monotonic and the
+# directory doesn't grow with every restart.
+# ------------------------------------------------------------
+
+import atexit
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single dev server, nothing to lock against
+    fcntl = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+_families = {}
+_samples = defaultdict(float)
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_owner_pid = os.getpid()
+_last_flush = 0.0
+_adopted = False
+MERGED_FILE = 'merged.json'
+
+
+def metrics_enabled():
+    return getattr(settings, 'METRICS_ENABLED', True)
+
+
+def _check_owner():
+    # A forked worker must not report what its parent counted before the fork
+    global _owner_pid, _last_flush, _adopted
+    pid = os.getpid()
+    if pid != _owner_pid:
+        _samples.clear()
+        _owner_pid = pid
+        _last_flush = 0.0
+        _adopted = False
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.labelnames = tuple(labelnames)
+        _families[name] = ('counter', documentation)
+
+    def inc(self, amount=1, **labels):
+        key = (self.name, tuple((label, str(labels[label])) for label in self.labelnames))
+        with _lock:
+            _check_owner()
+            _samples[key] += amount
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.bounds = [repr(float(bound)) for bound in self.buckets] + ['+Inf']
+        _families[name] = ('histogram', documentation)
+
+    def observe(self, value, **labels):
+        labels = tuple((label, str(labels[label])) for label in self.labelnames)
+        with _lock:
+            _check_owner()
+            # Buckets are cumulative: every bucket at or above the value counts it
+            for bound, le in zip((*self.buckets, float('inf')), self.bounds):
+                if value <= bound:
+                    _samples[(f'{self.name}_bucket', (*labels, ('le', le)))] += 1
+            _samples[(f'{self.name}_sum', labels)] += value
+            _samples[(f'{self.name}_count', labels)] += 1
+
+
+# Requests and database
+REQUEST_LATENCY = Histogram(
+    'shop_http_request_duration_seconds', 'Request latency by URL name.', ['view'])
+RESPONSES = Counter(
+    'shop_http_responses_total', 'Responses by URL name and status code.', ['view', 'status'])
+DB_QUERY_LATENCY = Histogram(
+    'shop_db_query_duration_seconds', 'Duration of single SQL queries.', ['view'], QUERY_BUCKETS)
+DB_QUERIES_PER_REQUEST = Histogram(
+    'shop_db_queries_per_request', 'SQL queries issued per request.', ['view'], QUERY_COUNT_BUCKETS)
+
+# Cache
+CACHE_REQUESTS = Counter(
+    'shop_cache_requests_total', 'shop.cache lookups by namespace and result.', ['namespace', 'result'])
+
+# Business
+ORDERS_PLACED = Counter('shop_orders_placed_total', 'Orders committed.', ['payment_method'])
+CHECKOUT_FAILURES = Counter('shop_checkout_failures_total', 'Checkouts that did not place an order.', ['reason'])
+CART_ADDS = Counter('shop_cart_adds_total', 'Products added to a cart.', ['source'])
+DELIVERY_UPDATES = Counter('shop_delivery_updates_total', 'Delivery tracking updates by status.', ['status'])
+RATE_LIMITED = Counter('shop_rate_limited_total', 'Requests rejected by rate limiting.', ['scope'])
+
+
+# ---------- shared files ----------
+
+def metrics_dir():
+    path = getattr(settings, 'METRICS_DIR', None)
+    return Path(path) if path else None
+
+
+def _process_file(directory):
+    return directory / f'{os.getpid()}.json'
+
+
+def _encode(samples):
+    return [[name, [list(pair) for pair in labels], value] for (name, labels), value in samples.items()]
+
+
+def _decode(rows):
+    return {(name, tuple(tuple(pair) for pair in labels)): value for name, labels, value in rows}
+
+
+def _read(path):
+    try:
+        return _decode(json.loads(path.read_text()))
+    except (OSError, ValueError):
+        return {}
+
+
+def _write(path, samples):
+    temporary = path.with_name(f'{path.stem}.tmp')
+    temporary.write_text(json.dumps(_encode(samples)))
+    os.replace(temporary, path)
+
+
+@contextmanager
+def _directory_lock(directory):
+    with open(directory / '.lock', 'a') as handle:
+        if fcntl:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        yield  # closing the file releases the lock
+
+
+def _pid_alive(pid):
+    if os.name != 'posix':
+        return True  # os.kill(pid, 0) would terminate it on Windows
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _fold(directory, paths):
+    # Caller holds the directory lock
+    totals = defaultdict(float, _read(directory / MERGED_FILE))
+    paths = [path for path in paths if path.exists()]
+    for path in paths:
+        for key, value in _read(path).items():
+            totals[key] += value
+    if paths:
+        _write(directory / MERGED_FILE, totals)
+        for path in paths:
+            path.unlink()
+    return len(paths)
+
+
+def _adopt_previous(directory):
+    # A file under our pid is a dead process's (pid reuse): fold it before overwriting
+    global _adopted
+    if not _adopted:
+        with _directory_lock(directory):
+            _fold(directory, [_process_file(directory)])
+        _adopted = True
+
+
+def prune(directory=None):
+    """Fold the files of exited processes into merged.json; returns how many were folded."""
+    directory = directory or metrics_dir()
+    if directory is None or not directory.exists():
+        return 0
+    with _directory_lock(directory):
+        dead = [path for path in directory.glob('*.json')
+                if path.stem.isdigit() and not _pid_alive(int(path.stem))]
+        return _fold(directory, dead)
+
+
+def flush(force=False):
+    """Write this process's samples to its file (at most every METRICS_FLUSH_SECONDS)."""
+    global _last_flush
+    directory = metrics_dir()
+    if directory is None or not metrics_enabled():
+        return
+    # One writer per process at a time; the throttle is checked by that writer
+    with _flush_lock:
+        now = time.monotonic()
+        if not force and now - _last_flush < getattr(settings, 'METRICS_FLUSH_SECONDS', 1.0):
+            return
+        directory.mkdir(parents=True, exist_ok=True)
+        with _lock:
+            _check_owner()
+        _adopt_previous(directory)
+        with _lock:
+            if not _samples:
+                return
+            samples = dict(_samples)
+        _last_flush = now
+        _write(_process_file(directory), samples)
+
+
+atexit.register(flush, force=True)
+
+
+def collect():
+    """Samples summed over every process's file (or just this process without METRICS_DIR)."""
+    directory = metrics_dir()
+    if directory is None:
+        with _lock:
+            _check_owner()
+            return dict(_samples)
+    flush(force=True)
+    prune(directory)
+    totals = defaultdict(float)
+    for path in directory.glob('*.json'):
+        for key, value in _read(path).items():
+            totals[key] += value
+    return totals
+
+
+# ---------- exposition ----------
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def _family(sample_name):
+    for suffix in ('_bucket', '_sum', '_count'):
+        base = sample_name[:-len(suffix)]
+        if sample_name.endswith(suffix) and _families.get(base, ('',))[0] == 'histogram':
+            return base
+    return sample_name
+
+
+def _sort_key(item):
+    (name, labels), _ = item
+    le = dict(labels).get('le')
+    rest = tuple(pair for pair in labels if pair[0] != 'le')
+    return rest, name, float(le) if le is not None else 0.0
+
+
+def cache_hit_ratios(samples):
+    lookups = defaultdict(lambda: {'hit': 0.0, 'miss': 0.0})
+    for (name, labels), value in samples.items():
+        if name == CACHE_REQUESTS.name:
+            labels = dict(labels)
+            lookups[labels['namespace']][labels['result']] += value
+    return {namespace: counts['hit'] / (counts['hit'] + counts['miss'])
+            for namespace, counts in lookups.items() if counts['hit'] + counts['miss']}
+
+
+def render_text(samples=None):
+    """Prometheus text exposition format (version 0.0.4)."""
+    samples = collect() if samples is None else samples
+    grouped = defaultdict(list)
+    for item in samples.items():
+        grouped[_family(item[0][0])].append(item)
+
+    lines = []
+    for family in sorted(grouped):
+        kind, documentation = _families.get(family, ('untyped', ''))
+        lines.append(f'# HELP {family} {documentation}')
+        lines.append(f'# TYPE {family} {kind}')
+        for (name, labels), value in sorted(grouped[family], key=_sort_key):
+            lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+
+    ratios = cache_hit_ratios(samples)
+    if ratios:
+        lines.append('# HELP shop_cache_hit_ratio Share of shop.cache lookups served from cache.')
+        lines.append('# TYPE shop_cache_hit_ratio gauge')
+        for namespace, ratio in sorted(ratios.items()):
+            lines.append(f'shop_cache_hit_ratio{_format_labels([("namespace", namespace)])} {ratio:.4f}')
+    return '\n'.join(lines) + '\n'
+
+
+# ---------- middleware ----------
+
+class MetricsMiddleware:
+    """Request latency, status and SQL histograms per URL name."""
+
+    def __init__(self, get_response):
+        if not metrics_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        durations = []
+
+        def record_query(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                durations.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(record_query))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        REQUEST_LATENCY.observe(elapsed, view=view)
+        RESPONSES.inc(view=view, status=response.status_code)
+        DB_QUERIES_PER_REQUEST.observe(len(durations), view=view)
+        for duration in durations:
+            DB_QUERY_LATENCY.observe(duration, view=view)
+        flush()
+        return response
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:38
+
+from django.db import migrations, models
+
+from shop.addresses import address_area_key
+
+
+def backfill_area_keys(apps, schema_editor):
+    Order = apps.get_model('shop', 'Order')
+    orders = list(Order.objects.only('id', 'address'))
+    for order in orders:
+        order.area_key = address_area_key(order.address)
+    Order.objects.bulk_update(orders, ['area_key'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_alter_product_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='area_key',
+            field=models.CharField(blank=True, db_index=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_area_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:41
+
+from django.db import migrations, models
+from django.db.models import Avg, OuterRef, Subquery
+
+
+def backfill_rating_avg(apps, schema_editor):
+    Product = apps.get_model('shop', 'Product')
+    Review = apps.get_model('shop', 'Review')
+    average = (
+        Review.objects.filter(product=OuterRef('pk'))
+        .order_by().values('product').annotate(avg=Avg('rating')).values('avg')
+    )
+    Product.objects.filter(reviews__isnull=False).update(rating_avg=Subquery(average))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_productrecommendation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.RunPython(backfill_rating_avg, migrations.RunPython.noop),
+    ]
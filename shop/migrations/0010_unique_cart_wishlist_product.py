@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:54
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicates(apps, schema_editor):
+    """Collapse duplicate (user, product) rows so the constraints can be added."""
+    Cart = apps.get_model('shop', 'Cart')
+    Wishlist = apps.get_model('shop', 'Wishlist')
+    for model in (Cart, Wishlist):
+        duplicates = (
+            model.objects.values('user_id', 'product_id')
+            .annotate(n=Count('id'), keep=Min('id'))
+            .filter(n__gt=1).order_by()
+        )
+        for row in duplicates:
+            rows = model.objects.filter(user_id=row['user_id'], product_id=row['product_id'])
+            if model is Cart:
+                total = rows.aggregate(total=Sum('quantity'))['total']
+                Cart.objects.filter(id=row['keep']).update(quantity=total)
+            rows.exclude(id=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0009_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('user', 'product'), name='unique_cart_product'),
+        ),
+        migrations.AddConstraint(
+            model_name='wishlist',
+            constraint=models.UniqueConstraint(fields=('user', 'product'), name='unique_wishlist_product'),
+        ),
+    ]
@@ -0,0 +1,112 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:15
+
+from django.db import migrations, models
+from django.db.models import Max, Min, OuterRef, Subquery
+
+from shop.order_events import normalize_tracking_status
+
+
+def backfill_tracking_state(apps, schema_editor):
+    """Copy each order's latest tracking status and its assigned/delivered times onto the order."""
+    pairs = (
+        (apps.get_model('shop', 'Order'), apps.get_model('shop', 'DeliveryTracking')),
+        (apps.get_model('shop', 'ArchivedOrder'), apps.get_model('shop', 'ArchivedDeliveryTracking')),
+    )
+    for order_model, tracking_model in pairs:
+        rows = tracking_model.objects.filter(order_id=OuterRef('pk'))
+        latest = rows.order_by('-updated_at', '-id')
+
+        def first(queryset, field, aggregate=None):
+            if aggregate:
+                queryset = queryset.order_by().values('order_id').annotate(value=aggregate(field)).values('value')
+            else:
+                queryset = queryset.values(field)
+            return Subquery(queryset[:1])
+
+        order_model.objects.filter(id__in=tracking_model.objects.values('order_id')).update(
+            tracking_status=first(latest, 'status'),
+            tracking_updated_at=first(latest, 'updated_at'),
+            assigned_at=first(rows.filter(status__iexact='assigned'), 'updated_at', Min),
+            delivered_at=first(rows.filter(status__iexact='delivered'), 'updated_at', Max),
+        )
+        # Old tracking rows hold display labels ('Out for Delivery'); store the codes
+        labels = (order_model.objects.exclude(tracking_status='').order_by()
+                  .values_list('tracking_status', flat=True).distinct())
+        for label in list(labels):
+            code = normalize_tracking_status(label) or ''
+            if code != label:
+                order_model.objects.filter(tracking_status=label).update(tracking_status=code)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0012_user_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_id', models.BigIntegerField(db_index=True)),
+                ('kind', models.CharField(choices=[('placed', 'Placed'), ('status', 'Status changed'), ('tracking', 'Tracking update')], max_length=20)),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='assigned_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='delivered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='tracking_status',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='tracking_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='assigned_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='delivered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='tracking_status',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='tracking_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='archiveddeliverytracking',
+            name='status',
+            field=models.CharField(choices=[('assigned', 'Assigned'), ('picked_up', 'Picked Up'), ('out_for_delivery', 'Out for Delivery'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled')], max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='deliverytracking',
+            name='status',
+            field=models.CharField(choices=[('assigned', 'Assigned'), ('picked_up', 'Picked Up'), ('out_for_delivery', 'Out for Delivery'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled')], max_length=50),
+        ),
+        migrations.RunPython(backfill_tracking_state, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0013_order_tracking_state_and_events'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orderevent',
+            name='kind',
+            field=models.CharField(choices=[('placed', 'Placed'), ('status', 'Status changed'), ('tracking', 'Tracking update'), ('deleted', 'Deleted')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:35
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0014_order_event_deleted_kind'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='category_id',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='data',
+            field=models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='end',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='last_event_id',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='start',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='report',
+            name='report_type',
+            field=models.CharField(choices=[('daily', 'Daily'), ('weekly', 'Weekly'), ('monthly', 'Monthly'), ('custom', 'Custom range')], max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['start', 'end', 'category_id'], name='shop_report_range_idx'),
+        ),
+    ]
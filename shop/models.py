@@ -1,5 +1,10 @@
 from django.contrib.auth.models import AbstractUser
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models.functions import Lower
+
+from .addresses import address_area_key
+from .cache import invalidate, product_tags
 
 
 # -----------------------------
@@ -15,6 +20,14 @@ class User(AbstractUser):
     phone = models.CharField(max_length=15, blank=True, null=True)
     address = models.TextField(blank=True, null=True)
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Prefix search in manage_users (case-insensitive)
+            models.Index(Lower('username'), name='shop_user_username_lower_idx'),
+            models.Index(Lower('email'), name='shop_user_email_lower_idx'),
+            models.Index(fields=['phone'], name='shop_user_phone_idx'),
+        ]
+
     def __str__(self):
         return self.username
 
@@ -51,10 +64,16 @@ class Product(models.Model):
 
     stock = models.PositiveIntegerField()
     is_featured = models.BooleanField(default=False)
+    # Denormalized from reviews so listings can filter/facet by rating
+    rating_avg = models.FloatField(default=0, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Backs the low-stock query on the admin dashboard
+            models.Index(fields=['stock'], name='shop_product_stock_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -63,6 +82,12 @@ class Product(models.Model):
         reviews = self.reviews.all()
         return sum(r.rating for r in reviews) / len(reviews) if reviews else 0
 
+    def refresh_rating(self):
+        """Recompute rating_avg from reviews in one aggregate query."""
+        self.rating_avg = self.reviews.aggregate(avg=models.Avg('rating'))['avg'] or 0
+        Product.objects.filter(pk=self.pk).update(rating_avg=self.rating_avg)
+        invalidate(*product_tags(self.pk, self.category_id))
+
 
 # -----------------------------
 # 4️⃣ Cart model
@@ -73,6 +98,11 @@ class Cart(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     added_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='unique_cart_product'),
+        ]
+
     def __str__(self):
         return f"{self.quantity} x {self.product.name} in {self.user.username}'s cart"
 
@@ -102,14 +132,34 @@ class Order(models.Model):
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHODS)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     address = models.TextField()
+    # Route batching: normalized postal code / locality, optional coordinates
+    area_key = models.CharField(max_length=32, blank=True, db_index=True)
+    latitude = models.FloatField(blank=True, null=True)
+    longitude = models.FloatField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Current delivery state, kept in step with the latest DeliveryTracking
+    # row by shop.order_events so nothing needs to scan the tracking table
+    tracking_status = models.CharField(max_length=50, blank=True)
+    tracking_updated_at = models.DateTimeField(blank=True, null=True)
+    assigned_at = models.DateTimeField(blank=True, null=True)
+    delivered_at = models.DateTimeField(blank=True, null=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Archive sweep: finished orders older than the horizon
+            models.Index(fields=['status', 'created_at'], name='shop_order_status_created_idx'),
+        ]
 
     def __str__(self):
         return f"Order {self.id} by {self.customer.username}"
 
+    def save(self, *args, **kwargs):
+        self.area_key = address_area_key(self.address)
+        super().save(*args, **kwargs)
+
+    is_archived = False
+
     def get_total_items(self):
         return sum(item.quantity for item in self.items.all())
 
@@ -136,6 +186,7 @@ class DeliveryTracking(models.Model):
         ('picked_up', 'Picked Up'),
         ('out_for_delivery', 'Out for Delivery'),
         ('delivered', 'Delivered'),
+        ('cancelled', 'Cancelled'),
     )
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='tracking')
     delivery_person = models.ForeignKey(
@@ -166,6 +217,10 @@ class Review(models.Model):
     def __str__(self):
         return f"Review {self.id} - {self.product.name}"
 
+    @property
+    def stars(self):
+        return '⭐' * self.rating
+
 
 # -----------------------------
 # 9️⃣ ContactMessage model
@@ -216,14 +271,26 @@ class Report(models.Model):
         ('daily', 'Daily'),
         ('weekly', 'Weekly'),
         ('monthly', 'Monthly'),
+        ('custom', 'Custom range'),
     )
     report_type = models.CharField(max_length=20, choices=REPORT_TYPES)
     total_sales = models.DecimalField(max_digits=10, decimal_places=2)
     total_orders = models.PositiveIntegerField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # Range and category the sales report page asked for, and the full
+    # shop.analytics report as JSON (computed by a background job)
+    start = models.DateField(blank=True, null=True)
+    end = models.DateField(blank=True, null=True)
+    category_id = models.PositiveIntegerField(blank=True, null=True)
+    data = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    # Newest OrderEvent when computed; a later delivery makes the report stale
+    last_event_id = models.BigIntegerField(default=0)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['start', 'end', 'category_id'], name='shop_report_range_idx'),
+        ]
 
     def __str__(self):
         return f"{self.report_type.capitalize()} Report - {self.created_at.date()}"
@@ -237,5 +304,216 @@ class Wishlist(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='wishlisted_by')
     added_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='unique_wishlist_product'),
+        ]
+
     def __str__(self):
         return f"{self.product.name} in {self.user.username}'s wishlist"
+
+
+# -----------------------------
+# 1️⃣3️⃣ ProductRecommendation model
+# -----------------------------
+class ProductRecommendation(models.Model):
+    """Precomputed top-K "related products" row, rebuilt by build_recommendations."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommended_for')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+    built_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['product', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'recommended'], name='unique_product_recommendation'),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'rank'], name='shop_recommendation_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.recommended.name} for {self.product.name} (#{self.rank})"
+
+
+# -----------------------------
+# 1️⃣4️⃣ StockMovement model
+# -----------------------------
+class StockMovement(models.Model):
+    """Append-only inventory ledger; Product.stock is the running total."""
+    KIND_CHOICES = (
+        ('sale', 'Sale'),
+        ('cancel', 'Cancellation'),
+        ('restock', 'Restock'),
+        ('adjustment', 'Adjustment'),
+    )
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_movements')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    quantity = models.IntegerField(help_text="Signed change in on-hand stock")
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements')
+    # Set when the order moves to the archive (which clears ``order``)
+    archived_order = models.ForeignKey(
+        'ArchivedOrder', on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements'
+    )
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements')
+    note = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.quantity:+d} {self.product.name}"
+
+
+# -----------------------------
+# 1️⃣5️⃣ Job model (background queue)
+# -----------------------------
+class Job(models.Model):
+    """A unit of background work picked up by the run_jobs worker."""
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    task = models.CharField(max_length=100)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_at = models.DateTimeField()
+    # Set for scheduled runs so several workers enqueue each tick once
+    unique_key = models.CharField(max_length=150, unique=True, null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='shop_job_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"Job {self.id} - {self.task} ({self.status})"
+
+
+# -----------------------------
+# 1️⃣6️⃣ IdempotencyKey model
+# -----------------------------
+class IdempotencyKey(models.Model):
+    """One-time checkout token; a replayed POST resolves to the same order."""
+    key = models.CharField(max_length=64, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, null=True, blank=True, related_name='idempotency_keys')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Key {self.key[:8]}… for order {self.order_id or '-'}"
+
+
+# -----------------------------
+# 1️⃣7️⃣ Order archive models
+# -----------------------------
+# Delivered/cancelled orders past ORDER_ARCHIVE_DAYS are moved here (same
+# ids, same related names) by shop.archive so the hot tables stay small.
+class ArchivedOrder(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    customer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_orders')
+    delivery_person = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_deliveries'
+    )
+    status = models.CharField(max_length=50, choices=Order.STATUS_CHOICES)
+    payment_method = models.CharField(max_length=20, choices=Order.PAYMENT_METHODS)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    address = models.TextField()
+    area_key = models.CharField(max_length=32, blank=True)
+    latitude = models.FloatField(blank=True, null=True)
+    longitude = models.FloatField(blank=True, null=True)
+    created_at = models.DateTimeField(db_index=True)
+    tracking_status = models.CharField(max_length=50, blank=True)
+    tracking_updated_at = models.DateTimeField(blank=True, null=True)
+    assigned_at = models.DateTimeField(blank=True, null=True)
+    delivered_at = models.DateTimeField(blank=True, null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    is_archived = True
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Archived order {self.id} by {self.customer.username}"
+
+    def get_total_items(self):
+        return sum(item.quantity for item in self.items.all())
+
+
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='archived_order_items')
+    quantity = models.PositiveIntegerField(default=1)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product.name}"
+
+
+class ArchivedDeliveryTracking(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='tracking')
+    delivery_person = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_tracking_records'
+    )
+    status = models.CharField(max_length=50, choices=DeliveryTracking.STATUS_CHOICES)
+    updated_at = models.DateTimeField()
+    notes = models.TextField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Archived tracking {self.id} - Order {self.order_id}"
+
+
+class ArchivedPayment(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='payments')
+    payment_method = models.CharField(max_length=20, choices=Payment.PAYMENT_METHODS)
+    payment_status = models.CharField(max_length=20, choices=Payment.PAYMENT_STATUS)
+    transaction_id = models.CharField(max_length=100, blank=True, null=True, db_index=True)
+    paid_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Archived payment {self.id} - Order {self.order_id}"
+
+
+# -----------------------------
+# 1️⃣8️⃣ OrderEvent model (outbox)
+# -----------------------------
+class OrderEvent(models.Model):
+    """
+    Append-only log of order changes, written in the same transaction as
+    the change. Consumers remember the last id they handled and read on
+    from there (shop.order_events.events_after).
+    """
+    KIND_CHOICES = (
+        ('placed', 'Placed'),
+        ('status', 'Status changed'),
+        ('tracking', 'Tracking update'),
+        ('deleted', 'Deleted'),
+    )
+    # Plain id, not a FK: events outlive archived and deleted orders
+    order_id = models.BigIntegerField(db_index=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    data = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"Event {self.id} - Order {self.order_id} {self.kind}"
@@ -0,0 +1,216 @@
+# shop/order_events.py
+# ------------------------------------------------------------
+# Order state changes and the OrderEvent outbox
+# Every order change goes through these helpers: the order row
+# (including its denormalized tracking_status/timestamps), the
+# DeliveryTracking row and an OrderEvent are written in one
+# transaction. Consumers tail OrderEvent by id with
+# events_after(); SQLite serializes writers, so ids commit in
+# increasing order and a consumer never skips an event.
+# ------------------------------------------------------------
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import metrics
+from .inventory import restock_order
+from .models import DeliveryTracking, Order, OrderEvent
+
+EVENT_PAGE_SIZE = 100
+
+# Order.status that follows from each tracking status
+ORDER_STATUS_FOR_TRACKING = {
+    'assigned': 'processing',
+    'picked_up': 'shipped',
+    'out_for_delivery': 'shipped',
+    'delivered': 'delivered',
+    'cancelled': 'cancelled',
+}
+# Tracking status an admin's Order.status change implies (when the current one disagrees)
+TRACKING_FOR_ORDER_STATUS = {
+    'pending': '',
+    'processing': 'assigned',
+    'shipped': 'picked_up',
+    'delivered': 'delivered',
+    'cancelled': 'cancelled',
+}
+# Order.status moves allowed from each status; delivered and cancelled are final
+ORDER_TRANSITIONS = {
+    'pending': {'pending', 'processing', 'shipped', 'delivered', 'cancelled'},
+    'processing': {'pending', 'processing', 'shipped', 'delivered', 'cancelled'},
+    'shipped': {'shipped', 'delivered', 'cancelled'},
+    'delivered': set(),
+    'cancelled': set(),
+}
+# Goods are still ours in these states, so cancelling returns them to stock
+PRE_DELIVERY_STATUSES = ('pending', 'processing', 'shipped')
+TRACKING_FIELDS = ['status', 'delivery_person', 'tracking_status', 'tracking_updated_at', 'assigned_at', 'delivered_at']
+TRACKING_ATTNAMES = [Order._meta.get_field(name).attname for name in TRACKING_FIELDS]
+
+
+class InvalidTransition(Exception):
+    """Raised when an order is moved out of a final status (or between unrelated ones)."""
+
+    def __init__(self, order_id, current, requested):
+        self.order_id = order_id
+        self.current = current
+        self.requested = requested
+        super().__init__(f"Order #{order_id} cannot go from {current} to {requested}")
+
+
+def normalize_tracking_status(value):
+    """'Out for Delivery' -> 'out_for_delivery'; None if it isn't a tracking status."""
+    status = (value or '').strip().lower().replace(' ', '_')
+    return status if status in ORDER_STATUS_FOR_TRACKING else None
+
+
+def _event(order, kind, **data):
+    return OrderEvent(order_id=order.id, kind=kind, data=data)
+
+
+def record_event(order, kind, **data):
+    """Append one event; call inside the transaction that made the change."""
+    return OrderEvent.objects.create(order_id=order.id, kind=kind, data=data)
+
+
+def order_placed(order):
+    return record_event(order, 'placed', status=order.status, customer_id=order.customer_id,
+                        total=str(order.total_amount), payment_method=order.payment_method)
+
+
+def order_deleted(order, user=None):
+    return record_event(order, 'deleted', status=order.status, by=user.id if user else None)
+
+
+def _lock_state(order):
+    """Reload the order's state fields under a row lock; the caller may have read them long ago."""
+    current = Order.objects.select_for_update().filter(pk=order.pk).values(*TRACKING_ATTNAMES).get()
+    for attname, value in current.items():
+        setattr(order, attname, value)
+
+
+def _save_state(order, previous):
+    """Write the state fields only if the row still has ``previous`` status."""
+    values = {attname: getattr(order, attname) for attname in TRACKING_ATTNAMES}
+    if not Order.objects.filter(pk=order.pk, status=previous).update(**values):
+        raise InvalidTransition(order.id, previous, order.status)
+
+
+def _apply_state(order, status, tracking_status, delivery_person_id, now):
+    """Move the order (and its denormalized tracking fields) to ``status``; returns the previous status."""
+    previous = order.status
+    if status not in ORDER_TRANSITIONS.get(previous, ()):
+        raise InvalidTransition(order.id, previous, status)
+    reassigned = (tracking_status, delivery_person_id) != (order.tracking_status, order.delivery_person_id)
+    order.status = status
+    order.delivery_person_id = delivery_person_id
+    order.tracking_status = tracking_status
+    order.tracking_updated_at = now
+    if tracking_status == 'assigned' and reassigned:
+        order.assigned_at = now
+    elif tracking_status == 'delivered':
+        order.delivered_at = now
+    elif not tracking_status:
+        order.assigned_at = None
+    return previous
+
+
+def _apply_tracking(order, status, delivery_person_id, now):
+    return _apply_state(order, ORDER_STATUS_FOR_TRACKING[status], status, delivery_person_id, now)
+
+
+def _restock_if_cancelled(order, previous, user):
+    if order.status == 'cancelled' and previous in PRE_DELIVERY_STATUSES:
+        restock_order(order, user=user)
+
+
+@transaction.atomic
+def add_tracking(order, status, delivery_person=None, notes=''):
+    """
+    Record a tracking update: tracking row, order's current state and an event, atomically.
+
+    The order's state is re-read under a row lock first, so a change made
+    since the caller loaded it is validated against. Raises
+    InvalidTransition if the order is already delivered or cancelled.
+    """
+    _lock_state(order)
+    now = timezone.now()
+    courier_id = delivery_person.id if delivery_person else order.delivery_person_id
+    previous = _apply_tracking(order, status, courier_id, now)
+    _save_state(order, previous)
+    tracking = DeliveryTracking.objects.create(
+        order=order, delivery_person_id=courier_id, status=status, notes=notes,
+    )
+    record_event(order, 'tracking', tracking_status=status, status=order.status, previous_status=previous,
+                 delivery_person_id=courier_id, tracking_id=tracking.id)
+    _restock_if_cancelled(order, previous, delivery_person)
+    return tracking
+
+
+def bulk_assign(orders_by_courier, batch_size=500):
+    """
+    add_tracking(order, 'assigned', courier) for many orders at once.
+
+    ``orders_by_courier`` is [(order, courier_id)]; call inside a transaction.
+    """
+    now = timezone.now()
+    updated, tracking, events = [], [], []
+    for order, courier_id in orders_by_courier:
+        previous = _apply_tracking(order, 'assigned', courier_id, now)
+        updated.append(order)
+        tracking.append(DeliveryTracking(order=order, delivery_person_id=courier_id, status='assigned'))
+        events.append(_event(order, 'tracking', tracking_status='assigned', status=order.status,
+                             previous_status=previous, delivery_person_id=courier_id))
+    Order.objects.bulk_update(updated, TRACKING_FIELDS, batch_size=batch_size)
+    DeliveryTracking.objects.bulk_create(tracking, batch_size=batch_size)
+    OrderEvent.objects.bulk_create(events, batch_size=batch_size)
+    # bulk_create sends no post_save, so the signal-based counter misses these
+    assigned = len(tracking)
+    transaction.on_commit(lambda: metrics.DELIVERY_UPDATES.inc(assigned, status='assigned'))
+
+
+@transaction.atomic
+def set_status(order, status, user=None):
+    """
+    Change Order.status (admin action), keeping the tracking fields in step, and record it.
+
+    Moving back to pending releases the courier; cancelling restocks
+    undelivered goods. Raises InvalidTransition like add_tracking().
+    """
+    _lock_state(order)
+    tracking_status = order.tracking_status
+    if ORDER_STATUS_FOR_TRACKING.get(tracking_status) != status:
+        tracking_status = TRACKING_FOR_ORDER_STATUS[status]
+    courier_id = order.delivery_person_id if status != 'pending' else None
+    if tracking_status in ('assigned', 'picked_up') and not courier_id:
+        tracking_status = ''
+    previous = _apply_state(order, status, tracking_status, courier_id, timezone.now())
+    _save_state(order, previous)
+    event = record_event(order, 'status', status=status, previous_status=previous,
+                         tracking_status=tracking_status, by=user.id if user else None)
+    _restock_if_cancelled(order, previous, user)
+    return event
+
+
+def events_after(after_id=0, limit=EVENT_PAGE_SIZE, kinds=None):
+    """Up to ``limit`` events with id > ``after_id``, oldest first."""
+    events = OrderEvent.objects.filter(id__gt=after_id)
+    if kinds:
+        events = events.filter(kind__in=kinds)
+    return list(events.order_by('id')[:limit])
+
+
+def event_json(event):
+    return {'id': event.id, 'order_id': event.order_id, 'kind': event.kind,
+            'data': event.data, 'created_at': event.created_at.isoformat()}
+
+
+def prune_events(days=None):
+    """Delete events older than ORDER_EVENT_RETENTION_DAYS; consumers must keep up within that window."""
+    if days is None:
+        days = getattr(settings, 'ORDER_EVENT_RETENTION_DAYS', 30)
+    deleted, _ = OrderEvent.objects.filter(created_at__lt=timezone.now() - timedelta(days=days)).delete()
+    return deleted
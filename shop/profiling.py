@@ -0,0 +1,186 @@
+# shop/profiling.py
+# ------------------------------------------------------------
+# Template render profiling
+# With TEMPLATE_PROFILING on, every template (including extends
+# parents and includes) and every tag/variable node is timed and
+# the totals are aggregated per URL name in this process. Times
+# are inclusive: a template's time contains its includes.
+# ------------------------------------------------------------
+
+import logging
+import threading
+from collections import defaultdict
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.template.base import Node, Template
+
+logger = logging.getLogger(__name__)
+
+TOP_N = 10
+
+_current = ContextVar('template_profile', default=None)
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def profiling_enabled():
+    return getattr(settings, 'TEMPLATE_PROFILING', False)
+
+
+class RenderProfile:
+    """Timings collected while rendering one response."""
+
+    def __init__(self):
+        self.templates = defaultdict(lambda: [0, 0.0])
+        self.tags = defaultdict(lambda: [0, 0.0])
+
+    def add(self, bucket, label, elapsed):
+        entry = bucket[label]
+        entry[0] += 1
+        entry[1] += elapsed
+
+    @property
+    def total(self):
+        # The outermost template render covers everything else
+        return max((seconds for _, seconds in self.templates.values()), default=0.0)
+
+
+def current_profile():
+    return _current.get()
+
+
+def use_profile(profile):
+    """Collect into ``profile`` from here on; pass the token to reset_profile()."""
+    return _current.set(profile)
+
+
+def reset_profile(token):
+    _current.reset(token)
+
+
+def _node_label(node):
+    token = getattr(node, 'token', None)
+    origin = getattr(node, 'origin', None)
+    where = f"{getattr(origin, 'template_name', None) or '<string>'}:{getattr(token, 'lineno', '?')}"
+    contents = (token.contents if token else type(node).__name__)[:60]
+    if type(node).__name__ == 'VariableNode':
+        return f'{where} {{{{ {contents} }}}}'
+    return f'{where} {{% {contents} %}}'
+
+
+def install():
+    """Wrap Template._render and Node.render_annotated with timers (idempotent)."""
+    if getattr(Template._render, 'profiled', False):
+        return
+    original_template_render = Template._render
+    original_node_render = Node.render_annotated
+
+    def _render(self, context):
+        profile = _current.get()
+        if profile is None:
+            return original_template_render(self, context)
+        start = perf_counter()
+        try:
+            return original_template_render(self, context)
+        finally:
+            name = getattr(self.origin, 'template_name', None) or self.name or '<string>'
+            profile.add(profile.templates, name, perf_counter() - start)
+
+    def render_annotated(self, context):
+        # TextNode overrides render_annotated, so plain text is never timed
+        profile = _current.get()
+        if profile is None:
+            return original_node_render(self, context)
+        start = perf_counter()
+        try:
+            return original_node_render(self, context)
+        finally:
+            profile.add(profile.tags, _node_label(self), perf_counter() - start)
+
+    _render.profiled = True
+    Template._render = _render
+    Node.render_annotated = render_annotated
+
+
+def _merge(target, source):
+    for label, (count, seconds) in source.items():
+        entry = target.setdefault(label, [0, 0.0, 0.0])
+        entry[0] += count
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+
+
+def record(url_name, profile):
+    with _stats_lock:
+        stats = _stats.setdefault(url_name, {'requests': 0, 'seconds': 0.0, 'templates': {}, 'tags': {}})
+        stats['requests'] += 1
+        stats['seconds'] += profile.total
+        _merge(stats['templates'], profile.templates)
+        _merge(stats['tags'], profile.tags)
+
+
+def _top(entries, requests, limit):
+    rows = [
+        {'label': label, 'calls': count, 'total_ms': seconds * 1000,
+         'per_request_ms': seconds * 1000 / requests, 'max_ms': worst * 1000}
+        for label, (count, seconds, worst) in entries.items()
+    ]
+    return sorted(rows, key=lambda row: -row['total_ms'])[:limit]
+
+
+def report(limit=TOP_N):
+    """Per URL name, slowest first: average render time plus the top templates and tags."""
+    with _stats_lock:
+        snapshot = {
+            url: {**stats, 'templates': dict(stats['templates']), 'tags': dict(stats['tags'])}
+            for url, stats in _stats.items()
+        }
+    rows = [
+        {'url': url, 'requests': stats['requests'],
+         'avg_ms': stats['seconds'] * 1000 / stats['requests'],
+         'templates': _top(stats['templates'], stats['requests'], limit),
+         'tags': _top(stats['tags'], stats['requests'], limit)}
+        for url, stats in snapshot.items()
+    ]
+    return sorted(rows, key=lambda row: -row['avg_ms'])
+
+
+def reset():
+    with _stats_lock:
+        _stats.clear()
+
+
+class TemplateProfileMiddleware:
+    """Collect template timings for each request and fold them into the per-URL report."""
+
+    def __init__(self, get_response):
+        if not profiling_enabled():
+            raise MiddlewareNotUsed
+        install()
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'TEMPLATE_PROFILE_SLOW_MS', 200)
+
+    def __call__(self, request):
+        # Share the profile with ServerTimingMiddleware when it is collecting one
+        profile = _current.get()
+        token = None
+        if profile is None:
+            profile = RenderProfile()
+            token = _current.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            if token is not None:
+                _current.reset(token)
+        if profile.templates:
+            match = request.resolver_match
+            url_name = match.view_name if match else request.path
+            record(url_name, profile)
+            if profile.total * 1000 >= self.slow_ms:
+                slowest = max(profile.templates.items(), key=lambda item: item[1][1])[0]
+                logger.warning("Slow render %s: %.0f ms (slowest template %s)",
+                               url_name, profile.total * 1000, slowest)
+        return response
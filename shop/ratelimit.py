@@ -0,0 +1,116 @@
+# shop/ratelimit.py
+# ------------------------------------------------------------
+# Cache-backed rate limiting for abuse-prone POST endpoints
+# Each (scope, client) pair gets a bucket of RATE_LIMITS[scope]
+# = (tokens, seconds): up to ``tokens`` requests at once, refilled
+# evenly over ``seconds``. The bucket is kept as two atomic cache
+# counters (this window and the previous one, weighted by how much
+# of it still overlaps), so concurrent workers sharing the cache
+# never race on a read-modify-write.
+# ------------------------------------------------------------
+
+import hashlib
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.shortcuts import render
+
+from . import metrics
+from .cache import get_cache
+
+
+class RateLimited(Exception):
+    def __init__(self, scope, retry_after):
+        self.scope = scope
+        self.retry_after = retry_after
+        super().__init__(f"Rate limit exceeded for {scope}; retry in {retry_after}s")
+
+
+def client_ip(request):
+    return request.META.get(getattr(settings, 'RATE_LIMIT_IP_HEADER', 'REMOTE_ADDR'), '').split(',')[0].strip()
+
+
+def _ident(request, key):
+    if callable(key):
+        return key(request)
+    if key == 'user' and request.user.is_authenticated:
+        return f'u{request.user.pk}'
+    return f'ip{client_ip(request)}'
+
+
+def hit(scope, ident, now=None):
+    """
+    Take one token from the (scope, ident) bucket.
+
+    Raises RateLimited with the seconds until a token is free. Unknown
+    scopes and RATE_LIMIT_ENABLED = False never limit.
+    """
+    limit = getattr(settings, 'RATE_LIMITS', {}).get(scope)
+    if not limit or not getattr(settings, 'RATE_LIMIT_ENABLED', True):
+        return
+    tokens, period = limit
+    now = time.time() if now is None else now
+    window, elapsed = divmod(now, period)
+    prefix = f'shop:rl:{scope}:{ident}:'
+    key = f'{prefix}{int(window)}'
+
+    cache = get_cache()
+    try:
+        used = cache.incr(key)
+    except ValueError:
+        if cache.add(key, 1, timeout=2 * period):
+            used = 1
+        else:
+            used = cache.incr(key)
+    previous = cache.get(f'{prefix}{int(window) - 1}', 0)
+
+    overlap = 1 - elapsed / period
+    if previous * overlap + used <= tokens:
+        return
+
+    # Wait until enough of the previous window has slid out (or this one ends)
+    excess = previous * overlap + used - tokens
+    wait = period - elapsed
+    if previous:
+        wait = min(wait, excess / previous * period)
+    raise RateLimited(scope, max(1, math.ceil(wait)))
+
+
+def limited_response(request, error):
+    """429 with Retry-After: JSON for API callers, the 429 page otherwise."""
+    message = getattr(settings, 'RATE_LIMIT_MESSAGE', "Too many requests. Please try again shortly.")
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest' or 'json' in request.headers.get('accept', ''):
+        response = JsonResponse({'error': message, 'retry_after': error.retry_after}, status=429)
+    else:
+        response = render(request, getattr(settings, 'RATE_LIMIT_TEMPLATE', '429.html'),
+                          {'message': message, 'retry_after': error.retry_after}, status=429)
+    response['Retry-After'] = str(error.retry_after)
+    return response
+
+
+def rate_limit(scope, key='ip', methods=('POST',)):
+    """
+    Limit a view per client. ``key`` is 'ip', 'user' (falls back to IP
+    for anonymous visitors) or a callable(request) returning an identifier.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method in methods:
+                try:
+                    hit(scope, _ident(request, key))
+                except RateLimited as error:
+                    metrics.RATE_LIMITED.inc(scope=scope)
+                    return limited_response(request, error)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def posted_username(request):
+    """Login attempts are also limited per account, whatever the IP."""
+    username = request.POST.get('username', '').strip().lower()
+    return 'name' + hashlib.md5(username.encode()).hexdigest()
@@ -0,0 +1,120 @@
+# shop/recommendations.py
+# ------------------------------------------------------------
+# "Related products" index
+# Item-item scores from order co-purchases and wishlist overlap
+# ------------------------------------------------------------
+
+import heapq
+import math
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .models import OrderItem, Product, ProductRecommendation, Wishlist
+
+DEFAULT_TOP_K = 8
+WISHLIST_WEIGHT = 0.5
+
+
+def _item_counts(queryset, group):
+    """{product_id: number of distinct baskets containing it}."""
+    rows = queryset.values_list('product_id').annotate(n=Count(group, distinct=True)).order_by()
+    return dict(rows)
+
+
+def _pair_counts(queryset, other, group, product_ids=None):
+    """
+    Sparse co-occurrence matrix as {(product_id, other_id): count}.
+
+    The self-join and grouping run in the database, so only non-zero
+    cells ever reach Python.
+    """
+    if product_ids is not None:
+        queryset = queryset.filter(product_id__in=product_ids)
+    rows = (
+        queryset.filter(**{f'{other}__isnull': False})
+        .values_list('product_id', other)
+        .annotate(n=Count(group, distinct=True))
+        .order_by()
+    )
+    return {(left, right): n for left, right, n in rows if left != right}
+
+
+def compute_scores(product_ids=None):
+    """
+    Return {product_id: {other_id: score}} for the given products (all if None).
+
+    Score is a cosine similarity over baskets, where an order counts as a
+    basket with weight 1 and a user's wishlist with ``WISHLIST_WEIGHT``.
+    """
+    order_items = _item_counts(OrderItem.objects.all(), 'order')
+    wished = _item_counts(Wishlist.objects.all(), 'user')
+    order_pairs = _pair_counts(OrderItem.objects.all(), 'order__items__product', 'order', product_ids)
+    wish_pairs = _pair_counts(Wishlist.objects.all(), 'user__wishlist_items__product', 'user', product_ids)
+
+    def weight(product_id):
+        return order_items.get(product_id, 0) + WISHLIST_WEIGHT * wished.get(product_id, 0)
+
+    scores = defaultdict(dict)
+    for pair in order_pairs.keys() | wish_pairs.keys():
+        left, right = pair
+        denominator = math.sqrt(weight(left) * weight(right))
+        if denominator:
+            together = order_pairs.get(pair, 0) + WISHLIST_WEIGHT * wish_pairs.get(pair, 0)
+            scores[left][right] = together / denominator
+    return scores
+
+
+def changed_products(since):
+    """Products ordered or wishlisted after ``since``."""
+    ordered = OrderItem.objects.filter(order__created_at__gte=since).values_list('product_id', flat=True)
+    wishlisted = Wishlist.objects.filter(added_at__gte=since).values_list('product_id', flat=True)
+    return set(ordered) | set(wishlisted)
+
+
+def last_build_time():
+    return ProductRecommendation.objects.aggregate(last=Max('built_at'))['last']
+
+
+def build_recommendations(product_ids=None, top_k=DEFAULT_TOP_K):
+    """
+    Rebuild the top-K table for ``product_ids`` (every product if None).
+
+    Returns the number of recommendation rows written.
+    """
+    built_at = timezone.now()
+    scores = compute_scores(product_ids)
+
+    rows = []
+    for product_id, neighbours in scores.items():
+        best = heapq.nlargest(top_k, neighbours.items(), key=lambda item: item[1])
+        rows.extend(
+            ProductRecommendation(product_id=product_id, recommended_id=other_id,
+                                  score=score, rank=rank, built_at=built_at)
+            for rank, (other_id, score) in enumerate(best, start=1)
+        )
+
+    with transaction.atomic():
+        stale = ProductRecommendation.objects.all()
+        if product_ids is not None:
+            stale = stale.filter(product_id__in=product_ids)
+        stale.delete()
+        ProductRecommendation.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def related_products(product, limit=4):
+    """Top recommendations for a product, topped up from the same category."""
+    related = list(
+        Product.objects.filter(recommended_for__product=product)
+        .order_by('recommended_for__rank')[:limit]
+    )
+    if len(related) < limit:
+        exclude = [product.id] + [p.id for p in related]
+        related += list(
+            Product.objects.filter(category_id=product.category_id)
+            .exclude(id__in=exclude)[:limit - len(related)]
+        )
+    return related
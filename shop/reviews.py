@@ -0,0 +1,61 @@
+# shop/reviews.py
+# ------------------------------------------------------------
+# Product reviews served in pages
+# Keyset pagination on the review id (newest first), so page N
+# costs the same as page 1, plus a cached rating histogram
+# ------------------------------------------------------------
+
+from django.db.models import Count
+
+from . import cache
+from .models import Review
+
+REVIEWS_PER_PAGE = 5
+
+
+def review_page(product_id, before=None, limit=REVIEWS_PER_PAGE):
+    """
+    Up to ``limit`` reviews older than review id ``before``.
+
+    Returns (reviews, next_cursor); next_cursor is None on the last page.
+    One extra row is fetched to know whether another page exists.
+    """
+    reviews = Review.objects.filter(product_id=product_id).select_related('user').order_by('-id')
+    if before:
+        reviews = reviews.filter(id__lt=before)
+    rows = list(reviews[:limit + 1])
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1].id
+    return rows, None
+
+
+def _histogram(product_id):
+    counts = dict(
+        Review.objects.filter(product_id=product_id)
+        .values_list('rating').annotate(n=Count('id')).order_by()
+    )
+    total = sum(counts.values())
+    bars = [
+        {'rating': rating, 'count': counts.get(rating, 0),
+         'percent': round(100 * counts.get(rating, 0) / total) if total else 0}
+        for rating in range(5, 0, -1)
+    ]
+    return {'total': total, 'bars': bars}
+
+
+def rating_histogram(product_id):
+    """{'total': n, 'bars': [{rating, count, percent}] 5★→1★}, cached per product."""
+    return cache.get_or_set(
+        'reviews', ('histogram', product_id), lambda: _histogram(product_id), [f'product:{product_id}'],
+    )
+
+
+def review_json(review):
+    return {
+        'id': review.id,
+        'user': review.user.username,
+        'rating': review.rating,
+        'stars': review.stars,
+        'comment': review.comment,
+        'date': review.created_at.strftime('%b %d, %Y'),
+    }
@@ -0,0 +1,86 @@
+# shop/signals.py
+# ------------------------------------------------------------
+# Model signal receivers, connected in ShopConfig.ready()
+# ------------------------------------------------------------
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import metrics, suggest
+from .cache import invalidate, product_tags
+from .carts import invalidate_product_state
+from .models import Cart, Category, DeliveryTracking, Order, Product, Review, Wishlist
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+def update_suggest_index(sender, instance, **kwargs):
+    kind = 'product' if sender is Product else 'category'
+    suggest.update_entry(kind, instance.pk, instance.name)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+def remove_from_suggest_index(sender, instance, **kwargs):
+    kind = 'product' if sender is Product else 'category'
+    suggest.update_entry(kind, instance.pk, None)
+
+
+@receiver(pre_save, sender=Product)
+def remember_old_category(sender, instance, **kwargs):
+    # A product moved between categories must clear the old category's pages too
+    if instance.pk:
+        instance._old_category_id = (
+            Product.objects.filter(pk=instance.pk).values_list('category_id', flat=True).first()
+        )
+
+
+def _invalidate_on_commit(*tags):
+    # Bump after commit so a concurrent reader can't re-cache the pre-commit rows
+    transaction.on_commit(lambda: invalidate(*tags))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_cache(sender, instance, **kwargs):
+    tags = list(product_tags(instance.pk, instance.category_id))
+    old_category_id = getattr(instance, '_old_category_id', None)
+    if old_category_id and old_category_id != instance.category_id:
+        tags.append(f'category:{old_category_id}')
+    _invalidate_on_commit(*tags)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_cache(sender, instance, **kwargs):
+    _invalidate_on_commit('catalog', f'category:{instance.pk}')
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_review_cache(sender, instance, **kwargs):
+    _invalidate_on_commit(f'product:{instance.product_id}')
+
+
+@receiver(post_save, sender=Cart)
+@receiver(post_delete, sender=Cart)
+@receiver(post_save, sender=Wishlist)
+@receiver(post_delete, sender=Wishlist)
+def invalidate_user_lists(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_product_state(user_id))
+
+
+@receiver(post_save, sender=Order)
+def count_order_placed(sender, instance, created, **kwargs):
+    if created:
+        payment_method = instance.payment_method
+        transaction.on_commit(lambda: metrics.ORDERS_PLACED.inc(payment_method=payment_method))
+
+
+@receiver(post_save, sender=DeliveryTracking)
+def count_delivery_update(sender, instance, created, **kwargs):
+    if created:
+        status = instance.status
+        transaction.on_commit(lambda: metrics.DELIVERY_UPDATES.inc(status=status))
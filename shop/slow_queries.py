@@ -0,0 +1,193 @@
+# shop/slow_queries.py
+# ------------------------------------------------------------
+# Slow-query log
+# Every DB connection gets an execute wrapper. A query slower
+# than SLOW_QUERY_MS is appended to SLOW_QUERY_LOG as one JSON
+# line: fingerprint, duration, originating view, a snippet of
+# our own stack and the EXPLAIN QUERY PLAN (captured once per
+# fingerprint per process). `manage.py slow_queries` ranks the
+# worst fingerprints.
+# ------------------------------------------------------------
+
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+import traceback
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+STACK_DEPTH = 6
+MAX_SQL_LENGTH = 2000
+PLAN_TTL_SECONDS = 600
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_SPACE_RE = re.compile(r'\s+')
+
+_plans = {}
+_local = threading.local()
+_write_lock = threading.Lock()
+
+
+def normalize(sql):
+    """SQL with literals and IN-list lengths removed, so similar queries group together."""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.md5(normalize(sql).encode()).hexdigest()[:12]
+
+
+def _project_frames():
+    """Our own frames (not Django's or this module's), innermost last."""
+    root = str(settings.BASE_DIR)
+    return [
+        frame for frame in traceback.extract_stack()
+        if frame.filename.startswith(root) and 'site-packages' not in frame.filename
+        and not frame.filename.endswith('slow_queries.py')
+    ]
+
+
+def _view_name(frames):
+    # The outermost function in views.py is the view itself
+    for frame in frames:
+        if Path(frame.filename).match('shop/views.py'):
+            return frame.name
+    return frames[-1].name if frames else None
+
+
+def explain(connection, sql, params):
+    """EXPLAIN QUERY PLAN rows (SQLite) or EXPLAIN output, run without re-entering the logger."""
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return []
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    _local.explaining = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            rows = cursor.fetchall()
+    except Exception as exc:  # the plan is diagnostic only; never break the request
+        return [f'EXPLAIN failed: {exc}']
+    finally:
+        _local.explaining = False
+    # SQLite rows are (id, parent, notused, detail)
+    return [row[-1] if connection.vendor == 'sqlite' else ' '.join(map(str, row)) for row in rows]
+
+
+def _plan_for(connection, key, sql, params):
+    cached = _plans.get(key)
+    now = time.monotonic()
+    if cached and now - cached[0] < PLAN_TTL_SECONDS:
+        return cached[1]
+    plan = explain(connection, sql, params)
+    _plans[key] = (now, plan)
+    return plan
+
+
+def is_table_scan(plan):
+    """SQLite plan lines that walk a whole table rather than an index."""
+    return [line for line in plan if line.startswith('SCAN') and 'USING' not in line]
+
+
+def write_entry(entry):
+    path = getattr(settings, 'SLOW_QUERY_LOG', None)
+    if not path:
+        return
+    line = json.dumps(entry, default=str) + '\n'
+    with _write_lock, open(path, 'a', encoding='utf-8') as handle:
+        handle.write(line)
+
+
+def log_slow_query(connection, sql, params, seconds):
+    frames = _project_frames()
+    key = fingerprint(sql)
+    plan = _plan_for(connection, key, sql, params)
+    entry = {
+        'ts': time.time(),
+        'fingerprint': key,
+        'ms': round(seconds * 1000, 2),
+        'db': connection.alias,
+        'view': _view_name(frames),
+        'sql': normalize(sql)[:MAX_SQL_LENGTH],
+        'stack': [f'{Path(frame.filename).name}:{frame.lineno} in {frame.name}' for frame in frames[-STACK_DEPTH:]],
+        'plan': plan,
+    }
+    logger.warning("Slow query %s (%.0f ms) in %s%s", key, entry['ms'], entry['view'],
+                   ' [table scan]' if is_table_scan(plan) else '')
+    write_entry(entry)
+
+
+def slow_query_wrapper(execute, sql, params, many, context):
+    if getattr(_local, 'explaining', False) or many:
+        return execute(sql, params, many, context)
+    if random.random() >= getattr(settings, 'SLOW_QUERY_SAMPLE_RATE', 1.0):
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    result = execute(sql, params, many, context)
+    elapsed = time.perf_counter() - start
+    if elapsed * 1000 >= getattr(settings, 'SLOW_QUERY_MS', 100):
+        try:
+            log_slow_query(context['connection'], sql, params, elapsed)
+        except Exception:  # logging must never fail the query
+            logger.exception("Could not record slow query")
+    return result
+
+
+def install(sender=None, connection=None, **kwargs):
+    """connection_created receiver: add the wrapper once per connection object."""
+    if not getattr(settings, 'SLOW_QUERY_LOGGING', False):
+        return
+    # The connection may open inside a request, below execute_wrapper()
+    # contexts that pop the last wrapper on exit; going first keeps it out of their way
+    if slow_query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, slow_query_wrapper)
+
+
+# ---------- summary ----------
+
+def read_entries(path=None, since=None):
+    path = Path(path or settings.SLOW_QUERY_LOG)
+    if not path.exists():
+        return
+    with open(path, encoding='utf-8') as handle:
+        for line in handle:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if since is None or entry.get('ts', 0) >= since:
+                yield entry
+
+
+def summarize(entries):
+    """Per fingerprint: count, total/avg/max ms, views, plan and a sample, worst total first."""
+    groups = {}
+    for entry in entries:
+        group = groups.setdefault(entry['fingerprint'], {
+            'fingerprint': entry['fingerprint'], 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+            'views': {}, 'sql': entry['sql'], 'plan': entry.get('plan') or [], 'stack': entry.get('stack', []),
+        })
+        group['count'] += 1
+        group['total_ms'] += entry['ms']
+        if entry['ms'] >= group['max_ms']:
+            group['max_ms'] = entry['ms']
+            group['stack'] = entry.get('stack', [])
+        if entry.get('plan'):
+            group['plan'] = entry['plan']
+        view = entry.get('view') or '-'
+        group['views'][view] = group['views'].get(view, 0) + 1
+    for group in groups.values():
+        group['avg_ms'] = group['total_ms'] / group['count']
+        group['scans'] = is_table_scan(group['plan'])
+    return sorted(groups.values(), key=lambda group: -group['total_ms'])
@@ -0,0 +1,319 @@
+# shop/suggest.py
+# ------------------------------------------------------------
+# Search-as-you-type prefix index
+# Sorted-array index over product and category names, weighted
+# by units sold, with an optional memory-mapped snapshot file
+# shared by every worker process. Without a snapshot each worker
+# keeps its own index and rebuilds it when the shared 'suggest'
+# cache tag moves, so one worker's edit reaches all of them.
+# ------------------------------------------------------------
+
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from bisect import bisect_left
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .cache import invalidate, tag_version
+from .jobs import enqueue
+from .models import Category, OrderItem, Product
+
+HOT_PREFIX_LENGTH = 2
+SNAPSHOT_MAGIC = b'PNSX'
+SNAPSHOT_HEADER = struct.Struct('<4sI')
+SNAPSHOT_OFFSET = struct.Struct('<I')
+INDEX_RECHECK_SECONDS = 1.0
+SUGGEST_TAG = 'suggest'
+FIELD_SEP = '\x1f'
+PREFIX_END = '\uffff'
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    return ' '.join(_WORD_RE.findall((text or '').lower()))
+
+
+def index_keys(name):
+    """Every word-suffix of a name, so 'blue shirt' is found by 'bl' and 'sh'."""
+    words = normalize(name).split()
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+def _top(candidates, limit):
+    """Highest weight first, one row per (kind, id)."""
+    seen, results = set(), []
+    for _, weight, kind, obj_id, label in sorted(candidates, key=lambda e: (-e[1], e[4])):
+        if (kind, obj_id) in seen:
+            continue
+        seen.add((kind, obj_id))
+        results.append({'kind': kind, 'id': obj_id, 'label': label, 'weight': weight})
+        if len(results) == limit:
+            break
+    return results
+
+
+# ======================================================
+# In-process index
+# ======================================================
+
+class PrefixIndex:
+    """Sorted (key, weight, kind, id, label) entries searched with bisect."""
+
+    def __init__(self, entries=(), version=None):
+        self.entries = sorted(entries)
+        # SUGGEST_TAG version the entries were read at
+        self.version = version
+        self.keys = [entry[0] for entry in self.entries]
+        # (kind, id) -> (name, weight), to find an object's entries again by bisect
+        self._objects = {(entry[2], entry[3]): (entry[4], entry[1]) for entry in self.entries}
+        self._hot = {}
+        self._lock = threading.Lock()
+
+    def search(self, prefix, limit=8):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        hot = len(prefix) <= HOT_PREFIX_LENGTH
+        # replace() edits keys/entries in place and resets _hot; searching under
+        # the same lock keeps lo/hi valid for entries and stale results out of _hot
+        with self._lock:
+            if hot and (prefix, limit) in self._hot:
+                return self._hot[(prefix, limit)]
+
+            lo = bisect_left(self.keys, prefix)
+            hi = bisect_left(self.keys, prefix + PREFIX_END, lo)
+            results = _top(self.entries[lo:hi], limit)
+            if hot:
+                self._hot[(prefix, limit)] = results
+        return results
+
+    def replace(self, kind, obj_id, name, weight):
+        """Drop every entry for (kind, id) and insert the new ones (name=None removes)."""
+        with self._lock:
+            previous = self._objects.pop((kind, obj_id), None)
+            if previous is not None:
+                old_name, old_weight = previous
+                for key in index_keys(old_name):
+                    entry = (key, old_weight, kind, obj_id, old_name)
+                    i = bisect_left(self.entries, entry)
+                    if i < len(self.entries) and self.entries[i] == entry:
+                        del self.entries[i]
+                        del self.keys[i]
+            if name is not None:
+                for key in index_keys(name):
+                    entry = (key, weight, kind, obj_id, name)
+                    i = bisect_left(self.entries, entry)
+                    self.entries.insert(i, entry)
+                    self.keys.insert(i, key)
+                self._objects[(kind, obj_id)] = (name, weight)
+            self._hot = {}
+
+    def weight_of(self, kind, obj_id):
+        return self._objects.get((kind, obj_id), (None, 0))[1]
+
+
+# ======================================================
+# Memory-mapped snapshot
+# ======================================================
+
+def write_snapshot(entries, path):
+    """
+    Write sorted entries as: header, uint32 offset table, records.
+
+    Written to a temp file and renamed, so readers never see a partial file.
+    """
+    entries = sorted(entries)
+    records, offsets, position = [], [], 0
+    for key, weight, kind, obj_id, label in entries:
+        record = FIELD_SEP.join([key, str(weight), kind, str(obj_id), label]).encode() + b'\n'
+        offsets.append(position)
+        records.append(record)
+        position += len(record)
+
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as fh:
+        fh.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, len(entries)))
+        fh.write(b''.join(SNAPSHOT_OFFSET.pack(offset) for offset in offsets))
+        fh.write(b''.join(records))
+    os.replace(tmp_path, path)
+
+
+class SnapshotIndex:
+    """Read-only index searched directly in a shared memory-mapped file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = os.stat(path).st_mtime
+        with open(path, 'rb') as fh:
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = SNAPSHOT_HEADER.unpack_from(self._map, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a suggest snapshot")
+        self._data_start = SNAPSHOT_HEADER.size + self.count * SNAPSHOT_OFFSET.size
+        self._hot = {}
+
+    def _record(self, i):
+        start = self._data_start + SNAPSHOT_OFFSET.unpack_from(self._map, SNAPSHOT_HEADER.size + i * SNAPSHOT_OFFSET.size)[0]
+        end = self._map.find(b'\n', start)
+        key, weight, kind, obj_id, label = self._map[start:end].decode().split(FIELD_SEP)
+        return key, int(weight), kind, int(obj_id), label
+
+    def _bisect(self, target, lo=0):
+        hi = self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._record(mid)[0] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def search(self, prefix, limit=8):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        hot = len(prefix) <= HOT_PREFIX_LENGTH
+        if hot and (prefix, limit) in self._hot:
+            return self._hot[(prefix, limit)]
+
+        lo = self._bisect(prefix)
+        hi = self._bisect(prefix + PREFIX_END, lo)
+        results = _top((self._record(i) for i in range(lo, hi)), limit)
+        if hot:
+            self._hot[(prefix, limit)] = results
+        return results
+
+    def close(self):
+        self._map.close()
+
+
+# ======================================================
+# Building and process-wide access
+# ======================================================
+
+def build_entries():
+    """Index entries for every product and category, weighted by units sold."""
+    sales = dict(
+        OrderItem.objects.values_list('product_id').annotate(units=Sum('quantity')).order_by()
+    )
+    category_sales = {}
+    entries = []
+    for product_id, name, category_id in Product.objects.values_list('id', 'name', 'category_id').order_by():
+        weight = sales.get(product_id, 0)
+        category_sales[category_id] = category_sales.get(category_id, 0) + weight
+        entries.extend((key, weight, 'product', product_id, name) for key in index_keys(name))
+    for category_id, name in Category.objects.values_list('id', 'name').order_by():
+        weight = category_sales.get(category_id, 0)
+        entries.extend((key, weight, 'category', category_id, name) for key in index_keys(name))
+    return entries
+
+
+_index = None
+_index_lock = threading.Lock()
+_checked = 0.0
+
+
+def _snapshot_path():
+    return getattr(settings, 'SUGGEST_SNAPSHOT_PATH', None)
+
+
+def build_index(publish=True):
+    """
+    (Re)build the process index and, if configured, the shared snapshot.
+
+    With ``publish``, other workers' in-process indexes rebuild as well.
+    """
+    global _index
+    path = _snapshot_path()
+    version = None
+    if not path:
+        if publish:
+            invalidate(SUGGEST_TAG)
+        # Read before the entries, so a change made meanwhile triggers another rebuild
+        version = tag_version(SUGGEST_TAG)
+    entries = build_entries()
+    with _index_lock:
+        stale = _index
+        if path:
+            write_snapshot(entries, path)
+            _index = SnapshotIndex(path)
+        else:
+            _index = PrefixIndex(entries, version)
+    if isinstance(stale, SnapshotIndex):
+        stale.close()
+    return _index
+
+
+def _reopen_snapshot():
+    global _index
+    try:
+        if os.stat(_index.path).st_mtime != _index.mtime:
+            with _index_lock:
+                stale, _index = _index, SnapshotIndex(_index.path)
+            stale.close()
+    except FileNotFoundError:
+        pass
+
+
+def get_index():
+    """Process-wide index, built on first use and refreshed when another process changes it."""
+    global _index, _checked
+    if _index is None:
+        path = _snapshot_path()
+        if path and os.path.exists(path):
+            with _index_lock:
+                _index = _index or SnapshotIndex(path)
+        else:
+            build_index(publish=False)
+    elif time.monotonic() - _checked > INDEX_RECHECK_SECONDS:
+        _checked = time.monotonic()
+        if isinstance(_index, SnapshotIndex):
+            _reopen_snapshot()
+        elif tag_version(SUGGEST_TAG) != _index.version:
+            build_index(publish=False)
+    return _index
+
+
+def suggest(prefix, limit=8):
+    index = get_index()
+    try:
+        return index.search(prefix, limit)
+    except ValueError:
+        # Another thread reopened the snapshot and closed this map mid-search
+        return get_index().search(prefix, limit)
+
+
+def queue_snapshot_rebuild():
+    """
+    Queue one rebuild_suggest_index job per SUGGEST_REBUILD_DELAY window.
+
+    Every change in a window shares the job, which runs when the window ends.
+    """
+    delay = getattr(settings, 'SUGGEST_REBUILD_DELAY', 10)
+    now = timezone.now()
+    window = int(now.timestamp() // delay) + 1
+    run_at = now + timedelta(seconds=window * delay - now.timestamp())
+    return enqueue('rebuild_suggest_index', run_at=run_at, unique_key=f'rebuild_suggest_index@{window}')
+
+
+def update_entry(kind, obj_id, name):
+    """Apply a single product/category change (name=None deletes it)."""
+    if _index is None:
+        return
+    if isinstance(_index, PrefixIndex):
+        # This worker sees the change at once; the others rebuild when the tag moves
+        _index.replace(kind, obj_id, name, _index.weight_of(kind, obj_id))
+        transaction.on_commit(lambda: invalidate(SUGGEST_TAG))
+    else:
+        # Snapshot is shared and read-only; a job rebuilds it for every worker
+        # once the change is committed, batching a burst of saves into one write
+        transaction.on_commit(queue_snapshot_rebuild)
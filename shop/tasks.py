@@ -0,0 +1,86 @@
+# shop/tasks.py
+# ------------------------------------------------------------
+# Background tasks run by the run_jobs worker
+# ------------------------------------------------------------
+
+from datetime import date, timedelta
+
+from django.utils import timezone
+
+from .analytics import build_report
+from .archive import archive_orders
+from .db_router import sync_sqlite_replicas
+from .delivery import auto_assign_orders
+from .idempotency import prune_keys
+from .images import process_product_image
+from .inventory import reconcile
+from .jobs import prune_finished, task
+from .order_events import prune_events
+from .recommendations import build_recommendations, changed_products, last_build_time
+from .suggest import build_index
+
+# Days covered by each scheduled report
+REPORT_PERIODS = {
+    'daily': 1,
+    'weekly': 7,
+    'monthly': 30,
+}
+
+
+@task('auto_assign_deliveries')
+def auto_assign_deliveries_task():
+    auto_assign_orders()
+
+
+@task('build_recommendations')
+def build_recommendations_task(full=False):
+    since = None if full else last_build_time()
+    if since is None:
+        build_recommendations()
+    else:
+        product_ids = changed_products(since)
+        if product_ids:
+            build_recommendations(product_ids)
+
+
+@task('process_product_image')
+def process_product_image_task(product_id):
+    process_product_image(product_id)
+
+
+@task('reconcile_stock')
+def reconcile_stock_task(fix=True):
+    reconcile(fix=fix)
+
+
+@task('generate_report')
+def generate_report(report_type):
+    """Store the sales report for the last full day/week/month (ending yesterday)."""
+    end = timezone.localdate() - timedelta(days=1)
+    start = end - timedelta(days=REPORT_PERIODS[report_type] - 1)
+    build_report(start, end, report_type=report_type)
+
+
+@task('build_sales_report')
+def build_sales_report(start, end, category_id=None):
+    build_report(date.fromisoformat(start), date.fromisoformat(end), category_id)
+
+
+@task('prune_order_events')
+def prune_order_events_task():
+    prune_events()
+
+
+@task('archive_orders')
+def archive_orders_task():
+    archive_orders()
+
+
+@task('rebuild_suggest_index')
+def rebuild_suggest_index_task():
+    build_index()
+
+
+@task('sync_replicas')
+def sync_replicas_task():
+    sync_sqlite_replicas()
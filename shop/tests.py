@@ -1,3 +1,897 @@
-from django.test import TestCase
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import BytesIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import QueryDict
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.template import Context, Template, engines
+from django.test.signals import template_rendered
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import addresses, archive, cache, db_router, jobs, metrics, profiling, slow_queries, suggest, warmup
+from .analytics import MAX_RANGE_DAYS, build_report, parse_range, sales_report
+from .archive import archive_orders, courier_orders, customer_orders, get_order_or_404
+from .carts import merge_session_cart, move_wishlist_to_cart
+from .catalog import all_categories, featured_products
+from .delivery import auto_assign_orders, order_route, plan_assignments
+from .facets import apply_filters, build_facets, parse_filters
+from .idempotency import DuplicateSubmission, claim_key, find_replay
+from .images import process_product_image
+from .inventory import InsufficientStock, record_movement, restock_order, sell_order, set_stock
+from .models import (
+    ArchivedOrder, Cart, Category, DeliveryTracking, Job, Order, OrderEvent, OrderItem, Product, ProductRecommendation,
+    Report, Review, StockMovement, User, Wishlist,
+)
+from .order_events import InvalidTransition, add_tracking, set_status
+from .ratelimit import RateLimited, hit
+from .recommendations import build_recommendations, compute_scores, related_products
+from .reviews import rating_histogram
+from .users import search_users, user_page, with_order_stats
+
+
+def make_user(username, role='customer'):
+    return User.objects.create_user(username=username, password='pass12345', email=f'{username}@example.com', role=role)
+
+
+def make_product(stock=10, name='Kettle', price=100, category=None):
+    category = category or Category.objects.get_or_create(name='Kitchen')[0]
+    return Product.objects.create(name=name, category=category, price=price, description='-', stock=stock)
+
+
+def make_order(customer, product, quantity=1, address='12 Park Street, Kolkata 700016', **fields):
+    order = Order.objects.create(customer=customer, payment_method='COD', total_amount=product.price * quantity,
+                                 address=address, **fields)
+    OrderItem.objects.create(order=order, product=product, quantity=quantity, price=product.price)
+    sell_order(order)
+    return order
+
+
+@override_settings(SLOW_QUERY_LOGGING=True, SLOW_QUERY_LOG=None, METRICS_DIR=None)
+class SlowQueryWrapperTests(TestCase):
+    def tearDown(self):
+        while slow_queries.slow_query_wrapper in connection.execute_wrappers:
+            connection.execute_wrappers.remove(slow_queries.slow_query_wrapper)
+
+    def test_install_inside_request_wrapper_survives_its_exit(self):
+        def passthrough(execute, sql, params, many, context):
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(passthrough):
+            slow_queries.install(connection=connection)
+        self.assertEqual(connection.execute_wrappers, [slow_queries.slow_query_wrapper])
+
+    def test_wrapper_count_constant_across_requests(self):
+        # In production the connection (re)opens mid-request, inside the
+        # middleware's execute_wrapper() contexts; install from a view-time signal
+        def reconnect(**kwargs):
+            slow_queries.install(connection=connection)
+
+        template_rendered.connect(reconnect)
+        self.addCleanup(template_rendered.disconnect, reconnect)
+        slow_queries.install(connection=connection)
+        baseline = len(connection.execute_wrappers)
+        for _ in range(3):
+            connection.execute_wrappers.remove(slow_queries.slow_query_wrapper)
+            self.client.get('/')
+            self.assertEqual(len(connection.execute_wrappers), baseline)
+
+
+@override_settings(METRICS_DIR=None)
+class InventoryLedgerTests(TestCase):
+    def setUp(self):
+        self.product = make_product(stock=5)
+
+    def test_decrement_below_zero_is_refused(self):
+        with self.assertRaises(InsufficientStock):
+            record_movement(self.product.id, 'sale', -6)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+        self.assertFalse(StockMovement.objects.exists())
+
+    def test_set_stock_keeps_concurrent_sale(self):
+        record_movement(self.product.id, 'sale', -2)
+        # The admin loaded 5 and counted 8 more on the shelf
+        set_stock(self.product, counted=13, expected=5)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 11)
+
+    def test_stale_edit_form_reports_conflict(self):
+        admin = make_user('boss', role='admin')
+        self.client.force_login(admin)
+        record_movement(self.product.id, 'sale', -4)
+        response = self.client.post(reverse('edit_product', args=[self.product.id]), {
+            'name': 'Renamed', 'category': self.product.category_id, 'price': '100',
+            'description': '-', 'stock': '0', 'stock_original': '5',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('stock_error', response.context)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.name), (1, 'Kettle'))
+
+    def test_cancel_restocks_what_was_sold_once(self):
+        order = make_order(make_user('alice'), self.product, quantity=2)
+        restock_order(order)
+        restock_order(order)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+
+    def test_pre_ledger_order_restocks_nothing(self):
+        order = Order.objects.create(customer=make_user('alice'), payment_method='COD', total_amount=200, address='-')
+        OrderItem.objects.create(order=order, product=self.product, quantity=2, price=100)
+        restock_order(order)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+        self.assertFalse(order.stock_movements.exists())
+
+
+@override_settings(METRICS_DIR=None)
+class OrderEventTests(TestCase):
+    def setUp(self):
+        self.customer = make_user('alice')
+        self.courier = make_user('dave', role='delivery')
+        self.product = make_product(stock=5)
+        self.order = make_order(self.customer, self.product, quantity=2)
+
+    def kinds(self):
+        return list(OrderEvent.objects.filter(order_id=self.order.id).values_list('kind', flat=True))
+
+    def test_tracking_updates_order_state_and_outbox(self):
+        add_tracking(self.order, 'assigned', self.courier)
+        add_tracking(self.order, 'out_for_delivery', self.courier)
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.tracking_status), ('shipped', 'out_for_delivery'))
+        self.assertIsNotNone(self.order.assigned_at)
+        self.assertEqual(self.kinds(), ['tracking', 'tracking'])
+        self.assertEqual(OrderEvent.objects.last().data['previous_status'], 'processing')
+
+    def test_delivered_order_cannot_be_cancelled_or_restocked(self):
+        add_tracking(self.order, 'assigned', self.courier)
+        add_tracking(self.order, 'delivered', self.courier)
+        with self.assertRaises(InvalidTransition):
+            add_tracking(self.order, 'cancelled', self.courier)
+        with self.assertRaises(InvalidTransition):
+            set_status(self.order, 'pending')
+        self.order.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertEqual((self.order.status, self.product.stock), ('delivered', 3))
+        self.assertEqual(self.kinds(), ['tracking', 'tracking'])
+
+    def test_cancel_before_delivery_restocks_once(self):
+        add_tracking(self.order, 'assigned', self.courier)
+        add_tracking(self.order, 'cancelled', self.courier)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+        with self.assertRaises(InvalidTransition):
+            set_status(self.order, 'cancelled')
+
+    def test_admin_status_keeps_tracking_fields_in_step(self):
+        add_tracking(self.order, 'assigned', self.courier)
+        set_status(self.order, 'pending')
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.tracking_status, self.order.delivery_person_id), ('', None))
+        self.assertIsNone(self.order.assigned_at)
+
+        set_status(self.order, 'cancelled')
+        self.order.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.tracking_status), ('cancelled', 'cancelled'))
+        self.assertEqual(self.product.stock, 5)
+        self.assertEqual(self.kinds(), ['tracking', 'status', 'status'])
+
+    def test_stale_copy_is_validated_against_the_row(self):
+        add_tracking(self.order, 'assigned', self.courier)
+        admin_copy = Order.objects.get(pk=self.order.pk)
+        add_tracking(self.order, 'delivered', self.courier)
+        with self.assertRaises(InvalidTransition):
+            set_status(admin_copy, 'cancelled')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+
+        # Should the row change between the locked read and the write, nothing is written
+        with mock.patch('shop.order_events._lock_state'), self.assertRaises(InvalidTransition):
+            set_status(Order(pk=self.order.pk, status='processing', delivery_person_id=self.courier.id), 'cancelled')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'delivered')
+
+    def test_delete_records_event(self):
+        self.client.force_login(make_user('boss', role='admin'))
+        order_id = self.order.id
+        self.client.post(reverse('delete_order', args=[order_id]))
+        self.assertFalse(Order.objects.filter(id=order_id).exists())
+        self.assertEqual(OrderEvent.objects.filter(order_id=order_id).last().kind, 'deleted')
+
+
+@override_settings(METRICS_DIR=None)
+class TaggedCacheTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.product = make_product()
+        self.calls = 0
+
+    def produce(self):
+        self.calls += 1
+        return self.calls
+
+    def lookup(self):
+        return cache.get_or_set('test', ('listing',), self.produce, tags=[f'product:{self.product.id}'])
+
+    def test_invalidate_bumps_tag_version(self):
+        self.assertEqual((self.lookup(), self.lookup()), (1, 1))
+        cache.invalidate(f'product:{self.product.id}')
+        self.assertEqual(self.lookup(), 2)
+        cache.invalidate('unrelated')
+        self.assertEqual(self.lookup(), 2)
+
+    def test_model_change_invalidates_after_commit(self):
+        self.lookup()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Teapot'
+            self.product.save()
+            # Still inside the transaction: readers may keep the old entry
+            self.assertEqual(self.lookup(), 1)
+        self.assertEqual(self.lookup(), 2)
+
+
+@override_settings(METRICS_DIR=None)
+class SalesReportTests(TestCase):
+    def test_parse_range_caps_span_and_end(self):
+        today = date(2026, 6, 30)
+        start, end = parse_range({'from': '0001-01-01', 'to': '9999-12-31'}, today=today)
+        self.assertEqual(end, today)
+        self.assertEqual((end - start).days + 1, MAX_RANGE_DAYS)
+        self.assertEqual(parse_range({'from': '2026-06-10', 'to': '2026-06-01'}, today=today),
+                         (date(2026, 6, 1), date(2026, 6, 10)))
+
+    def test_page_waits_for_the_job(self):
+        self.client.force_login(make_user('boss', role='admin'))
+        response = self.client.get(reverse('sales_report'))
+        self.assertContains(response, 'Preparing this report')
+        self.assertRedirects(self.client.get(reverse('download_sales_report')), reverse('sales_report') + '?')
+        build_report(*parse_range({}))
+        response = self.client.get(reverse('sales_report'))
+        self.assertNotContains(response, 'Preparing this report')
+        self.assertContains(response, 'Total Revenue')
+        self.assertEqual(self.client.get(reverse('download_sales_report'))['Content-Type'], 'text/csv')
+
+    def test_report_is_queued_stored_and_refreshed_after_delivery(self):
+        customer, courier = make_user('alice'), make_user('dave', role='delivery')
+        order = make_order(customer, make_product(price=250), quantity=2)
+        start, end = parse_range({})
+        self.assertEqual(sales_report(start, end), (None, False))
+        jobs.run_job(jobs.claim_jobs(1, 'worker')[0])
+
+        report, fresh = sales_report(start, end)
+        self.assertTrue(fresh)
+        self.assertEqual((report['total_orders'], report['end']), (0, end))
+
+        add_tracking(order, 'assigned', courier)
+        self.assertTrue(sales_report(start, end)[1])
+        add_tracking(order, 'delivered', courier)
+        report, fresh = sales_report(start, end)
+        self.assertFalse(fresh)
+        build_report(start, end)
+        report, fresh = sales_report(start, end)
+        self.assertTrue(fresh)
+        self.assertEqual((report['total_orders'], report['total_revenue']), (1, Decimal('500')))
+        self.assertEqual(report['daily'][-1]['revenue'], Decimal('500'))
+        # Rebuilds replace the stored row rather than piling up
+        self.assertEqual(Report.objects.filter(start=start, end=end).count(), 1)
+
+
+class MetricsFileTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        overrides = override_settings(METRICS_DIR=directory.name, METRICS_FLUSH_SECONDS=0)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def test_concurrent_flushes_do_not_race(self):
+        errors = []
+
+        def work():
+            try:
+                for _ in range(50):
+                    metrics.CART_ADDS.inc(source='test')
+                    metrics.flush()
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_dead_process_files_are_folded(self):
+        exited = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'],
+                                capture_output=True, text=True).stdout.strip()
+        key = (metrics.CART_ADDS.name, (('source', 'gone'),))
+        metrics._write(self.directory / f'{exited}.json', {key: 3})
+        self.assertEqual(metrics.collect()[key], 3)
+        self.assertFalse((self.directory / f'{exited}.json').exists())
+        self.assertEqual(metrics.collect()[key], 3)
+
+
+@override_settings(SERVER_TIMING=False, METRICS_DIR=None)
+class ServerTimingTests(TestCase):
+    def test_anonymous_flag_instruments_nothing(self):
+        with mock.patch.object(profiling, 'install') as install:
+            response = self.client.get('/?server_timing=1')
+        install.assert_not_called()
+        self.assertNotIn('Server-Timing', response.headers)
+
+    def test_admin_flag_adds_header(self):
+        self.client.force_login(make_user('boss', role='admin'))
+        response = self.client.get('/?server_timing=1')
+        self.assertIn('db;desc=', response.headers['Server-Timing'])
+        self.assertNotIn('Server-Timing', self.client.get('/').headers)
+
+
+@jobs.task('test_noop')
+def noop_task(*args, **kwargs):
+    return None
+
+
+@jobs.task('test_reclaimed')
+def reclaimed_task():
+    # Another worker took the job over while this one was still running it
+    Job.objects.filter(status='running').update(locked_by='b')
+
+
+class JobQueueTests(TestCase):
+    def test_cron_fields(self):
+        monday_0930 = datetime(2026, 6, 1, 9, 30)
+        self.assertTrue(jobs.cron_matches('*/15 9-17 * * 1-5', monday_0930))
+        self.assertTrue(jobs.cron_matches('30 9 1 6 *', monday_0930))
+        self.assertFalse(jobs.cron_matches('30 9 * * 0,6', monday_0930))
+        self.assertFalse(jobs.cron_matches('*/20 * * * *', monday_0930))
+        with self.assertRaises(ValueError):
+            jobs.cron_matches('* * *', monday_0930)
+
+    def test_scheduled_run_is_enqueued_once(self):
+        moment = timezone.now()
+        with self.settings(JOB_SCHEDULE=[('* * * * *', 'test_noop', [1])]):
+            self.assertEqual(len(jobs.enqueue_scheduled(moment)), 1)
+            self.assertEqual(jobs.enqueue_scheduled(moment), [])
+
+    def test_each_job_is_claimed_by_one_worker(self):
+        for _ in range(3):
+            jobs.enqueue('test_noop')
+        first = jobs.claim_jobs(2, 'a')
+        second = jobs.claim_jobs(5, 'b')
+        self.assertEqual((len(first), len(second)), (2, 1))
+        self.assertFalse(set(first) & set(second))
+
+    def expire_leases(self):
+        Job.objects.update(locked_at=timezone.now() - timedelta(seconds=jobs.LEASE_SECONDS + 1))
+
+    def test_lapsed_lease_is_requeued_then_failed(self):
+        job = jobs.enqueue('test_noop', max_attempts=2)
+        jobs.claim_jobs(1, 'a')
+        self.expire_leases()
+        jobs.renew_leases([job.id], 'a')
+        self.assertEqual(jobs.requeue_stale(), 0)
+
+        self.expire_leases()
+        self.assertEqual(jobs.requeue_stale(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+
+        self.assertEqual(jobs.claim_jobs(1, 'b'), [job.id])
+        self.expire_leases()
+        jobs.requeue_stale()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+
+    def test_finished_job_does_not_overwrite_a_reclaimed_one(self):
+        job = jobs.enqueue('test_reclaimed')
+        jobs.claim_jobs(1, 'a')
+        with self.assertLogs('shop.jobs', 'WARNING'):
+            jobs.run_job(job.id)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), ('running', 'b'))
+
+
+@override_settings(PRODUCT_IMAGE_MAX_SIZE=(100, 100), METRICS_DIR=None)
+class ProductImageTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        overrides = override_settings(MEDIA_ROOT=media.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def upload(self, size):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, format='JPEG')
+        return SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def test_add_product_queues_shrinking(self):
+        self.client.force_login(make_user('boss', role='admin'))
+        category = Category.objects.create(name='Kitchen')
+        self.client.post(reverse('add_product'), {
+            'name': 'Kettle', 'category': category.id, 'price': '10', 'description': '-', 'stock': '3',
+            'image': self.upload((400, 200)),
+        })
+        product = Product.objects.get()
+        job = Job.objects.get(task='process_product_image')
+        self.assertEqual(job.args, [product.id])
+
+        self.assertTrue(process_product_image(product.id))
+        product.refresh_from_db()
+        self.assertEqual((product.image.width, product.image.height), (100, 50))
+        self.assertFalse(process_product_image(product.id))
+
+
+@override_settings(METRICS_DIR=None)
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.customer = make_user('alice')
+        self.courier = make_user('dave', role='delivery')
+        self.product = make_product(stock=20)
+        self.orders = []
+        for _ in range(5):
+            order = make_order(self.customer, self.product)
+            add_tracking(order, 'assigned', self.courier)
+            add_tracking(order, 'delivered', self.courier)
+            self.orders.append(order)
+        # The three oldest are past the archive horizon
+        old = timezone.now() - timedelta(days=400)
+        Order.objects.filter(id__in=[order.id for order in self.orders[:3]]).update(created_at=old)
+
+    def test_round_trip(self):
+        self.assertEqual(archive_orders(days=180, chunk_size=2), 3)
+        archived = ArchivedOrder.objects.get(id=self.orders[0].id)
+        self.assertEqual((archived.status, archived.tracking_status), ('delivered', 'delivered'))
+        self.assertEqual(archived.items.get().product_id, self.product.id)
+        self.assertEqual(archived.tracking.count(), 2)
+        self.assertFalse(DeliveryTracking.objects.filter(order_id=archived.id).exists())
+        self.assertEqual(StockMovement.objects.get(archived_order=archived).kind, 'sale')
+        self.assertEqual(get_order_or_404(archived.id, customer=self.customer), archived)
+
+    def test_pages_merge_hot_and_archived_newest_first(self):
+        archive_orders(days=180)
+        expected = [order.id for order in reversed(self.orders)]
+        first, before = customer_orders(self.customer, limit=2)
+        second, before = customer_orders(self.customer, before=before, limit=2)
+        third, before = customer_orders(self.customer, before=before, limit=2)
+        self.assertEqual([order.id for order in first + second + third], expected)
+        self.assertIsNone(before)
+        self.assertIsInstance(third[0], ArchivedOrder)
+
+        delivered, _ = courier_orders(self.courier, limit=10)
+        self.assertEqual([order.id for order in delivered], expected)
+        self.client.force_login(self.courier)
+        response = self.client.get(reverse('delivery_history'))
+        self.assertEqual(len(response.context['deliveries']), 5)
+        self.assertEqual(len(self.client.get(reverse('delivery_dashboard')).context['completed_deliveries']), 5)
+        self.client.force_login(self.customer)
+        self.assertContains(self.client.get(reverse('my_orders')), f'Order #{self.orders[0].id}')
+
+    @mock.patch.object(archive.archived_orders, '__defaults__', (None, 2))
+    def test_admin_archive_list_is_paged(self):
+        archive_orders(days=180)
+        self.client.force_login(make_user('boss', role='admin'))
+        first = self.client.get(reverse('manage_orders'), {'archived': '1'})
+        self.assertEqual([order.id for order in first.context['orders']], [self.orders[2].id, self.orders[1].id])
+        second = self.client.get(reverse('manage_orders'), {'archived': '1', 'before': first.context['next_before']})
+        self.assertEqual([order.id for order in second.context['orders']], [self.orders[0].id])
+        self.assertIsNone(second.context['next_before'])
+
+
+@override_settings(METRICS_DIR=None)
+class SuggestIndexTests(TestCase):
+    def test_replace_keeps_entries_sorted(self):
+        index = suggest.PrefixIndex([
+            ('blue kettle', 5, 'product', 1, 'Blue Kettle'), ('kettle', 5, 'product', 1, 'Blue Kettle'),
+            ('mug', 2, 'product', 2, 'Mug'),
+        ])
+        index.replace('product', 1, 'Red Kettle', index.weight_of('product', 1))
+        self.assertEqual(index.entries, sorted(index.entries))
+        self.assertEqual(index.keys, [entry[0] for entry in index.entries])
+        self.assertEqual(index.search('bl'), [])
+        self.assertEqual(index.search('re'), [{'kind': 'product', 'id': 1, 'label': 'Red Kettle', 'weight': 5}])
+        index.replace('product', 1, None, 0)
+        self.assertEqual(index.keys, ['mug'])
+
+    @override_settings(SUGGEST_SNAPSHOT_PATH=None)
+    def test_other_workers_edits_reach_this_index(self):
+        caches['default'].clear()
+        self.addCleanup(setattr, suggest, '_index', None)
+        kettle = make_product(name='Kettle')
+        suggest.build_index(publish=False)
+        self.assertEqual([hit['id'] for hit in suggest.suggest('ke')], [kettle.id])
+
+        # Another worker renames it: no signal here, only the shared tag moves
+        Product.objects.filter(pk=kettle.pk).update(name='Teapot')
+        cache.invalidate(suggest.SUGGEST_TAG)
+        suggest._checked = 0.0
+        self.assertEqual(suggest.suggest('ke'), [])
+        self.assertEqual([hit['id'] for hit in suggest.suggest('te')], [kettle.id])
+
+    def test_snapshot_changes_are_rebuilt_by_one_job(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        overrides = override_settings(SUGGEST_SNAPSHOT_PATH=str(Path(directory.name) / 'suggest.idx'))
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.addCleanup(setattr, suggest, '_index', None)
+        suggest.build_index()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            kettle = make_product(name='Kettle')
+            make_product(name='Teapot')
+        self.assertEqual(suggest.suggest('ke'), [])
+        job = Job.objects.get(task='rebuild_suggest_index')
+        self.assertGreater(job.run_at, timezone.now())
+
+        old_index = suggest.get_index()
+        Job.objects.update(run_at=timezone.now())
+        jobs.run_job(jobs.claim_jobs(1, 'a')[0])
+        self.assertEqual([hit['id'] for hit in suggest.suggest('ke')], [kettle.id])
+        self.assertTrue(old_index._map.closed)
+
+
+@override_settings(METRICS_DIR=None)
+class CartTests(TestCase):
+    def setUp(self):
+        self.user = make_user('alice')
+        self.kettle = make_product(name='Kettle')
+        self.mug = make_product(name='Mug')
+
+    def quantities(self):
+        return dict(Cart.objects.filter(user=self.user).values_list('product_id', 'quantity'))
+
+    def test_session_cart_merges_into_existing_rows(self):
+        Cart.objects.create(user=self.user, product=self.kettle, quantity=2)
+        merged = merge_session_cart({self.kettle.id: 1, self.mug.id: 3, 999999: 1}, self.user)
+        self.assertEqual(merged, 2)
+        self.assertEqual(self.quantities(), {self.kettle.id: 3, self.mug.id: 3})
+
+    def test_wishlist_move_counts_only_added_products(self):
+        teapot = make_product(name='Teapot', stock=0)
+        Cart.objects.create(user=self.user, product=self.kettle, quantity=2)
+        for product in (self.kettle, self.mug, teapot):
+            Wishlist.objects.create(user=self.user, product=product)
+        self.assertEqual(move_wishlist_to_cart(self.user), 1)
+        self.assertEqual(self.quantities(), {self.kettle.id: 2, self.mug.id: 1})
+        self.assertEqual(list(Wishlist.objects.values_list('product_id', flat=True)), [teapot.id])
+
+
+@override_settings(METRICS_DIR=None)
+class CartEndpointTests(TestCase):
+    def setUp(self):
+        self.kettle = make_product(name='Kettle', price=100)
+        self.mug = make_product(name='Mug', price=40)
+
+    def post(self, name, product, **data):
+        return self.client.post(reverse(name, args=[product.id]), data).json()
+
+    def test_anonymous_cart_answers_with_line_and_totals(self):
+        self.assertEqual(self.client.get(reverse('cart_add_json', args=[self.kettle.id])).status_code, 405)
+        self.post('cart_add_json', self.mug)
+        summary = self.post('cart_add_json', self.kettle, quantity='2')
+        self.assertEqual(summary['line'], {'product_id': self.kettle.id, 'quantity': 2, 'subtotal': '200.00'})
+        self.assertEqual(summary['totals'], {'lines': 2, 'units': 3, 'total': '240.00'})
+
+    def test_signed_in_cart_updates_and_removes(self):
+        self.client.force_login(make_user('alice'))
+        self.post('cart_add_json', self.kettle)
+        self.assertEqual(self.post('cart_update_json', self.kettle, quantity='3')['line']['subtotal'], '300.00')
+        summary = self.post('cart_remove_json', self.kettle)
+        self.assertIsNone(summary['line'])
+        self.assertEqual((summary['totals']['total'], summary['badge']), ('0.00', 0))
+        self.assertFalse(Cart.objects.exists())
+
+
+@override_settings(METRICS_DIR=None)
+class DeliveryAssignmentTests(TestCase):
+    def test_least_loaded_courier_first(self):
+        plan = plan_assignments([[1], [2], [3], [4]], {10: 2, 20: 0, 30: 1})
+        self.assertEqual(plan, [(1, 20), (2, 20), (3, 30), (4, 10)])
+
+    def test_batches_split_by_route_size_and_stop_at_capacity(self):
+        self.assertEqual(plan_assignments([[1, 2, 3]], {10: 0, 20: 0}, route_size=2),
+                         [(1, 10), (2, 10), (3, 20)])
+        self.assertEqual(plan_assignments([[1, 2], [3]], {10: 0, 20: 1}, capacity=1), [(1, 10)])
+
+    @override_settings(DELIVERY_CAPACITY=None, DELIVERY_ROUTE_SIZE=None)
+    def test_same_area_orders_go_to_one_courier(self):
+        customer = make_user('alice')
+        couriers = [make_user('dave', role='delivery'), make_user('erin', role='delivery')]
+        product = make_product(stock=20)
+        park_street = [make_order(customer, product) for _ in range(3)]
+        salt_lake = make_order(customer, product, address='4 Sector V, Salt Lake, Kolkata 700091')
+
+        assigned_key = (metrics.DELIVERY_UPDATES.name, (('status', 'assigned'),))
+        before = metrics.collect().get(assigned_key, 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            plan = dict(auto_assign_orders())
+        self.assertEqual(metrics.collect()[assigned_key] - before, 4)
+        self.assertEqual(len({plan[order.id] for order in park_street}), 1)
+        self.assertNotEqual(plan[salt_lake.id], plan[park_street[0].id])
+        self.assertEqual(set(plan.values()), {courier.id for courier in couriers})
+        self.assertEqual(Order.objects.filter(tracking_status='assigned').count(), 4)
+        self.assertEqual(DeliveryTracking.objects.filter(status='assigned').count(), 4)
+        self.assertEqual(auto_assign_orders(), [])
+
+
+@override_settings(METRICS_DIR=None)
+class IdempotentCheckoutTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.user = make_user('alice')
+        self.product = make_product(stock=5)
+
+    def test_used_key_is_a_duplicate(self):
+        claim = claim_key(self.user, 'key-1')
+        find_replay(self.user, 'key-2')
+        with self.assertRaises(DuplicateSubmission) as raised:
+            claim_key(self.user, 'key-1')
+        self.assertIsNone(raised.exception.order_id)
+        with self.assertRaises(DuplicateSubmission):
+            find_replay(self.user, claim.key)
+
+    def test_replayed_post_returns_the_first_order(self):
+        self.client.force_login(self.user)
+        form = {'quantity': '2', 'payment_method': 'COD', 'address': '12 Park Street', 'idempotency_key': 'k' * 32}
+        first = self.client.post(reverse('checkout', args=[self.product.id]), form)
+        second = self.client.post(reverse('checkout', args=[self.product.id]), form)
+        order = Order.objects.get()
+        self.assertEqual(first.url, reverse('order_confirmation', args=[order.id]))
+        self.assertEqual(second.url, first.url)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+
+
+@override_settings(RATE_LIMIT_ENABLED=True, RATE_LIMITS={'test': (3, 60)}, METRICS_DIR=None)
+class RateLimitTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_window_slides(self):
+        start = 6000.0  # the start of a 60 s window
+        for second in range(3):
+            hit('test', 'ip1', now=start + second)
+        with self.assertRaises(RateLimited) as raised:
+            hit('test', 'ip1', now=start + 3)
+        self.assertEqual(raised.exception.retry_after, 57)
+        hit('test', 'ip2', now=start + 3)
+
+        # Half-way through the next window half of the previous four (rejected ones count too) remain
+        hit('test', 'ip1', now=start + 90)
+        with self.assertRaises(RateLimited) as raised:
+            hit('test', 'ip1', now=start + 91)
+        self.assertEqual(raised.exception.retry_after, 14)
+        hit('test', 'ip1', now=start + 120)
+
+
+@override_settings(METRICS_DIR=None)
+class UserSearchTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('Alice99')
+        self.bob = make_user('bob')
+        User.objects.filter(pk=self.bob.pk).update(phone='+919912345678')
+
+    def search(self, term):
+        return set(search_users(User.objects.all(), term).values_list('username', flat=True))
+
+    def test_prefixes_match_names_emails_and_phone_like_terms(self):
+        self.assertEqual(self.search('ALICE'), {'Alice99'})
+        self.assertEqual(self.search('bob@'), {'bob'})
+        self.assertEqual(self.search('+91 99'), {'bob'})
+        self.assertEqual(self.search('alice99'), {'Alice99'})
+        self.assertEqual(self.search('lice'), set())
+
+    def test_stats_cover_hot_and_archived_orders(self):
+        product = make_product(stock=20, price=100)
+        delivered = make_order(self.alice, product, quantity=2)
+        make_order(self.alice, product, status='cancelled')
+        make_order(self.alice, product)
+        old = timezone.now() - timedelta(days=400)
+        Order.objects.filter(pk=delivered.pk).update(status='delivered', created_at=old)
+        self.assertEqual(archive_orders(days=180), 1)
+
+        alice = with_order_stats(User.objects.filter(pk=self.alice.pk)).get()
+        self.assertEqual((alice.order_count, alice.lifetime_value), (2, Decimal('300')))
+        users, next_after = user_page({'q': '', 'role': 'customer', 'active': ''}, limit=1)
+        self.assertEqual(([user.username for user in users], next_after), (['bob'], self.bob.id))
+
+
+@override_settings(REPLICA_DATABASES=['replica1'], REPLICA_STICKY_SECONDS=90, METRICS_DIR=None)
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        patcher = mock.patch.object(db_router, 'choose_replica', return_value='replica1')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def read_alias(self, method='get'):
+        view = db_router.use_replica(lambda request: db_router.ReplicaRouter().db_for_read(Product))
+        return view(getattr(RequestFactory(), method)('/'))
+
+    def test_safe_requests_read_the_replica_unless_pinned(self):
+        self.assertEqual(self.read_alias(), 'replica1')
+        self.assertIsNone(self.read_alias('post'))
+        token = db_router._pinned.set(True)
+        self.addCleanup(db_router._pinned.reset, token)
+        self.assertIsNone(self.read_alias())
+
+    def test_post_pins_the_browser_to_the_primary(self):
+        response = self.client.post(reverse('login'), {'username': 'nobody', 'password': 'x'})
+        self.assertEqual(response.cookies[db_router.STICKY_COOKIE]['max-age'], 90)
+
+    def test_fill_after_invalidation_reads_the_primary(self):
+        def lookup():
+            return cache.get_or_set('test', ('listing',), lambda: db_router.ReplicaRouter().db_for_read(Product),
+                                    tags=['product:1'])
+
+        token = db_router._replica_alias.set('replica1')
+        self.addCleanup(db_router._replica_alias.reset, token)
+        self.assertEqual(lookup(), 'replica1')
+        cache.invalidate('product:1')
+        self.assertIsNone(lookup())
+
+
+@override_settings(METRICS_DIR=None)
+class DeliveryRouteTests(TestCase):
+    def test_area_key_prefers_the_postal_code(self):
+        self.assertEqual(addresses.address_area_key('12 Park Street, Kolkata 700016'), '700016')
+        self.assertEqual(addresses.address_area_key('Flat 3, 10 Downing St, London sw1a 2aa'), 'SW1A2AA')
+        self.assertEqual(addresses.address_area_key('4 Mall Road,\n  Shimla  Town '), 'shimla town')
+
+    def test_route_tours_areas_then_stops_nearest_first(self):
+        def stop(order_id, area_key, latitude=None, longitude=None):
+            return Order(id=order_id, area_key=area_key, latitude=latitude, longitude=longitude)
+
+        orders = [
+            stop(1, 'A', 0, 0.01), stop(2, 'A', 0, 0), stop(3, 'B', 0, 1),
+            stop(4, '700091'), stop(5, '110001'), stop(6, 'A'),
+        ]
+        route = order_route(orders, start=(0, 2))
+        self.assertEqual([order.id for order in route], [3, 1, 2, 6, 5, 4])
+
+
+@override_settings(METRICS_DIR=None)
+class RecommendationTests(TestCase):
+    def setUp(self):
+        self.customer = make_user('alice')
+        self.kettle, self.mug, self.teapot, self.toaster = (
+            make_product(name=name) for name in ('Kettle', 'Mug', 'Teapot', 'Toaster')
+        )
+        for basket in ((self.kettle, self.mug), (self.kettle, self.mug), (self.kettle, self.teapot)):
+            order = Order.objects.create(customer=self.customer, payment_method='COD', total_amount=0, address='-')
+            for product in basket:
+                OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+
+    def test_scores_are_cosine_over_baskets(self):
+        scores = compute_scores()
+        self.assertAlmostEqual(scores[self.kettle.id][self.mug.id], 2 / 6 ** 0.5)
+        self.assertAlmostEqual(scores[self.kettle.id][self.teapot.id], 1 / 3 ** 0.5)
+        self.assertNotIn(self.toaster.id, scores)
+
+    def test_related_products_ranked_then_topped_up_from_category(self):
+        self.assertEqual(build_recommendations(), 4)
+        self.assertEqual(related_products(self.kettle, limit=3), [self.mug, self.teapot, self.toaster])
+
+        Wishlist.objects.create(user=self.customer, product=self.toaster)
+        Wishlist.objects.create(user=self.customer, product=self.teapot)
+        # Wishlisted together (half weight) now outranks one shared order
+        build_recommendations([self.teapot.id])
+        self.assertEqual(related_products(self.teapot, limit=2), [self.toaster, self.kettle])
+        self.assertEqual(ProductRecommendation.objects.filter(product=self.kettle).count(), 2)
+
+
+@override_settings(METRICS_DIR=None)
+class FacetTests(TestCase):
+    def test_counts_ignore_their_own_selection(self):
+        kitchen, garden = Category.objects.create(name='Kitchen'), Category.objects.create(name='Garden')
+        make_product(name='Kettle', price=300, stock=5, category=kitchen)
+        make_product(name='Mug', price=700, stock=0, category=kitchen)
+        hose = make_product(name='Hose', price=700, stock=3, category=garden)
+        params = QueryDict('price=500-1000&in_stock=1')
+        filters = parse_filters(params)
+
+        products = Product.objects.all()
+        self.assertEqual(list(apply_filters(products, filters)), [hose])
+        facets = build_facets(products, filters, [kitchen, garden], params)
+        self.assertEqual([option['count'] for option in facets['category']], [0, 1])
+        self.assertEqual({option['label']: option['count'] for option in facets['price'] if option['count']},
+                         {'Under ₹500': 1, '₹500 – ₹1,000': 1})
+        self.assertEqual(facets['in_stock']['count'], 1)
+        self.assertEqual(facets['price'][1]['url'], '?in_stock=1')
+
+
+@override_settings(METRICS_DIR=None)
+class ReviewPageTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.product = make_product()
+        user = make_user('alice')
+        self.reviews = [Review.objects.create(user=user, product=self.product, rating=rating, comment='-')
+                        for rating in (5, 5, 4, 3, 1, 5, 2)]
+
+    def test_cursor_pages_walk_newest_first(self):
+        url = reverse('product_reviews', args=[self.product.id])
+        first = self.client.get(url).json()
+        second = self.client.get(url, {'before': first['next']}).json()
+        ids = [review['id'] for review in first['reviews'] + second['reviews']]
+        self.assertEqual(ids, [review.id for review in reversed(self.reviews)])
+        self.assertIsNone(second['next'])
+
+    def test_histogram_is_cached_until_a_review_lands(self):
+        histogram = rating_histogram(self.product.id)
+        self.assertEqual(histogram['total'], 7)
+        self.assertEqual([bar['count'] for bar in histogram['bars']], [3, 1, 1, 1, 1])
+        with self.assertNumQueries(0):
+            rating_histogram(self.product.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(user=self.reviews[0].user, product=self.product, rating=4, comment='-')
+        self.assertEqual(rating_histogram(self.product.id)['bars'][1]['count'], 2)
+
+
+@override_settings(METRICS_DIR=None)
+class TemplateProfilingTests(TestCase):
+    def test_templates_are_parsed_once(self):
+        engine = engines['django']
+        self.assertIs(engine.get_template('home.html').template, engine.get_template('home.html').template)
+
+    def test_profile_times_templates_and_tags_per_url(self):
+        profiling.install()
+        profiling.install()
+        profiling.reset()
+        self.addCleanup(profiling.reset)
+        profile = profiling.RenderProfile()
+        token = profiling.use_profile(profile)
+        try:
+            Template('{% for n in numbers %}{{ n }}{% endfor %}').render(Context({'numbers': [1, 2]}))
+        finally:
+            profiling.reset_profile(token)
+        self.assertEqual(profile.templates['<string>'][0], 1)
+        self.assertEqual(sorted(count for count, _ in profile.tags.values()), [1, 2])
+
+        profiling.record('test_view', profile)
+        profiling.record('test_view', profile)
+        row, = profiling.report()
+        self.assertEqual((row['url'], row['requests']), ('test_view', 2))
+        self.assertEqual(sorted(tag['calls'] for tag in row['tags']), [2, 4])
+
+
+@override_settings(SUGGEST_SNAPSHOT_PATH=None, METRICS_DIR=None)
+class WarmUpTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.addCleanup(setattr, suggest, '_index', None)
+        make_order(make_user('alice'), make_product())
+
+    def test_steps_fill_the_caches(self):
+        results = warmup.warm_up()
+        self.assertEqual([name for name, _, _ in results], [name for name, _ in warmup.STEPS])
+        self.assertTrue(all(count for _, count, _ in results))
+        self.assertIsNotNone(suggest._index)
+        with self.assertNumQueries(0):
+            all_categories()
+            featured_products()
+
+    def test_failing_step_is_skipped(self):
+        def broken():
+            raise RuntimeError('boom')
+
+        steps = (('broken', broken), ('catalog', warmup.warm_catalog))
+        with mock.patch.object(warmup, 'STEPS', steps), self.assertLogs('shop.warmup', 'ERROR'):
+            results = warmup.warm_up()
+        self.assertEqual([(name, count) for name, count, _ in results], [('broken', None), ('catalog', 2)])
@@ -0,0 +1,169 @@
+# shop/timing.py
+# ------------------------------------------------------------
+# Server-Timing response header
+# Breaks a request down into middleware, view, database, cache
+# and template time so slow pages can be read straight from the
+# browser's devtools. On for every response with SERVER_TIMING,
+# or for admins adding ?server_timing=1 to a URL.
+#
+# ServerTimingMiddleware goes first in MIDDLEWARE (it times the
+# whole request), ViewTimingMiddleware last (everything it wraps
+# is the view). Template time comes from shop.profiling. For
+# ?server_timing=1 nothing is instrumented until the user is
+# known to be an admin, so those headers cover the view phase's
+# db/cache/template time only.
+# ------------------------------------------------------------
+
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+
+from . import profiling
+
+_current = ContextVar('request_timing', default=None)
+
+
+class RequestTiming:
+    """Per-phase counters for one request."""
+
+    def __init__(self):
+        self.view = 0.0
+        self.db_queries = 0
+        self.db = 0.0
+        self.cache_calls = 0
+        self.cache = 0.0
+        self.template = 0.0
+
+    def sql(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += perf_counter() - start
+            self.db_queries += 1
+
+
+def current_timing():
+    return _current.get()
+
+
+class TimedCache:
+    """Cache proxy that adds the time spent in each call to the request's cache phase."""
+
+    def __init__(self, cache, timing):
+        self._cache = cache
+        self._timing = timing
+
+    def __getattr__(self, name):
+        attr = getattr(self._cache, name)
+        if not callable(attr):
+            return attr
+
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                self._timing.cache += perf_counter() - start
+                self._timing.cache_calls += 1
+        return timed
+
+
+def timed_cache(cache):
+    timing = _current.get()
+    return cache if timing is None else TimedCache(cache, timing)
+
+
+def _metric(name, seconds, desc=None):
+    desc = f';desc="{desc}"' if desc else ''
+    return f'{name}{desc};dur={seconds * 1000:.1f}'
+
+
+def header_value(timing, total):
+    view = timing.view or total
+    return ', '.join([
+        _metric('total', total),
+        _metric('mw', max(total - view, 0.0), 'Middleware'),
+        _metric('view', view, 'View (incl. db, cache, templates)'),
+        _metric('db', timing.db, f'{timing.db_queries} queries'),
+        _metric('cache', timing.cache, f'{timing.cache_calls} calls'),
+        _metric('tpl', timing.template, 'Templates'),
+    ])
+
+
+def _requested(request):
+    return request.GET.get(getattr(settings, 'SERVER_TIMING_PARAM', 'server_timing')) == '1'
+
+
+def _is_admin(request):
+    user = getattr(request, 'user', None)
+    return bool(user and user.is_authenticated and getattr(user, 'role', None) == 'admin')
+
+
+@contextmanager
+def instrument(timing):
+    """Collect db, cache and template time into ``timing`` for the enclosed block."""
+    token = _current.set(timing)
+    # Template time needs the profiling hooks; reuse TemplateProfileMiddleware's
+    # profile when it is on, otherwise collect into our own.
+    profiling.install()
+    profile = profiling.RenderProfile()
+    profile_token = profiling.use_profile(profile)
+    try:
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(timing.sql))
+            yield timing
+    finally:
+        timing.template = profile.total
+        profiling.reset_profile(profile_token)
+        _current.reset(token)
+
+
+class ServerTimingMiddleware:
+    """Time the request and add the Server-Timing header when enabled."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.always = getattr(settings, 'SERVER_TIMING', False)
+
+    def __call__(self, request):
+        start = perf_counter()
+        if self.always:
+            with instrument(RequestTiming()) as timing:
+                response = self.get_response(request)
+        else:
+            response = self.get_response(request)
+            # Set by ViewTimingMiddleware once it has seen an admin ask for it
+            timing = getattr(request, '_server_timing', None)
+        if timing is not None:
+            response['Server-Timing'] = header_value(timing, perf_counter() - start)
+        return response
+
+
+class ViewTimingMiddleware:
+    """Innermost middleware: everything it wraps counts as the view phase."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timing = _current.get()
+        if timing is not None:
+            return self._timed(request, timing)
+        # Below AuthenticationMiddleware: only admins can switch instrumentation on
+        if not (_requested(request) and _is_admin(request)):
+            return self.get_response(request)
+        request._server_timing = RequestTiming()
+        with instrument(request._server_timing) as timing:
+            return self._timed(request, timing)
+
+    def _timed(self, request, timing):
+        start = perf_counter()
+        try:
+            return self.get_response(request)
+        finally:
+            timing.view += perf_counter() - start
@@ -12,8 +12,10 @@ urlpatterns = [
     path('about/', views.about, name='about'),
     path('contact/', views.contact, name='contact'),
     path('search/', views.search_products, name='search_products'),
+    path('search/suggest/', views.search_suggest, name='search_suggest'),
     path('products/', views.product_list, name='products'),
     path('product/<int:product_id>/', views.product_detail, name='product_detail'),
+    path('product/<int:product_id>/reviews/', views.product_reviews, name='product_reviews'),
     path('category/<int:category_id>/', views.category_filter, name='category_products'),
 
     # -----------------------------
@@ -34,12 +36,16 @@ urlpatterns = [
     path('wishlist/', views.wishlist, name='wishlist'),
     path('wishlist/add/<int:product_id>/', views.add_to_wishlist, name='add_to_wishlist'),
     path('wishlist/remove/<int:product_id>/', views.remove_from_wishlist, name='remove_from_wishlist'), 
+    path('wishlist/move-to-cart/', views.move_wishlist_to_cart_view, name='move_wishlist_to_cart'),
     path('cart/', views.cart_view, name='cart_view'),
     path('cart/add/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
-    path('cart/remove/<int:item_id>/', views.remove_from_cart, name='remove_from_cart'),
+    path('cart/remove/<int:product_id>/', views.remove_from_cart, name='remove_from_cart'),
     path('checkout/<int:product_id>/', views.checkout, name='checkout'),
     path('cart-checkout/', views.cart_checkout, name='cart_checkout'),
     path('cart/update/<int:product_id>/', views.update_cart_quantity, name='update_cart_quantity'),
+    path('cart/api/add/<int:product_id>/', views.cart_add_json, name='cart_add_json'),
+    path('cart/api/update/<int:product_id>/', views.cart_update_json, name='cart_update_json'),
+    path('cart/api/remove/<int:product_id>/', views.cart_remove_json, name='cart_remove_json'),
 
 
     # -----------------------------
@@ -58,6 +64,7 @@ urlpatterns = [
     path('admin-panel/delete-order/<int:order_id>/', views.delete_order, name='delete_order'),
     path('admin-panel/orders/', views.view_orders, name='view_orders'),
     path('admin-panel/order/assign/<int:order_id>/', views.assign_delivery, name='assign_delivery'),
+    path('admin-panel/orders/auto-assign/', views.auto_assign_deliveries, name='auto_assign_deliveries'),
     path('admin-panel/order/<int:order_id>/', views.admin_order_detail, name='admin_order_detail'),
     path('admin-panel/order/status/<int:order_id>/', views.update_order_status, name='update_order_status'),
     path('admin-panel/users/', views.manage_users, name='manage_users'),
@@ -66,6 +73,10 @@ urlpatterns = [
     path('admin-panel/promote-user/<int:user_id>/', views.promote_user, name='promote_user'),
 
     path('admin-panel/sales_report/', views.sales_report, name='sales_report'),
+    path('admin-panel/sales_report/download/', views.download_sales_report, name='download_sales_report'),
+    path('admin-panel/jobs/', views.job_queue, name='job_queue'),
+    path('admin-panel/template-profile/', views.template_profile, name='template_profile'),
+    path('admin-panel/order-events/', views.order_events, name='order_events'),
 
     # -----------------------------
     # 4️⃣ DELIVERY VIEWS
@@ -80,6 +91,7 @@ urlpatterns = [
     # 5️⃣ UTILITY / EXTRA VIEWS
     # -----------------------------
     path('terms/', views.terms_and_conditions, name='terms'),
+    path('metrics', views.metrics_view, name='metrics'),
 ]
 
 # -----------------------------
@@ -0,0 +1,96 @@
+# shop/users.py
+# ------------------------------------------------------------
+# User management queries for the admin Manage Users page
+# Prefix search over username/email/phone (served by the
+# indexes on User), role/active filters, keyset pagination on
+# id, and per-user order count / lifetime value computed as
+# correlated subqueries in the same SELECT as the page.
+# ------------------------------------------------------------
+
+import re
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Lower
+
+from .models import ArchivedOrder, Order, User
+
+USERS_PER_PAGE = 50
+# Statuses that don't count towards lifetime value
+EXCLUDED_STATUSES = ('cancelled',)
+
+# Upper bound for a prefix range scan: every string starting with the
+# prefix sorts below prefix + this character.
+PREFIX_END = '\U0010ffff'
+
+_PHONE_RE = re.compile(r'^[\d+\s-]+$')
+
+
+def _prefix(field, term):
+    return Q(**{f'{field}__gte': term, f'{field}__lt': term + PREFIX_END})
+
+
+def search_users(queryset, term):
+    """Case-insensitive prefix match on username, email or phone."""
+    term = term.strip()
+    if not term:
+        return queryset
+    lowered = term.lower()
+    match = _prefix('username_lower', lowered) | _prefix('email_lower', lowered)
+    # Only phone-like terms search phones, or 'alice99' would match every 99... number
+    if _PHONE_RE.match(term):
+        digits = ''.join(ch for ch in term if ch.isdigit() or ch == '+')
+        match |= _prefix('phone', digits)
+    return queryset.alias(
+        username_lower=Lower('username'), email_lower=Lower('email'),
+    ).filter(match)
+
+
+def _order_stat(model, aggregate, output_field):
+    rows = (
+        model.objects.filter(customer=OuterRef('pk'))
+        .exclude(status__in=EXCLUDED_STATUSES)
+        .order_by()
+        .values('customer')
+        .annotate(value=aggregate)
+        .values('value')
+    )
+    return Coalesce(Subquery(rows, output_field=output_field), Value(0), output_field=output_field)
+
+
+def with_order_stats(queryset):
+    """Annotate order_count and lifetime_value across live and archived orders."""
+    money = DecimalField(max_digits=12, decimal_places=2)
+    return queryset.annotate(
+        order_count=(_order_stat(Order, Count('id'), IntegerField())
+                     + _order_stat(ArchivedOrder, Count('id'), IntegerField())),
+        lifetime_value=(_order_stat(Order, Sum('total_amount'), money)
+                        + _order_stat(ArchivedOrder, Sum('total_amount'), money)),
+    )
+
+
+def parse_user_filters(params):
+    active = params.get('active', '')
+    return {
+        'q': params.get('q', '').strip(),
+        'role': params.get('role', ''),
+        'active': active if active in ('1', '0') else '',
+    }
+
+
+def user_page(filters, after=None, limit=USERS_PER_PAGE):
+    """One page of users, newest first. Returns (users, next_after)."""
+    users = User.objects.all()
+    if filters['role']:
+        users = users.filter(role=filters['role'])
+    if filters['active']:
+        users = users.filter(is_active=filters['active'] == '1')
+    users = search_users(users, filters['q'])
+    if after:
+        users = users.filter(id__lt=after)
+
+    page = list(with_order_stats(users).order_by('-id')[:limit + 1])
+    next_after = page[limit - 1].id if len(page) > limit else None
+    for user in page:
+        user.lifetime_value = Decimal(user.lifetime_value or 0).quantize(Decimal('0.01'))
+    return page[:limit], next_after
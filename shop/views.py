@@ -4,29 +4,57 @@
 # Role-based views for Customer, Admin, and Delivery Staff
 # ------------------------------------------------------------
 
+import csv
+from datetime import date
+from urllib.parse import urlencode
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
+from django.conf import settings
 from django.contrib import messages
+from django.core.paginator import Paginator
+from django.db import transaction
 from django.db.models import Q, Sum, Avg,Count
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
 from django.utils import timezone
 
 from .models import *
 from .forms import *
+from . import metrics, profiling
+from .analytics import parse_range, sales_report as analytics_sales_report
+from .archive import archived_orders, courier_orders, customer_orders, get_order_or_404, order_stats
+from .carts import SessionCart, cart_total, get_cart, merge_session_cart, move_wishlist_to_cart, product_state_context
+from .catalog import all_categories, featured_products
+from .db_router import use_replica
+from .delivery import courier_loads, courier_route
+from .facets import apply_filters, build_facets, cached_facet_cube, parse_filters
+from .idempotency import DuplicateSubmission, attach_order, claim_key, find_replay, new_key
+from .jobs import enqueue, queue_depth
+from .inventory import InsufficientStock, low_stock_products, record_movement, restock_order, sell_order, set_stock
+from .order_events import (
+    InvalidTransition, add_tracking, event_json, events_after, normalize_tracking_status, order_deleted, order_placed,
+    set_status,
+)
+from .recommendations import related_products
+from .reviews import rating_histogram, review_json, review_page
+from .ratelimit import client_ip, posted_username, rate_limit
+from .suggest import suggest
+from .users import parse_user_filters, user_page
 
 
 # ======================================================
 # 1️⃣ COMMON VIEWS (Publicly Accessible)
 # ======================================================
 
+@use_replica
 def home(request):
     """Homepage showing categories and featured products."""
-    categories = Category.objects.all()
-    featured_products = Product.objects.filter(is_featured=True)[:8]
     return render(request, 'home.html', {
-        'categories': categories,
-        'featured_products': featured_products
+        'categories': all_categories(),
+        'featured_products': featured_products(),
+        **product_state_context(request),
     })
 
 
@@ -35,6 +63,7 @@ def about(request):
     return render(request, 'about.html')
 
 
+@rate_limit('contact')
 def contact(request):
     """Contact form page."""
     if request.method == 'POST':
@@ -48,41 +77,59 @@ def contact(request):
     return render(request, 'contact.html', {'form': form})
 
 
+PRODUCTS_PER_PAGE = 24
+
+
+def _render_product_listing(request, products, cache_key, cache_tags, extra_context=None):
+    """Apply facet filters from the querystring and render product_list.html."""
+    filters = parse_filters(request.GET)
+    categories = all_categories()
+    cube = cached_facet_cube(products, cache_key, cache_tags)
+    facets = build_facets(products, filters, categories, request.GET, cube=cube)
+
+    page = Paginator(apply_filters(products, filters), PRODUCTS_PER_PAGE).get_page(request.GET.get('page'))
+    params = request.GET.copy()
+    params.pop('page', None)
+
+    context = {
+        'products': page,
+        'categories': categories,
+        'facets': facets,
+        'filters': filters,
+        'page_query': params.urlencode(),
+        **product_state_context(request),
+    }
+    context.update(extra_context or {})
+    return render(request, 'product_list.html', context)
+
+
+@use_replica
 def product_list(request):
-    """List all products with search and filter."""
+    """List all products with search and faceted filters."""
     query = request.GET.get('q')
-    category_id = request.GET.get('category')
     products = Product.objects.all()
 
     if query:
         products = products.filter(Q(name__icontains=query) | Q(description__icontains=query))
-    if category_id:
-        products = products.filter(category_id=category_id)
 
-    categories = Category.objects.all()
-    return render(request, 'product_list.html', {
-        'products': products,
-        'categories': categories,
-        'selected_category': category_id
+    return _render_product_listing(request, products, ('all', query or ''), ['catalog'], {
+        'selected_category': request.GET.get('category'),
     })
 
 
+@use_replica
 def category_filter(request, category_id):
     """Filter products by category."""
     category = get_object_or_404(Category, id=category_id)
     products = Product.objects.filter(category=category)
-    categories = Category.objects.all()
-    return render(request, 'product_list.html', {
-        'category': category,
-        'products': products,
-        'categories': categories,
-    })
+    return _render_product_listing(request, products, ('category', category.id), [f'category:{category.id}'],
+                                   {'category': category})
 
 
+@use_replica
 def product_detail(request, product_id):
     """Product detail with reviews and buy/add options."""
-    product = get_object_or_404(Product, id=product_id)
-    reviews = Review.objects.filter(product=product)
+    product = get_object_or_404(Product.objects.select_related('category'), id=product_id)
 
     if request.method == 'POST' and request.user.is_authenticated:
         review_form = ReviewForm(request.POST)
@@ -91,22 +138,36 @@ def product_detail(request, product_id):
             review.user = request.user
             review.product = product
             review.save()
+            product.refresh_rating()
             messages.success(request, 'Your review has been submitted!')
             return redirect('product_detail', product_id=product.id)
     else:
         review_form = ReviewForm()
 
+    reviews, next_cursor = review_page(product.id)
     return render(request, 'product_detail.html', {
         'product': product,
         'reviews': reviews,
-        'review_form': review_form
+        'reviews_next': next_cursor,
+        'rating_histogram': rating_histogram(product.id),
+        'review_form': review_form,
+        'related_products': related_products(product),
     })
 
 
+@use_replica
+def product_reviews(request, product_id):
+    """JSON "load more" page of reviews older than ?before=<review id>."""
+    before = request.GET.get('before', '')
+    reviews, next_cursor = review_page(product_id, before=int(before) if before.isdigit() else None)
+    return JsonResponse({'reviews': [review_json(review) for review in reviews], 'next': next_cursor})
+
+
 # ======================================================
 # 2️⃣ CUSTOMER / USER VIEWS
 # ======================================================
 
+@rate_limit('register')
 def register_user(request):
     """User registration."""
     if request.user.is_authenticated:
@@ -118,7 +179,9 @@ def register_user(request):
             user = form.save(commit=False)
             user.role = 'customer'
             user.save()
+            session_cart = SessionCart(request.session).pop()
             login(request, user)
+            merge_session_cart(session_cart, user)
             messages.success(request, "Registration successful! Welcome aboard.")
             return redirect('home')
         else:
@@ -130,6 +193,8 @@ def register_user(request):
 
 
 
+@rate_limit('login')
+@rate_limit('login_account', key=posted_username)
 def login_user(request):
     if request.user.is_authenticated:
         # If already logged in, redirect based on role
@@ -140,7 +205,9 @@ def login_user(request):
         form = LoginForm(request, data=request.POST)
         if form.is_valid():
             user = form.get_user()
+            session_cart = SessionCart(request.session).pop()
             login(request, user)
+            merge_session_cart(session_cart, user)
             messages.success(request, "Logged in successfully!")
 
             role = getattr(user, 'role', 'customer')
@@ -200,9 +267,19 @@ def order_page(request, product_id):
     return render(request, 'order_page.html', {'product': product})
 
 @login_required(login_url='login')
+@rate_limit('checkout', key='user')
 def cart_checkout(request):
+    if request.method == "POST":
+        # A replay arrives after the cart was cleared; answer it first
+        try:
+            find_replay(request.user, request.POST.get('idempotency_key'))
+        except DuplicateSubmission as dup:
+            return _duplicate_checkout(request, dup)
+
     cart_items = Cart.objects.filter(user=request.user)
     if not cart_items.exists():
+        if request.method == "POST":
+            metrics.CHECKOUT_FAILURES.inc(reason='empty_cart')
         messages.warning(request, "Your cart is empty!")
         return redirect('cart_view')
 
@@ -211,26 +288,40 @@ def cart_checkout(request):
     if request.method == "POST":
         payment_method = request.POST.get('payment_method', 'COD')
         address = request.POST.get('address', request.user.address)
-
-        order = Order.objects.create(
-            customer=request.user,
-            total_amount=total_amount,
-            status='pending',
-            payment_method=payment_method,
-            address=address
-        )
-
-        # Save all cart items as order items
-        for item in cart_items:
-            OrderItem.objects.create(
-                order=order,
-                product=item.product,
-                quantity=item.quantity,
-                price=item.product.price
-            )
-
-        # Clear the cart after order
-        cart_items.delete()
+        idempotency_key = request.POST.get('idempotency_key')
+
+        try:
+            with transaction.atomic():
+                claim = claim_key(request.user, idempotency_key)
+                order = Order.objects.create(
+                    customer=request.user,
+                    total_amount=total_amount,
+                    status='pending',
+                    payment_method=payment_method,
+                    address=address
+                )
+
+                # Save all cart items as order items
+                for item in cart_items:
+                    OrderItem.objects.create(
+                        order=order,
+                        product=item.product,
+                        quantity=item.quantity,
+                        price=item.product.price
+                    )
+                sell_order(order)
+                attach_order(claim, order)
+                order_placed(order)
+
+                # Clear the cart after order
+                cart_items.delete()
+        except DuplicateSubmission as dup:
+            return _duplicate_checkout(request, dup)
+        except InsufficientStock as exc:
+            metrics.CHECKOUT_FAILURES.inc(reason='out_of_stock')
+            product = Product.objects.filter(pk=exc.product_id).first()
+            messages.error(request, f"Sorry, only {product.stock if product else 0} of {product or 'an item'} left in stock.")
+            return redirect('cart_view')
 
         messages.success(request, f"Order #{order.id} placed successfully!")
         return redirect('order_confirmation', order_id=order.id)
@@ -238,25 +329,36 @@ def cart_checkout(request):
     return render(request, 'checkout.html', {
         'cart_items': cart_items,
         'total_amount': total_amount,
-        'single_product_checkout': False
+        'single_product_checkout': False,
+        'idempotency_key': new_key(),
     })
 
 
+def _duplicate_checkout(request, duplicate):
+    """Answer a replayed checkout POST with the order it already created."""
+    metrics.CHECKOUT_FAILURES.inc(reason='duplicate')
+    if duplicate.order_id:
+        return redirect('order_confirmation', order_id=duplicate.order_id)
+    messages.info(request, "Your order is already being placed.")
+    return redirect('my_orders')
+
+
 
 
 
 @login_required(login_url='login')
 def order_confirmation(request, order_id):
     """Order confirmation page."""
-    order = get_object_or_404(Order, id=order_id, customer=request.user)
+    order = get_order_or_404(order_id, customer=request.user)
     return render(request, 'order_confirmation.html', {'order': order})
 
 
 @login_required
 def my_orders(request):
     """Display all orders of a user."""
-    orders = Order.objects.filter(customer=request.user).order_by('-created_at')
-    return render(request, 'my_orders.html', {'orders': orders})
+    before = request.GET.get('before', '')
+    orders, next_before = customer_orders(request.user, before=int(before) if before.isdigit() else None)
+    return render(request, 'my_orders.html', {'orders': orders, 'next_before': next_before})
 
 
 # -------------------------------
@@ -282,56 +384,114 @@ def remove_from_wishlist(request, product_id):
     return redirect('wishlist')
 
 
+@login_required
+def move_wishlist_to_cart_view(request):
+    """Move every in-stock wishlist item to the cart at once."""
+    if request.method == 'POST':
+        moved = move_wishlist_to_cart(request.user)
+        if moved:
+            messages.success(request, f"Moved {moved} item{'s' if moved != 1 else ''} to your cart.")
+            return redirect('cart_view')
+        messages.info(request, "Nothing new to add: wishlist items are out of stock or already in your cart.")
+    return redirect('wishlist')
+
+
 # -------------------------------
 # Cart Views
 # -------------------------------
 
-@login_required
+def _posted_quantity(request, name='quantity'):
+    value = request.POST.get(name, '1')
+    return max(int(value), 0) if value.isdigit() else 1
+
+
 def cart(request):
-    cart_items = Cart.objects.filter(user=request.user).select_related('product')
-    total = sum(item.product.price * item.quantity for item in cart_items)
-    return render(request, 'cart.html', {'cart_items': cart_items, 'total': total})
+    return cart_view(request)
 
 
-@login_required
 def add_to_cart(request, product_id):
+    """Add a product to the session cart (anonymous) or Cart rows (signed in)."""
     product = get_object_or_404(Product, id=product_id)
-    cart_item, created = Cart.objects.get_or_create(user=request.user, product=product)
-    if not created:
-        cart_item.quantity += 1
-        cart_item.save()
+    get_cart(request).add(product.id, max(_posted_quantity(request), 1))
+    metrics.CART_ADDS.inc(source='page')
     return redirect('cart_view')
 
-@login_required
-def remove_from_cart(request, item_id):
-    cart_item = get_object_or_404(Cart, id=item_id, user=request.user)
-    cart_item.delete()
+
+def remove_from_cart(request, product_id):
+    get_cart(request).remove(product_id)
     messages.success(request, "Item removed from cart successfully!")
     return redirect('cart_view')
 
 
-
-
-@login_required
 def update_cart_quantity(request, product_id):
     if request.method == "POST":
-        new_qty = int(request.POST.get('quantity', 1))
-        cart_item = get_object_or_404(Cart, user=request.user, product_id=product_id)
-        cart_item.quantity = new_qty
-        cart_item.save()
+        quantity = _posted_quantity(request)
+        cart = get_cart(request)
+        if quantity:
+            cart.set_quantity(product_id, quantity)
+        else:
+            cart.remove(product_id)
     return redirect('cart_view')
 
-@login_required(login_url='login')
+
+def _cart_json(request, product_id, mutate):
+    """Apply ``mutate(cart)`` to a POSTed cart and return the changed line and totals."""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    cart = get_cart(request)
+    mutate(cart)
+    return JsonResponse(cart.summary(product_id))
+
+
+def cart_add_json(request, product_id):
+    product = get_object_or_404(Product, id=product_id)
+    quantity = max(_posted_quantity(request), 1)
+
+    def add(cart):
+        cart.add(product.id, quantity)
+        metrics.CART_ADDS.inc(source='api')
+    return _cart_json(request, product.id, add)
+
+
+def cart_update_json(request, product_id):
+    quantity = _posted_quantity(request)
+
+    def mutate(cart):
+        if quantity:
+            cart.set_quantity(product_id, quantity)
+        else:
+            cart.remove(product_id)
+    return _cart_json(request, product_id, mutate)
+
+
+def cart_remove_json(request, product_id):
+    return _cart_json(request, product_id, lambda cart: cart.remove(product_id))
+
+
 def cart_view(request):
-    cart_items = Cart.objects.filter(user=request.user)
-    total = sum(item.product.price * item.quantity for item in cart_items)
-    return render(request, 'cart.html', {'cart_items': cart_items, 'total': total})
+    """Cart page for both backends; POST applies the quantity_<product id> fields."""
+    cart = get_cart(request)
+    if request.method == 'POST':
+        for product_id in cart.product_ids():
+            field = f'quantity_{product_id}'
+            if field in request.POST:
+                quantity = _posted_quantity(request, field)
+                if quantity:
+                    cart.set_quantity(product_id, quantity)
+                else:
+                    cart.remove(product_id)
+        return redirect('cart_view')
+
+    cart_items = cart.lines()
+    total = cart_total(cart_items)
+    return render(request, 'cart.html', {'cart_items': cart_items, 'total': total, 'total_amount': total})
 
 
 # -------------------------------
 # Checkout Page
 # -------------------------------
 @login_required(login_url='login')
+@rate_limit('checkout', key='user')
 def checkout(request, product_id):
     product = get_object_or_404(Product, id=product_id)
 
@@ -346,6 +506,7 @@ def checkout(request, product_id):
             'quantity': quantity,
             'subtotal': subtotal,
             'total': subtotal,  # Can include shipping later
+            'idempotency_key': new_key(),
         })
 
     # When the user submits the checkout form (second POST request)
@@ -354,22 +515,37 @@ def checkout(request, product_id):
         payment_method = request.POST.get('payment_method', 'COD')
         address = request.POST.get('address', getattr(request.user, 'address', 'Not Provided'))
         total_price = product.price * quantity
+        idempotency_key = request.POST.get('idempotency_key')
 
         # Create order and order item
-        order = Order.objects.create(
-            customer=request.user,
-            status='pending',
-            payment_method=payment_method,
-            total_amount=total_price,
-            address=address
-        )
-
-        OrderItem.objects.create(
-            order=order,
-            product=product,
-            quantity=quantity,
-            price=product.price
-        )
+        try:
+            find_replay(request.user, idempotency_key)
+            with transaction.atomic():
+                claim = claim_key(request.user, idempotency_key)
+                order = Order.objects.create(
+                    customer=request.user,
+                    status='pending',
+                    payment_method=payment_method,
+                    total_amount=total_price,
+                    address=address
+                )
+
+                OrderItem.objects.create(
+                    order=order,
+                    product=product,
+                    quantity=quantity,
+                    price=product.price
+                )
+                sell_order(order)
+                attach_order(claim, order)
+                order_placed(order)
+        except DuplicateSubmission as dup:
+            return _duplicate_checkout(request, dup)
+        except InsufficientStock:
+            metrics.CHECKOUT_FAILURES.inc(reason='out_of_stock')
+            product.refresh_from_db(fields=['stock'])
+            messages.error(request, f"Sorry, only {product.stock} of {product.name} left in stock.")
+            return redirect('product_detail', product_id=product.id)
 
         messages.success(request, "Order placed successfully!")
         return redirect('order_confirmation', order_id=order.id)
@@ -383,6 +559,7 @@ def checkout(request, product_id):
             'quantity': quantity,
             'subtotal': subtotal,
             'total': subtotal,
+            'idempotency_key': new_key(),
         })
 
 
@@ -398,6 +575,7 @@ def admin_required(user):
 
 
 @login_required(login_url='login')
+@use_replica
 def admin_dashboard(request):
     # Prevent non-admin users from seeing this
     if not hasattr(request.user, 'role') or request.user.role != 'admin':
@@ -407,8 +585,9 @@ def admin_dashboard(request):
     # Dashboard stats
     total_users = User.objects.count()
     total_products = Product.objects.count()
-    total_orders = Order.objects.count()
-    total_sales = Order.objects.aggregate(total=Sum('total_amount'))['total'] or 0
+    stats = order_stats()
+    total_orders = stats['count']
+    total_sales = stats['revenue']
 
     # Recent 5 orders
     recent_orders = (
@@ -417,11 +596,7 @@ def admin_dashboard(request):
     )
 
     # Orders by status
-    order_status_data = (
-        Order.objects.values('status')
-        .annotate(count=Count('id'))
-        .order_by()
-    )
+    order_status_data = [{'status': status, 'count': count} for status, count in stats['by_status'].items()]
 
     context = {
         'total_users': total_users,
@@ -430,6 +605,7 @@ def admin_dashboard(request):
         'total_sales': total_sales,
         'recent_orders': recent_orders,
         'order_status_data': order_status_data,
+        'low_stock_products': low_stock_products()[:10],
     }
 
     return render(request, 'admin/dashboard.html', context)
@@ -447,15 +623,20 @@ def add_product(request):
         is_featured = 'is_featured' in request.POST
 
         category = get_object_or_404(Category, id=category_id)
-        Product.objects.create(
-            name=name,
-            category=category,
-            price=price,
-            description=description,
-            stock=stock,
-            image=image,
-            is_featured=is_featured,
-        )
+        with transaction.atomic():
+            product = Product.objects.create(
+                name=name,
+                category=category,
+                price=price,
+                description=description,
+                stock=0,
+                image=image,
+                is_featured=is_featured,
+            )
+            if int(stock or 0) > 0:
+                record_movement(product.id, 'restock', int(stock), user=request.user, note='Initial stock')
+            if image:
+                enqueue('process_product_image', product.id)
         messages.success(request, "Product added successfully!")
         return redirect('admin_dashboard')
     return render(request, 'admin/add_product.html', {'categories': categories})
@@ -482,17 +663,34 @@ def edit_product(request, product_id):  # make sure the parameter matches your U
         product.name = request.POST.get('name')
         product.category_id = request.POST.get('category')
         product.price = request.POST.get('price')
-        product.stock = request.POST.get('stock')
         product.description = request.POST.get('description')
         product.is_featured = 'is_featured' in request.POST
 
         if request.FILES.get('image'):
             product.image = request.FILES['image']
 
-        product.save()
+        # Stock goes through the ledger as a delta from the value the form
+        # was loaded with, so concurrent sales/edits are not overwritten.
+        counted = int(request.POST.get('stock') or 0)
+        expected = int(request.POST.get('stock_original') or product.stock)
+        try:
+            with transaction.atomic():
+                product.save(update_fields=['name', 'category', 'price', 'description', 'is_featured', 'image'])
+                set_stock(product, counted, expected, user=request.user)
+                if request.FILES.get('image'):
+                    enqueue('process_product_image', product.id)
+        except InsufficientStock:
+            # Sales since the form loaded left less than the reduction asked for
+            product.refresh_from_db(fields=['stock'])
+            return render(request, 'admin/edit_product.html', {
+                'product': product,
+                'categories': categories,
+                'stock_error': f"Stock changed to {product.stock} while you were editing. "
+                               "Check the new count and save again.",
+            })
         return redirect('admin_dashboard')
 
-    return render(request, 'adminedit_product.html', {
+    return render(request, 'admin/edit_product.html', {
         'product': product,
         'categories': categories,  # <-- passed to template
     })
@@ -589,15 +787,17 @@ def manage_users(request):
     if request.user.role != 'admin':
         return redirect('home')
 
-    selected_role = request.GET.get('role', '')
-
-    users = User.objects.all().order_by('-date_joined')
-    if selected_role:
-        users = users.filter(role=selected_role)
+    filters = parse_user_filters(request.GET)
+    after = request.GET.get('after')
+    users, next_after = user_page(filters, after=int(after) if after and after.isdigit() else None)
 
     context = {
         'users': users,
-        'selected_role': selected_role,
+        'filters': filters,
+        'selected_role': filters['role'],
+        'next_after': next_after,
+        'is_first_page': not after,
+        'filter_query': urlencode({k: v for k, v in filters.items() if v}),
     }
     return render(request, 'admin/manage_users.html', context)
 
@@ -650,8 +850,16 @@ def manage_orders(request):
         messages.error(request, "Access denied. Admins only.")
         return redirect('home')
         
-    orders = Order.objects.all().order_by('-created_at')
-    return render(request, 'admin/manage_orders.html', {'orders': orders})
+    show_archived = request.GET.get('archived') == '1'
+    next_before = None
+    if show_archived:
+        before = request.GET.get('before', '')
+        orders, next_before = archived_orders(before=int(before) if before.isdigit() else None)
+    else:
+        orders = Order.objects.select_related('customer').order_by('-created_at')
+    return render(request, 'admin/manage_orders.html', {
+        'orders': orders, 'show_archived': show_archived, 'next_before': next_before,
+    })
 
 
 
@@ -659,8 +867,8 @@ def manage_orders(request):
 @login_required(login_url='login')
 def admin_order_detail(request, order_id):
     """Admin view for viewing full order details."""
-    order = get_object_or_404(Order, id=order_id)
-    items = OrderItem.objects.filter(order=order)
+    order = get_order_or_404(order_id)
+    items = order.items.select_related('product')
     return render(request, 'admin/order_detail.html', {
         'order': order,
         'items': items
@@ -674,7 +882,12 @@ def delete_order(request, order_id):
         return redirect('home')
 
     order = get_object_or_404(Order, id=order_id)
-    order.delete()
+    with transaction.atomic():
+        # Undelivered goods go back on the shelf
+        if order.status not in ('delivered', 'cancelled'):
+            restock_order(order, user=request.user)
+        order_deleted(order, user=request.user)
+        order.delete()
     messages.success(request, "Order deleted successfully!")
     return redirect('manage_orders')
    
@@ -688,17 +901,24 @@ def view_orders(request):
 @login_required(login_url='login')
 def assign_delivery(request, order_id):
     order = get_object_or_404(Order, id=order_id)
-    delivery_persons = User.objects.filter(role='delivery')
+    delivery_persons = list(User.objects.filter(role='delivery'))
+
+    # Show each courier's current open load, least busy first
+    loads = courier_loads()
+    for person in delivery_persons:
+        person.open_deliveries = loads.get(person.id, 0)
+    delivery_persons.sort(key=lambda person: person.open_deliveries)
 
     if request.method == 'POST':
         delivery_id = request.POST.get('delivery_person')
         if delivery_id:
             delivery_person = User.objects.get(id=delivery_id)
-            order.delivery_person = delivery_person
-            order.status = 'processing'
-            order.save()
-            DeliveryTracking.objects.create(order=order, delivery_person=delivery_person, status='assigned')
-            messages.success(request, f"Delivery assigned to {delivery_person.username}")
+            try:
+                add_tracking(order, 'assigned', delivery_person)
+            except InvalidTransition as exc:
+                messages.error(request, str(exc))
+            else:
+                messages.success(request, f"Delivery assigned to {delivery_person.username}")
             return redirect('view_orders')
 
     return render(request, 'admin/assign_delivery.html', {
@@ -708,26 +928,131 @@ def assign_delivery(request, order_id):
 
 
 @login_required(login_url='login')
-def sales_report(request):
-    from_date = request.GET.get('from')
-    to_date = request.GET.get('to')
-    sales = Order.objects.filter(status='delivered')
+def auto_assign_deliveries(request):
+    """Assign every pending order to the least-loaded delivery staff."""
+    if request.user.role != 'admin':
+        messages.error(request, "Access denied. Admins only.")
+        return redirect('home')
+
+    if request.method == 'POST':
+        # Large backlogs can take a while; let the job worker do it
+        enqueue('auto_assign_deliveries')
+        messages.success(request, "Auto-assignment queued. Orders will update shortly.")
+    return redirect('manage_orders')
+
+
+@login_required(login_url='login')
+def job_queue(request):
+    """Background job queue depth and recent failures."""
+    if request.user.role != 'admin':
+        messages.error(request, "Access denied. Admins only.")
+        return redirect('home')
+
+    return render(request, 'admin/job_queue.html', {
+        'depth': queue_depth(),
+        'failed_jobs': Job.objects.filter(status='failed').order_by('-finished_at')[:20],
+        'upcoming_jobs': Job.objects.filter(status='queued').order_by('run_at')[:20],
+    })
+
+
+@login_required(login_url='login')
+def template_profile(request):
+    """Slowest templates and tags per URL (TEMPLATE_PROFILING)."""
+    if request.user.role != 'admin':
+        messages.error(request, "Access denied. Admins only.")
+        return redirect('home')
+
+    if request.method == 'POST':
+        profiling.reset()
+        messages.success(request, "Template profile cleared.")
+        return redirect('template_profile')
+
+    return render(request, 'admin/template_profile.html', {
+        'enabled': profiling.profiling_enabled(),
+        'report': profiling.report(),
+    })
+
+
+@login_required(login_url='login')
+def order_events(request):
+    """JSON outbox feed: events after ?after=<id>; poll again with the returned cursor."""
+    if request.user.role != 'admin':
+        return JsonResponse({'error': 'Admins only'}, status=403)
+    after = request.GET.get('after', '')
+    kinds = [kind for kind in request.GET.getlist('kind') if kind]
+    events = events_after(int(after) if after.isdigit() else 0, kinds=kinds)
+    return JsonResponse({
+        'events': [event_json(event) for event in events],
+        'next': events[-1].id if events else (int(after) if after.isdigit() else 0),
+    })
+
+
+SALES_PERIODS = {'day': 'daily', 'week': 'weekly', 'month': 'monthly'}
 
-    if from_date and to_date:
-        sales = sales.filter(created_at__range=[from_date, to_date])
 
-    total_orders = sales.count()
-    total_revenue = sales.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-    avg_order_value = sales.aggregate(Avg('total_amount'))['total_amount__avg'] or 0
+def _sales_report_data(request):
+    start, end = parse_range(request.GET)
+    category_id = request.GET.get('category', '')
+    category_id = int(category_id) if category_id.isdigit() else None
+    report, fresh = analytics_sales_report(start, end, category_id)
+    period = request.GET.get('period')
+    if period not in SALES_PERIODS:
+        period = 'day' if (end - start).days < 31 else 'week'
+    return report, fresh, period, start, end
 
+
+@login_required(login_url='login')
+@use_replica
+def sales_report(request):
+    """Revenue/order time series, top sellers and cohort repeat rates for a date range."""
+    if request.user.role != 'admin':
+        messages.error(request, "Access denied. Admins only.")
+        return redirect('home')
+
+    # Computed by the build_sales_report job; until it has run the page says so and refreshes
+    report, fresh, period, start, end = _sales_report_data(request)
+    params = request.GET.copy()
+    params.pop('period', None)
     return render(request, 'admin/sales_report.html', {
-        'sales': sales,
-        'total_orders': total_orders,
-        'total_revenue': total_revenue,
-        'avg_order_value': avg_order_value
+        'report': report,
+        'fresh': fresh,
+        'start': start,
+        'end': end,
+        'total_orders': report['total_orders'] if report else 0,
+        'total_revenue': report['total_revenue'] if report else 0,
+        'avg_order_value': report['avg_order_value'] if report else 0,
+        'period': period,
+        'series': report[SALES_PERIODS[period]] if report else [],
+        'period_query': params.urlencode(),
+        'categories': Category.objects.all(),
     })
 
 
+@login_required(login_url='login')
+@use_replica
+def download_sales_report(request):
+    """The selected sales series as CSV."""
+    if request.user.role != 'admin':
+        messages.error(request, "Access denied. Admins only.")
+        return redirect('home')
+
+    report, _, period, _, _ = _sales_report_data(request)
+    if report is None:
+        messages.info(request, "The report is still being prepared. Try the download again shortly.")
+        return redirect(f"{reverse('sales_report')}?{request.GET.urlencode()}")
+    response = HttpResponse(content_type='text/csv')
+    response['Content-Disposition'] = (
+        f'attachment; filename="sales_{period}_{report["start"]:%Y%m%d}_{report["end"]:%Y%m%d}.csv"'
+    )
+    writer = csv.writer(response)
+    writer.writerow(['period', 'orders', 'revenue', 'moving_average' if period == 'day' else 'change_pct'])
+    for row in report[SALES_PERIODS[period]]:
+        extra = row['moving_average'] if period == 'day' else row['change']
+        writer.writerow([row['period'].isoformat(), row['orders'], row['revenue'],
+                         '' if extra is None else round(extra, 2)])
+    return response
+
+
 @login_required(login_url='login')
 def update_order_status(request, order_id):
     order = get_object_or_404(Order, id=order_id)
@@ -735,9 +1060,12 @@ def update_order_status(request, order_id):
     if request.method == 'POST':
         new_status = request.POST.get('status')
         if new_status in dict(Order.STATUS_CHOICES).keys():
-            order.status = new_status
-            order.save()
-            messages.success(request, f'Order #{order.id} status updated to {new_status}.')
+            try:
+                set_status(order, new_status, user=request.user)
+            except InvalidTransition as exc:
+                messages.error(request, str(exc))
+            else:
+                messages.success(request, f'Order #{order.id} status updated to {new_status}.')
         else:
             messages.error(request, 'Invalid status value.')
         return redirect('admin_dashboard')  # or change this to where you list orders
@@ -745,8 +1073,8 @@ def update_order_status(request, order_id):
     return render(request, 'admin/update_order_status.html', {'order': order})
 
 def view_order_details(request, order_id):
-    order = get_object_or_404(Order, id=order_id)
-    order_items = OrderItem.objects.filter(order=order)
+    order = get_order_or_404(order_id)
+    order_items = order.items.select_related('product')
 
     context = {
         'order': order,
@@ -766,17 +1094,19 @@ def delivery_required(user):
 @user_passes_test(delivery_required)
 def delivery_dashboard(request):
     active_deliveries = DeliveryTracking.objects.filter(delivery_person=request.user).exclude(status='delivered')
-    completed_deliveries = DeliveryTracking.objects.filter(delivery_person=request.user, status='delivered')
+    # Orders, not tracking rows, so deliveries that were archived still show
+    completed_deliveries, _ = courier_orders(request.user, statuses=['delivered'])
 
     return render(request, 'delivery/dashboard.html', {
         'active_deliveries': active_deliveries,
-        'completed_deliveries': completed_deliveries
+        'completed_deliveries': completed_deliveries,
+        'route': courier_route(request.user),
     })
 
 
 @user_passes_test(delivery_required)
 def delivery_order_details(request, order_id):
-    order = get_object_or_404(Order, id=order_id, delivery_person=request.user)
+    order = get_order_or_404(order_id, delivery_person=request.user)
     return render(request, 'delivery/order_details.html', {'order': order})
 
 
@@ -784,36 +1114,83 @@ def delivery_order_details(request, order_id):
 def update_delivery_status(request, order_id):
     order = get_object_or_404(Order, id=order_id, delivery_person=request.user)
     if request.method == 'POST':
-        new_status = request.POST.get('status')
+        new_status = normalize_tracking_status(request.POST.get('status'))
+        if not new_status:
+            messages.error(request, 'Invalid status value.')
+            return redirect('update_delivery_status', order_id=order.id)
         notes = request.POST.get('notes', '')
-        order.status = new_status
-        order.save()
-        DeliveryTracking.objects.create(order=order, delivery_person=request.user, status=new_status, notes=notes)
-        messages.success(request, f"Order #{order.id} marked as {new_status}.")
+        try:
+            add_tracking(order, new_status, request.user, notes)
+        except InvalidTransition as exc:
+            messages.error(request, str(exc))
+            return redirect('update_delivery_status', order_id=order.id)
+        messages.success(request, f"Order #{order.id} marked as {order.get_status_display()}.")
         return redirect('delivery_dashboard')
     return render(request, 'delivery/update_status.html', {'order': order})
 
 
 @user_passes_test(delivery_required)
 def delivery_history(request):
-    deliveries = DeliveryTracking.objects.filter(delivery_person=request.user, status='delivered').order_by('-updated_at')
-    return render(request, 'delivery/history.html', {'deliveries': deliveries})
+    status = request.GET.get('status')
+    statuses = [status] if status in ('delivered', 'cancelled') else ['delivered', 'cancelled']
+    filters = {}
+    for param, lookup in (('from', 'gte'), ('to', 'lte')):
+        try:
+            filters[f'tracking_updated_at__date__{lookup}'] = date.fromisoformat(request.GET.get(param, ''))
+        except ValueError:
+            pass
+    before = request.GET.get('before', '')
+    deliveries, next_before = courier_orders(
+        request.user, statuses, before=int(before) if before.isdigit() else None, **filters)
+    params = request.GET.copy()
+    params.pop('before', None)
+    return render(request, 'delivery/history.html', {
+        'deliveries': deliveries,
+        'next_before': next_before,
+        'filter_query': params.urlencode(),
+    })
 
 
 # ======================================================
 # 5️⃣ UTILITY / EXTRA VIEWS
 # ======================================================
 
+@use_replica
 def search_products(request):
-    query = request.GET.get('q')
+    query = request.GET.get('q') or ''
     products = Product.objects.filter(Q(name__icontains=query) | Q(description__icontains=query))
-    categories = Category.objects.all()
-    return render(request, 'product_list.html', {'products': products, 'categories': categories})
+    return _render_product_listing(request, products, ('all', query), ['catalog'])
+
+
+SUGGEST_LIMIT = 8
+
+
+def search_suggest(request):
+    """JSON search-as-you-type suggestions for the navbar search box."""
+    query = request.GET.get('q', '')
+    suggestions = []
+    for hit in suggest(query, SUGGEST_LIMIT):
+        url_name = 'product_detail' if hit['kind'] == 'product' else 'category_products'
+        url_kwarg = 'product_id' if hit['kind'] == 'product' else 'category_id'
+        suggestions.append({
+            'label': hit['label'],
+            'kind': hit['kind'],
+            'url': reverse(url_name, kwargs={url_kwarg: hit['id']}),
+        })
+    return JsonResponse({'query': query, 'suggestions': suggestions})
 
 
 def terms_and_conditions(request):
     return render(request, 'terms.html')
 
 
+def metrics_view(request):
+    """Prometheus scrape endpoint (allowed IPs or admins)."""
+    allowed = client_ip(request) in getattr(settings, 'METRICS_ALLOWED_IPS', ())
+    if not (metrics.metrics_enabled() and (allowed or getattr(request.user, 'role', None) == 'admin')):
+        return HttpResponse(status=404)
+    return HttpResponse(metrics.render_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 def error_404_view(request, exception):
     return render(request, '404.html', status=404)
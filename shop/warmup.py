@@ -0,0 +1,119 @@
+# shop/warmup.py
+# ------------------------------------------------------------
+# Worker warm-up
+# Run once per process before it takes traffic (ecommerce/wsgi.py
+# with CACHE_WARMUP on, or `manage.py warm_cache`): check the DB
+# connections, compile every template into the cached loader,
+# build the suggest index and fill the shop cache with what the
+# home, listing, category and top product pages read first.
+# wsgi.py closes the connections afterwards, since it may run
+# in a preloading master whose handles forked workers would share.
+# ------------------------------------------------------------
+
+import logging
+from pathlib import Path
+from time import perf_counter
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+from django.template.utils import get_app_template_dirs
+
+from . import suggest
+from .catalog import all_categories, featured_products, top_product_ids
+from .facets import cached_facet_cube
+from .models import Product
+from .reviews import rating_histogram
+
+logger = logging.getLogger(__name__)
+
+TOP_PRODUCTS = 20
+
+
+def open_connections():
+    opened = 0
+    for alias in connections:
+        try:
+            connections[alias].ensure_connection()
+            opened += 1
+        except DatabaseError as exc:
+            logger.warning("Warm-up could not connect to %s: %s", alias, exc)
+    return opened
+
+
+def _template_names(engine):
+    # Project templates only: DIRS plus app template dirs inside BASE_DIR
+    base = Path(settings.BASE_DIR)
+    dirs = [Path(directory) for directory in engine.dirs]
+    dirs += [path for path in map(Path, get_app_template_dirs('templates')) if base in path.parents]
+    for root in dirs:
+        for path in root.rglob('*.html'):
+            yield path.relative_to(root).as_posix()
+
+
+def compile_templates():
+    """Parse every project template so the cached loader holds it."""
+    compiled = 0
+    for engine in engines.all():
+        if not hasattr(engine, 'engine'):
+            continue
+        for name in set(_template_names(engine.engine)):
+            try:
+                engine.get_template(name)
+                compiled += 1
+            except (TemplateDoesNotExist, TemplateSyntaxError) as exc:
+                logger.warning("Warm-up skipped template %s: %s", name, exc)
+    return compiled
+
+
+def warm_catalog():
+    categories = all_categories()
+    featured_products()
+    # Same keys and tags as the product_list / category_filter views
+    cached_facet_cube(Product.objects.all(), ('all', ''), ['catalog'])
+    for category in categories:
+        cached_facet_cube(Product.objects.filter(category=category), ('category', category.id),
+                          [f'category:{category.id}'])
+    return len(categories) + 1
+
+
+def warm_top_products(limit=TOP_PRODUCTS):
+    product_ids = top_product_ids(limit)
+    for product_id in product_ids:
+        rating_histogram(product_id)
+    return len(product_ids)
+
+
+def build_suggest_index():
+    suggest.get_index()
+    return 1
+
+
+STEPS = (
+    ('connections', open_connections),
+    ('templates', compile_templates),
+    ('catalog', warm_catalog),
+    ('top products', warm_top_products),
+    ('suggest index', build_suggest_index),
+)
+
+
+def warm_up(steps=None):
+    """
+    Run the warm-up steps in order. Returns [(step, count, ms)].
+
+    A failing step is logged and skipped so a cold cache never stops a worker starting.
+    """
+    results = []
+    for name, step in STEPS:
+        if steps and name not in steps:
+            continue
+        start = perf_counter()
+        try:
+            count = step()
+        except Exception:
+            logger.exception("Warm-up step %s failed", name)
+            count = None
+        results.append((name, count, (perf_counter() - start) * 1000))
+    logger.info("Warm-up: %s", ', '.join(f'{name} {ms:.0f} ms' for name, _, ms in results))
+    return results
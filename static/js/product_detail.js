@@ -1,4 +1,38 @@
 document.addEventListener('DOMContentLoaded', () => {
-    console.log('Product detail page loaded');
-    // You can add more interactivity here
+    // LOAD MORE REVIEWS (keyset pages from the product_reviews endpoint)
+    const button = document.getElementById('load-more-reviews');
+    const list = document.getElementById('review-list');
+    if (!button || !list) return;
+
+    function reviewCard(review) {
+        const card = document.createElement('div');
+        card.className = 'review-card';
+        const head = document.createElement('p');
+        const name = document.createElement('strong');
+        name.textContent = review.user;
+        head.append(name, ` ${review.stars}`);
+        const comment = document.createElement('p');
+        comment.textContent = review.comment;
+        const date = document.createElement('p');
+        date.className = 'date';
+        date.textContent = review.date;
+        card.append(head, comment, date);
+        return card;
+    }
+
+    button.addEventListener('click', () => {
+        button.disabled = true;
+        fetch(`${button.dataset.url}?before=${button.dataset.next}`)
+            .then((response) => response.json())
+            .then((data) => {
+                data.reviews.forEach((review) => list.appendChild(reviewCard(review)));
+                if (data.next) {
+                    button.dataset.next = data.next;
+                    button.disabled = false;
+                } else {
+                    button.remove();
+                }
+            })
+            .catch(() => { button.disabled = false; });
+    });
 });
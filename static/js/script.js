@@ -1,7 +1,6 @@
 // HERO SLIDER
 let slides = document.querySelectorAll('.hero-slider .slide');
 let currentSlide = 0;
-let slideInterval = setInterval(nextSlide, 5000);
 
 function nextSlide() {
   slides[currentSlide].classList.remove('active');
@@ -9,7 +8,10 @@ function nextSlide() {
   slides[currentSlide].classList.add('active');
 }
 
-slides[0].classList.add('active');
+if (slides.length) {
+  slides[0].classList.add('active');
+  setInterval(nextSlide, 5000);
+}
 
 // MOBILE NAV TOGGLE
 const menuToggle = document.createElement('div');
@@ -21,3 +23,94 @@ const navLinks = document.querySelector('.nav-links');
 menuToggle.addEventListener('click', () => {
   navLinks.classList.toggle('show');
 });
+
+// AJAX CART
+// The cart JSON endpoints return {line, totals, badge}; only those bits of
+// the page are patched. Without JS the plain forms/links still work.
+function csrfToken() {
+  const input = document.querySelector('input[name="csrfmiddlewaretoken"]');
+  if (input) return input.value;
+  const match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+  return match ? match[1] : '';
+}
+
+function postCart(url, data) {
+  const body = new FormData();
+  Object.entries(data || {}).forEach(([key, value]) => body.append(key, value));
+  return fetch(url, {
+    method: 'POST',
+    body,
+    headers: { 'X-CSRFToken': csrfToken(), 'X-Requested-With': 'XMLHttpRequest' },
+  }).then((response) => {
+    if (!response.ok) throw new Error(`Cart update failed (${response.status})`);
+    return response.json();
+  });
+}
+
+function applyCartSummary(summary) {
+  document.querySelectorAll('[data-cart-count]').forEach((el) => {
+    el.textContent = summary.badge;
+  });
+  document.querySelectorAll('[data-cart-total]').forEach((el) => {
+    el.textContent = summary.totals.total;
+  });
+  if (!summary.line) return;
+  const row = document.querySelector(`[data-cart-line="${summary.line.product_id}"]`);
+  if (row) {
+    row.querySelector('[data-line-subtotal]').textContent = summary.line.subtotal;
+    row.querySelector('[data-cart-update]').value = summary.line.quantity;
+  }
+}
+
+function dropCartLine(productId, summary) {
+  const row = document.querySelector(`[data-cart-line="${productId}"]`);
+  if (row) row.remove();
+  // Last line gone: reload for the empty-cart message
+  if (!summary.totals.lines) window.location.reload();
+}
+
+// Listing "Add to Cart" buttons
+document.querySelectorAll('form[data-cart-api]').forEach((form) => {
+  form.addEventListener('submit', (event) => {
+    event.preventDefault();
+    const button = form.querySelector('button');
+    button.disabled = true;
+    postCart(form.dataset.cartApi, { quantity: 1 })
+      .then((summary) => {
+        applyCartSummary(summary);
+        const link = document.createElement('a');
+        link.href = form.dataset.cartUrl;
+        link.className = 'btn add-cart in-cart';
+        link.textContent = '✔ In Cart';
+        form.replaceWith(link);
+      })
+      .catch(() => form.submit());
+  });
+});
+
+// Cart page quantity inputs
+document.querySelectorAll('input[data-cart-update]').forEach((input) => {
+  input.addEventListener('change', () => {
+    const productId = input.closest('[data-cart-line]').dataset.cartLine;
+    postCart(input.dataset.cartUpdate, { quantity: input.value })
+      .then((summary) => {
+        applyCartSummary(summary);
+        if (!summary.line) dropCartLine(productId, summary);
+      })
+      .catch(() => input.form.submit());
+  });
+});
+
+// Cart page remove links
+document.querySelectorAll('a[data-cart-remove]').forEach((link) => {
+  link.addEventListener('click', (event) => {
+    event.preventDefault();
+    const productId = link.closest('[data-cart-line]').dataset.cartLine;
+    postCart(link.dataset.cartRemove)
+      .then((summary) => {
+        applyCartSummary(summary);
+        dropCartLine(productId, summary);
+      })
+      .catch(() => { window.location.href = link.href; });
+  });
+});
@@ -0,0 +1,50 @@
+// SEARCH-AS-YOU-TYPE SUGGESTIONS
+document.querySelectorAll('form[data-suggest-url]').forEach((form) => {
+  const input = form.querySelector('input[name="q"]');
+  const list = document.createElement('ul');
+  list.className = 'suggest-list';
+  form.style.position = 'relative';
+  form.appendChild(list);
+
+  let timer = null;
+  let lastQuery = '';
+
+  function render(suggestions) {
+    list.innerHTML = '';
+    suggestions.forEach((item) => {
+      const li = document.createElement('li');
+      const link = document.createElement('a');
+      link.href = item.url;
+      link.textContent = item.label;
+      const kind = document.createElement('span');
+      kind.className = 'suggest-kind';
+      kind.textContent = item.kind === 'category' ? 'Category' : '';
+      link.appendChild(kind);
+      li.appendChild(link);
+      list.appendChild(li);
+    });
+    list.classList.toggle('show', suggestions.length > 0);
+  }
+
+  input.addEventListener('input', () => {
+    clearTimeout(timer);
+    const query = input.value.trim();
+    if (!query) {
+      render([]);
+      return;
+    }
+    timer = setTimeout(() => {
+      lastQuery = query;
+      fetch(`${form.dataset.suggestUrl}?q=${encodeURIComponent(query)}`)
+        .then((response) => response.json())
+        .then((data) => {
+          if (data.query === lastQuery) render(data.suggestions);
+        })
+        .catch(() => render([]));
+    }, 120);
+  });
+
+  document.addEventListener('click', (event) => {
+    if (!form.contains(event.target)) render([]);
+  });
+});